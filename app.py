@@ -3,17 +3,60 @@ import os
 from dotenv import load_dotenv
 
 from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
 
-from scripts.backend.document_processing.document_embedder import Embedder
-from scripts.backend.document_processing.vector_store import VectorStore
 from scripts.backend.models.rag import UploadFileRequest, QueryRequest
 from scripts.backend.document_processing.upload_file import UploadFile
+from scripts.backend.query_processing.answer_store import get_answer_store
+from scripts.backend.query_processing.query_cache import get_query_cache
 from scripts.backend.query_processing.query_processor import QueryProcessor
-from scripts.backend.query_processing.response_generator import ResponseGenerator
+from scripts.backend.query_processing.speculative_retriever import PREFETCH_DEBOUNCE_SECONDS, SpeculativeRetriever
+from scripts.backend.runtime.model_registry import get_registry
+from scripts.backend.runtime.warm_up import get_warm_up
+
+try:
+    # Reruns the script on every keystroke, which lets the query be retrieved while it is typed
+    from st_keyup import st_keyup
+except ImportError:
+    st_keyup = None
 
 load_dotenv()
 
+@st.cache_resource(show_spinner=False)
+def get_query_processor(collection_name: str, rerank: bool) -> QueryProcessor:
+    """
+    Build the query pipeline of a collection once per process; Streamlit reruns reuse it.
+    """
+    registry = get_registry()
+    embedder = registry.get_embedder()
+
+    # Reuse the pooled connection to the Qdrant database
+    qdrant_client = registry.get_qdrant_client(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY")
+    )
+
+    # Initialize vector store interface for the collection
+    vector_store = QdrantVectorStore(
+        client=qdrant_client,
+        collection_name=collection_name,
+        embedding=embedder.embedding
+    )
+
+    return QueryProcessor(
+        embedder, vector_store, registry.get_response_generator(), get_query_cache(),
+        registry.get_reranker() if rerank else None, get_answer_store()
+    )
+
+def get_speculative_retriever(collection_name: str, rerank: bool) -> SpeculativeRetriever:
+    """
+    Get the speculative retriever of this browser session for a collection. Its prefetched
+    context belongs to one user, so it lives in the session state rather than in the resource cache.
+    """
+    key = f"speculative_retriever:{collection_name}:{rerank}"
+    if key not in st.session_state:
+        st.session_state[key] = SpeculativeRetriever(get_query_processor(collection_name, rerank))
+    return st.session_state[key]
+
 def main():
 
     """
@@ -23,6 +66,11 @@ def main():
     """
     st.title("BabyRAG: Q&A System")
 
+    # Models and clients are loaded once per process and survive Streamlit reruns
+    registry = get_registry()
+    # Start loading them while the page renders; the first upload or query waits for the load
+    get_warm_up().start(registry, background=True)
+
     with st.sidebar:
         st.header("Upload Document")
         uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
@@ -33,8 +81,8 @@ def main():
             with open(uploaded_file.name, "wb") as f:
                 f.write(uploaded_file.getvalue())
             
-            # Initialize components
-            embedder = Embedder()
+            # Get shared components
+            embedder = registry.get_embedder()
             upload_request = UploadFileRequest(
                 file_path=uploaded_file.name, 
                 collection_name=collection_name
@@ -45,43 +93,43 @@ def main():
             success = upload_service.upload_file(upload_request, embedder)
             
             if success:
+                # Context prefetched before the upload misses the new chunks
+                for key in list(st.session_state):
+                    if key.startswith(f"speculative_retriever:{collection_name}:"):
+                        st.session_state[key].clear()
                 st.success("Document uploaded and indexed successfully!")
             else:
                 st.error("Failed to upload document :(")
 
     # Main area for querying
     st.header("Ask a Question")
-    query = st.text_input("Enter your query:")
+    if st_keyup is not None:
+        query = st_keyup("Enter your query:", debounce=int(PREFETCH_DEBOUNCE_SECONDS * 1000))
+    else:
+        query = st.text_input("Enter your query:")
+    search_type = st.selectbox("Search type", ["similarity", "hybrid", "mmr"])
+    rerank = st.checkbox("Rerank with a cross-encoder")
+    # Without st_keyup the script only reruns once the query is entered, which submits it
+    submitted = st.button("Ask") if st_keyup is not None else True
     
     if query and collection_name:
+        query_request = QueryRequest(
+            query=query,
+            collection_name=collection_name,
+            search_type=search_type,
+            k=5,
+            rerank=rerank
+        )
+        speculative_retriever = get_speculative_retriever(collection_name, rerank)
+
+        if not submitted:
+            # Retrieve the context of the partial query in the background while the user types
+            speculative_retriever.update(query_request)
+            return
+
         with st.spinner('Generating response...'):
-            # Initialize RAG components
-            embedder = Embedder()
-            
-            # Connect to Qdrant database
-            qdrant_client = QdrantClient(
-                url=os.getenv("QDRANT_URL"),
-                api_key=os.getenv("QDRANT_API_KEY")
-            )
-            
-            # Initialize vector store interface for the collection
-            vector_store = QdrantVectorStore(
-                client=qdrant_client,
-                collection_name=collection_name,
-                embedding=embedder.embedding
-            )
-            
-            query_request = QueryRequest(
-                query=query,
-                collection_name=collection_name,
-                k=5
-            )
-            
-            # Process query and generate response
-            response_generator = ResponseGenerator()
-            query_processor = QueryProcessor(embedder, vector_store, response_generator)
-            
-            query_response = query_processor.process_query(query_request)
+            # Only generation is left when the context was prefetched
+            query_response = speculative_retriever.process_query(query_request)
             
             st.write("### Response:")
             st.write(query_response.response)
@@ -1,19 +1,123 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import Depends, Request
+from fastapi import Depends, HTTPException, Request
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from scripts.backend.document_processing.document_embedder import Embedder
+from scripts.backend.query_processing.answer_store import AnswerStore
+from scripts.backend.query_processing.query_cache import QueryCache
+from scripts.backend.query_processing.response_generator import ResponseGenerator
+from scripts.backend.runtime.inference_executor import InferenceExecutor
+from scripts.backend.runtime.job_store import JobStore
+from scripts.backend.runtime.micro_batcher import MicroBatcher
+from scripts.backend.runtime.model_registry import ModelRegistry
+from scripts.backend.runtime.warm_up import get_warm_up
 
 """
-This script defines a FastAPI dependency to retrieve the 'Embedder' object from the app's state,
-ensuring it is initialized before being used in the application routes.
-The 'EmbedderDepends' is an alias for this dependency.
+This script defines FastAPI dependencies to retrieve the 'Embedder' object, the shared 'ModelRegistry'
+and the models and clients it holds, the inference and ingestion executors, the query embedding
+and generation batchers, the query cache and the upload job store
+from the app's state, ensuring they are initialized before being used in the application routes.
+While the models are still loading in the background, routes that need them answer 503 with a
+Retry-After header instead of waiting for the load.
+The '...Depends' names are aliases for these dependencies.
 """
 
+WARM_UP_RETRY_AFTER = 5
+
+
+def require_ready(name: str):
+    warm_up = get_warm_up()
+    status = warm_up.components.get(name, {}).get("status")
+    # A failed component is loaded again by the request, which then reports the error
+    if status in ("pending", "loading"):
+        raise HTTPException(
+            status_code=503,
+            detail=f"The {name} is still loading",
+            headers={"Retry-After": str(WARM_UP_RETRY_AFTER)}
+        )
+
+
 def get_embedder(request: Request) -> Embedder:
-    embedder = request.app.state.embedder
-    if embedder is None:
-        raise RuntimeError("Embedder is not initialized")
-    return embedder
+    require_ready("embedder")
+    return get_model_registry(request).get_embedder()
+
+
+def get_model_registry(request: Request) -> ModelRegistry:
+    registry = request.app.state.registry
+    if registry is None:
+        raise RuntimeError("Model registry is not initialized")
+    return registry
+
+
+def get_response_generator(request: Request) -> ResponseGenerator:
+    require_ready("generator")
+    return get_model_registry(request).get_response_generator()
+
+
+def get_qdrant_client(request: Request) -> QdrantClient:
+    return get_model_registry(request).get_qdrant_client()
+
+
+def get_async_qdrant_client(request: Request) -> Optional[AsyncQdrantClient]:
+    return get_model_registry(request).get_async_qdrant_client()
+
+
+def get_inference_executor(request: Request) -> InferenceExecutor:
+    executor = request.app.state.inference_executor
+    if executor is None:
+        raise RuntimeError("Inference executor is not initialized")
+    return executor
+
+
+def get_ingestion_executor(request: Request) -> InferenceExecutor:
+    executor = request.app.state.ingestion_executor
+    if executor is None:
+        raise RuntimeError("Ingestion executor is not initialized")
+    return executor
+
+
+def get_embedding_batcher(request: Request) -> MicroBatcher:
+    batcher = request.app.state.embedding_batcher
+    if batcher is None:
+        raise RuntimeError("Embedding batcher is not initialized")
+    return batcher
+
+
+def get_generation_batcher(request: Request) -> MicroBatcher:
+    batcher = request.app.state.generation_batcher
+    if batcher is None:
+        raise RuntimeError("Generation batcher is not initialized")
+    return batcher
+
+
+def get_query_cache(request: Request) -> QueryCache:
+    query_cache = request.app.state.query_cache
+    if query_cache is None:
+        raise RuntimeError("Query cache is not initialized")
+    return query_cache
+
+
+def get_answer_store(request: Request) -> Optional[AnswerStore]:
+    # None when ANSWER_STORE_PATH is empty, which disables precomputed answers
+    return getattr(request.app.state, "answer_store", None)
+
+
+def get_job_store(request: Request) -> JobStore:
+    job_store = request.app.state.job_store
+    if job_store is None:
+        raise RuntimeError("Job store is not initialized")
+    return job_store
 
 
-EmbedderDepends = Annotated[Embedder, Depends(get_embedder)]
\ No newline at end of file
+EmbedderDepends = Annotated[Embedder, Depends(get_embedder)]
+RegistryDepends = Annotated[ModelRegistry, Depends(get_model_registry)]
+ResponseGeneratorDepends = Annotated[ResponseGenerator, Depends(get_response_generator)]
+QdrantClientDepends = Annotated[QdrantClient, Depends(get_qdrant_client)]
+AsyncQdrantClientDepends = Annotated[Optional[AsyncQdrantClient], Depends(get_async_qdrant_client)]
+InferenceExecutorDepends = Annotated[InferenceExecutor, Depends(get_inference_executor)]
+IngestionExecutorDepends = Annotated[InferenceExecutor, Depends(get_ingestion_executor)]
+JobStoreDepends = Annotated[JobStore, Depends(get_job_store)]
+EmbeddingBatcherDepends = Annotated[MicroBatcher, Depends(get_embedding_batcher)]
+GenerationBatcherDepends = Annotated[MicroBatcher, Depends(get_generation_batcher)]
+QueryCacheDepends = Annotated[QueryCache, Depends(get_query_cache)]
+AnswerStoreDepends = Annotated[Optional[AnswerStore], Depends(get_answer_store)]
\ No newline at end of file
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from scripts.api.routers import rag_routes
+from scripts.api.routers import health_routes, metrics_routes, rag_routes
 
 """
 This script aggregates and registers all API routers in the application.
@@ -8,4 +8,6 @@ This script aggregates and registers all API routers in the application.
 
 api_router = APIRouter()
 
-api_router.include_router(rag_routes.router, prefix="/rag", tags=["rag"])
\ No newline at end of file
+api_router.include_router(rag_routes.router, prefix="/rag", tags=["rag"])
+api_router.include_router(metrics_routes.router, tags=["metrics"])
+api_router.include_router(health_routes.router, tags=["health"])
\ No newline at end of file
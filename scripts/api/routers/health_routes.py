@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from scripts.backend.runtime.warm_up import get_warm_up
+
+"""
+This script defines the liveness and readiness endpoints. '/health' answers as soon as the server
+accepts connections; '/ready' answers 200 once the models are loaded and 503 until then, with the
+loading progress of every component in both cases.
+"""
+
+router = APIRouter()
+
+
+@router.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+def ready():
+    report = get_warm_up().report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
@@ -1,64 +1,304 @@
 
-import os
+import asyncio
+import json
+from typing import AsyncIterator, Optional
 from dotenv import load_dotenv
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 
 from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
 
-from scripts.api.dependencies import EmbedderDepends
+from scripts.api.dependencies import (
+    AnswerStoreDepends,
+    AsyncQdrantClientDepends,
+    EmbedderDepends,
+    EmbeddingBatcherDepends,
+    GenerationBatcherDepends,
+    InferenceExecutorDepends,
+    IngestionExecutorDepends,
+    JobStoreDepends,
+    QdrantClientDepends,
+    QueryCacheDepends,
+    RegistryDepends,
+    ResponseGeneratorDepends,
+)
 from scripts.backend.query_processing.query_processor import QueryProcessor
+from scripts.backend.query_processing.reranker import Reranker
+from scripts.backend.document_processing.document_loader import DocumentLoader
 from scripts.backend.document_processing.upload_file import UploadFile
-from scripts.backend.models.rag import UploadFileRequest, QueryRequest, QueryResponse
-from scripts.backend.query_processing.response_generator import ResponseGenerator
+from scripts.backend.models.rag import (
+    BatchQueryRequest,
+    BatchQueryResult,
+    CompressCollectionRequest,
+    CompressionStats,
+    DeleteDocumentResponse,
+    UploadFileRequest,
+    UploadJobStatus,
+    QueryRequest,
+    QueryResponse,
+)
+from scripts.backend.runtime.inference_executor import InferenceQueueFullError
 
 """
 This script defines API endpoints for uploading files and querying a vector database using Qdrant.
+
+Model calls run on dedicated executors with bounded queues; when a queue is full the request is
+rejected with 503 and a Retry-After header. Uploads run in the background and are tracked as jobs;
+'file_path' may also be a directory or a glob pattern, in which case the job reports per-file progress.
+Uploading a document again only writes its new chunks and deletes its vanished ones, and
+'DELETE /documents/{collection_name}?document_id=...' removes a document from a collection; a document
+is identified by the 'document_id' of its upload, by default the absolute path of its file.
+'/collections/compress' copies a collection into a new one with projected and/or quantized vectors.
+'/query/stream' returns the answer as server-sent events while it is being generated; a cached or
+precomputed answer is sent as a single token.
+'/query/batch' answers a list of queries, or the lines of a JSONL file, with batched embedding, search
+and generation, and streams one NDJSON result per query as soon as it is answered.
+Queries with 'rerank' set load the shared cross-encoder on first use and rerank their candidates with it.
+Questions whose answers were precomputed by 'scripts.precompute_answers' are answered from the answer store.
 """
 
 load_dotenv()
 
 router = APIRouter()
 
-@router.post("/upload")
-def upload_file(
+
+def service_unavailable(error: InferenceQueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+@router.post("/upload", status_code=202, response_model=UploadJobStatus)
+async def upload_file(
     upload_file_request: UploadFileRequest,
-    embedder: EmbedderDepends
+    embedder: EmbedderDepends,
+    executor: IngestionExecutorDepends,
+    job_store: JobStoreDepends
 ):
+    job = job_store.create(upload_file_request)
+
+    def upload():
+        upload_service = UploadFile()
+        if DocumentLoader.expand_paths(upload_file_request.file_path) == [upload_file_request.file_path]:
+            upload_service.upload_file(upload_file_request, embedder)
+        else:
+            upload_service.upload_files(
+                upload_file_request,
+                embedder,
+                on_progress=lambda files: job_store.update(job.job_id, files=files)
+            )
+        return upload_service.ingestion_stats
+
     try:
-        UploadFile().upload_file(upload_file_request, embedder)
+        executor.submit(job_store.run, job.job_id, upload)
+    except InferenceQueueFullError as e:
+        job_store.update(job.job_id, status="failed", detail=str(e))
+        raise service_unavailable(e)
+    return job
+
+
+@router.get("/upload/{job_id}", response_model=UploadJobStatus)
+async def upload_status(
+    job_id: str,
+    job_store: JobStoreDepends
+):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Upload job {job_id} not found")
+    return job
+
+
+@router.delete("/documents/{collection_name}", response_model=DeleteDocumentResponse)
+async def delete_document(
+    collection_name: str,
+    document_id: str,
+    executor: IngestionExecutorDepends
+):
+    try:
+        deleted = await executor.run(UploadFile().delete_document, collection_name, document_id)
+    except InferenceQueueFullError as e:
+        raise service_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if deleted == 0:
+        raise HTTPException(status_code=404, detail=f"Document {document_id} not found in {collection_name}")
+    return DeleteDocumentResponse(collection_name=collection_name, document_id=document_id, deleted=deleted)
+
+
+@router.post("/collections/compress", response_model=CompressionStats)
+async def compress_collection(
+    compress_request: CompressCollectionRequest,
+    embedder: EmbedderDepends,
+    executor: IngestionExecutorDepends
+):
+    try:
+        return await executor.run(UploadFile().compress_collection, compress_request, embedder)
+    except InferenceQueueFullError as e:
+        raise service_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def load_reranker(
+    query_request: QueryRequest,
+    registry: RegistryDepends
+) -> Optional[Reranker]:
+    if not query_request.rerank:
+        return None
+    return await asyncio.to_thread(registry.get_reranker)
 
 
 @router.post("/query", response_model=None)
-def query(
-    query_request: QueryRequest, embedder: EmbedderDepends
+async def query(
+    query_request: QueryRequest,
+    embedder: EmbedderDepends,
+    registry: RegistryDepends,
+    qdrant_client: QdrantClientDepends,
+    async_qdrant_client: AsyncQdrantClientDepends,
+    response_generator: ResponseGeneratorDepends,
+    executor: InferenceExecutorDepends,
+    embedding_batcher: EmbeddingBatcherDepends,
+    generation_batcher: GenerationBatcherDepends,
+    query_cache: QueryCacheDepends,
+    answer_store: AnswerStoreDepends
 ):
     try:
-        qdrant_client = QdrantClient(
-            url=os.getenv("QDRANT_URL"),
-            api_key=os.getenv("QDRANT_API_KEY")
-        )
-            
         vector_store = QdrantVectorStore(
             client=qdrant_client,
             collection_name=query_request.collection_name,
-            embedding=embedder.embedding
+            embedding=embedder.embedding,
+            validate_collection_config=False
         )
             
-        query_request = QueryRequest(
-            query=query_request.query,
-            collection_name=query_request.collection_name,
-            k=5
+        query_processor = QueryProcessor(
+            embedder, vector_store, response_generator, query_cache,
+            await load_reranker(query_request, registry), answer_store
         )
             
-        response_generator = ResponseGenerator()
-        query_processor = QueryProcessor(embedder, vector_store, response_generator)
-            
-        query_response = query_processor.process_query(query_request)
+        query_response = await query_processor.aprocess_query(
+            query_request, executor, async_qdrant_client, embedding_batcher, generation_batcher
+        )
         response = query_response.response
         return response
+    except InferenceQueueFullError as e:
+        raise service_unavailable(e)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+
+async def stored_answer_tokens(response: str) -> AsyncIterator[str]:
+    # A precomputed or cached answer is sent as a single token
+    yield response
+
+
+@router.post("/query/stream", response_model=None)
+async def query_stream(
+    query_request: QueryRequest,
+    embedder: EmbedderDepends,
+    registry: RegistryDepends,
+    qdrant_client: QdrantClientDepends,
+    async_qdrant_client: AsyncQdrantClientDepends,
+    response_generator: ResponseGeneratorDepends,
+    executor: InferenceExecutorDepends,
+    embedding_batcher: EmbeddingBatcherDepends,
+    query_cache: QueryCacheDepends,
+    answer_store: AnswerStoreDepends
+):
+    try:
+        vector_store = QdrantVectorStore(
+            client=qdrant_client,
+            collection_name=query_request.collection_name,
+            embedding=embedder.embedding,
+            validate_collection_config=False
+        )
+        query_processor = QueryProcessor(
+            embedder, vector_store, response_generator, query_cache,
+            await load_reranker(query_request, registry), answer_store
+        )
+
+        stored, query_vector = await query_processor.acached(query_request, executor, embedding_batcher)
+        if stored is not None:
+            context_list = stored.context or []
+            tokens = stored_answer_tokens(stored.response)
+        else:
+            context_docs, context = await query_processor.aretrieve(
+                query_request, executor, async_qdrant_client, embedding_batcher, query_vector
+            )
+            context_list = [doc.page_content for doc in context_docs]
+            tokens = query_processor.astream_response(query_request.query, context, executor)
+    except InferenceQueueFullError as e:
+        raise service_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        try:
+            async for token in tokens:
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        yield f"event: end\ndata: {json.dumps({'context': context_list})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.post("/query/batch", response_model=None)
+async def query_batch(
+    batch_request: BatchQueryRequest,
+    embedder: EmbedderDepends,
+    registry: RegistryDepends,
+    qdrant_client: QdrantClientDepends,
+    response_generator: ResponseGeneratorDepends,
+    executor: InferenceExecutorDepends,
+    query_cache: QueryCacheDepends,
+    answer_store: AnswerStoreDepends
+):
+    if (batch_request.queries is None) == (batch_request.file_path is None):
+        raise HTTPException(status_code=400, detail="Set exactly one of 'queries' and 'file_path'")
+    try:
+        if batch_request.file_path is not None:
+            items = await asyncio.to_thread(QueryProcessor.load_requests, batch_request.file_path, batch_request)
+        else:
+            items = [(None, query_request) for query_request in batch_request.queries]
+        query_requests = [query_request for _, query_request in items]
+        if not query_requests:
+            raise ValueError("The batch has no queries")
+
+        reranker = None
+        if any(query_request.rerank for query_request in query_requests):
+            reranker = await asyncio.to_thread(registry.get_reranker)
+        vector_store = QdrantVectorStore(
+            client=qdrant_client,
+            collection_name=query_requests[0].collection_name,
+            embedding=embedder.embedding,
+            validate_collection_config=False
+        )
+        query_processor = QueryProcessor(
+            embedder, vector_store, response_generator, query_cache, reranker, answer_store
+        )
+        results = query_processor.astream_batch(query_requests, executor)
+    except InferenceQueueFullError as e:
+        raise service_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def lines():
+        try:
+            async for index, query_response in results:
+                record_id, query_request = items[index]
+                yield BatchQueryResult(
+                    index=index,
+                    id=record_id,
+                    query=query_request.query,
+                    response=query_response.response,
+                    context=query_response.context
+                ).model_dump_json() + "\n"
+        except Exception as e:
+            yield json.dumps({"detail": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
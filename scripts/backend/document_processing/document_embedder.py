@@ -1,5 +1,18 @@
-import torch
-from langchain_huggingface import HuggingFaceEmbeddings
+import os
+import re
+from typing import TYPE_CHECKING, Any, List, Optional
+
+from dotenv import load_dotenv
+
+from scripts.backend.document_processing.embedding_cache import EmbeddingCache
+from scripts.backend.document_processing.vector_compression import get_projection
+
+if TYPE_CHECKING:
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+load_dotenv()
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
 
 class Embedder:
     """
@@ -7,31 +20,269 @@ class Embedder:
 
     Args:
         model_name (str): Name of the model to use for embeddings.
+        device (str, optional): Device to load the model on. Defaults to CUDA when available.
+        cache_dir (str, optional): Directory of the on-disk embedding cache. Defaults to no cache.
+        cache_dtype (str): Precision of the cached vectors, "float16" or "float32". Defaults to "float16".
+        backend (str): Inference backend, one of BACKENDS:
+            "torch" runs the fp32 PyTorch model,
+            "torch-int8" quantizes its linear layers to int8 with PyTorch dynamic quantization (CPU only),
+            "onnx" runs an ONNX export of the model with ONNX Runtime,
+            "onnx-int8" runs a dynamically quantized int8 ONNX export (CPU only).
+            The ONNX backends need 'optimum[onnxruntime]'. Defaults to the EMBEDDING_BACKEND environment
+            variable or "torch".
+        num_threads (int, optional): Intra-op threads used by the model. For the PyTorch backends this
+            sets the process-wide torch thread count. Defaults to the EMBEDDING_THREADS environment
+            variable or the library default.
+        max_seq_length (int, optional): Truncate texts to this many tokens. Defaults to the
+            EMBEDDING_MAX_SEQ_LENGTH environment variable or the model's limit.
+        encode_batch_size (int): Texts per forward pass. Texts are sorted by length before batching and
+            every batch is padded to its own longest text, so similar lengths are encoded together.
+            Defaults to the EMBEDDING_ENCODE_BATCH_SIZE environment variable or 32.
+        artifact_dir (str): Directory where ONNX exports and snapshots are saved and reused. Defaults to the
+            EMBEDDING_ARTIFACT_DIR environment variable or ".cache/models".
+        onnx_quantization (str): Target of the int8 ONNX export: "avx2", "avx512", "avx512_vnni" or "arm64".
+            Defaults to the EMBEDDING_ONNX_QUANTIZATION environment variable or "avx2".
+        snapshot (bool): For the PyTorch backends, save the loaded (and quantized) model to 'artifact_dir'
+            and load it from there on later starts, skipping the model conversion and quantization.
+            Delete the snapshot to pick up a new version of the model. Defaults to the
+            EMBEDDING_SNAPSHOT environment variable or False.
+
+    torch and the Hugging Face libraries are imported when the model is loaded, not with this module.
+
+    A collection may store projected vectors (see vector_compression). Passing its name to
+    'embed_documents' and 'embed_query' returns vectors projected like the stored ones.
 
     Attributes:
         model_name (str): Name of the model to use for embeddings.
+        device (str): Device the model is loaded on.
+        backend (str): Inference backend.
+        variant (str): Model name plus the options that change its vectors, e.g. "bert-large-uncased@onnx-int8".
+        dimension (int): Size of the vectors.
         embedding (HuggingFaceEmbeddings): Loaded Hugging Face embedding model.
+        cache (EmbeddingCache): Cache of chunk embeddings, or None.
     """
 
     def __init__(
         self,
-        model_name: str = "bert-large-uncased"
+        model_name: str = "bert-large-uncased",
+        device: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        cache_dtype: str = "float16",
+        backend: str = os.getenv("EMBEDDING_BACKEND", "torch"),
+        num_threads: Optional[int] = int(os.getenv("EMBEDDING_THREADS", 0)) or None,
+        max_seq_length: Optional[int] = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", 0)) or None,
+        encode_batch_size: int = int(os.getenv("EMBEDDING_ENCODE_BATCH_SIZE", 32)),
+        artifact_dir: str = os.getenv("EMBEDDING_ARTIFACT_DIR", ".cache/models"),
+        onnx_quantization: str = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2"),
+        snapshot: bool = os.getenv("EMBEDDING_SNAPSHOT", "").lower() in ("1", "true", "yes")
     ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
         self.model_name = model_name
+        self.device = device or self.default_device()
+        if backend.endswith("-int8") and self.device != "cpu":
+            raise ValueError(f"The {backend} backend only runs on CPU")
+        self.backend = backend
+        self.num_threads = num_threads
+        self.max_seq_length = max_seq_length
+        self.encode_batch_size = encode_batch_size
+        self.artifact_dir = artifact_dir
+        self.onnx_quantization = onnx_quantization
+        self.snapshot = snapshot
+        self.variant = model_name
+        if backend != "torch":
+            self.variant += f"@{backend}"
+        if max_seq_length:
+            self.variant += f"@seq{max_seq_length}"
         self.embedding = self._load_embedding_model()
+        self._dimension = None
+        self.cache = EmbeddingCache(cache_dir, self.variant, cache_dtype) if cache_dir else None
 
-    def _load_embedding_model(self) -> HuggingFaceEmbeddings:
+    @staticmethod
+    def default_device() -> str:
+        """
+        Returns:
+            str: "cuda" if a GPU is available, "cpu" otherwise.
+        """
+        import torch
+
+        return "cuda" if torch.cuda.is_available() else "cpu"
+
+    def _load_embedding_model(self) -> "HuggingFaceEmbeddings":
         """
         Loads the embedding model based on the model name.
 
         Returns:
             HuggingFaceEmbeddings: Loaded Hugging Face embedding model.
         """
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        return HuggingFaceEmbeddings(
-            model_name=self.model_name, model_kwargs={"device": device}
+        import torch
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        encode_kwargs = {"batch_size": self.encode_batch_size}
+
+        if self.backend.startswith("onnx"):
+            embedding = HuggingFaceEmbeddings(
+                model_name=self._onnx_export(),
+                model_kwargs={
+                    "device": self.device,
+                    "backend": "onnx",
+                    "model_kwargs": self._onnx_model_kwargs(),
+                },
+                encode_kwargs=encode_kwargs,
+            )
+        else:
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            snapshot_path = self._snapshot_path() if self.snapshot else None
+            embedding = self._load_snapshot(snapshot_path, encode_kwargs) if snapshot_path else None
+            if embedding is None:
+                embedding = HuggingFaceEmbeddings(
+                    model_name=self.model_name,
+                    model_kwargs={"device": self.device},
+                    encode_kwargs=encode_kwargs,
+                )
+                if self.backend == "torch-int8":
+                    torch.ao.quantization.quantize_dynamic(
+                        embedding._client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+                    )
+                if snapshot_path:
+                    self._save_snapshot(embedding, snapshot_path)
+
+        if self.max_seq_length:
+            embedding._client.max_seq_length = self.max_seq_length
+        return embedding
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(
+            self.artifact_dir, re.sub(r"[^\w.-]", "_", self.model_name), f"snapshot-{self.backend}.pt"
         )
 
+    def _load_snapshot(
+        self,
+        path: str,
+        encode_kwargs: dict
+    ) -> Optional["HuggingFaceEmbeddings"]:
+        """
+        Load a model saved by '_save_snapshot'. The whole SentenceTransformer module is unpickled,
+        so the weights are neither parsed from the Hugging Face checkpoint nor quantized again.
+
+        Args:
+            path (str): Snapshot file.
+            encode_kwargs (dict): Encoding options of the embedding model.
+
+        Returns:
+            Optional[HuggingFaceEmbeddings]: The model, or None when there is no usable snapshot.
+        """
+        if not os.path.exists(path):
+            return None
+        import torch
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        try:
+            embedding = HuggingFaceEmbeddings.model_construct(
+                model_name=self.model_name,
+                model_kwargs={"device": self.device},
+                encode_kwargs=encode_kwargs,
+            )
+            # Only snapshots written by this class to the local artifact directory are unpickled
+            embedding._client = torch.load(path, map_location=self.device, weights_only=False)
+            return embedding
+        except Exception as e:
+            print(f"Ignoring embedding snapshot {path}: {e}")
+            return None
+
+    @staticmethod
+    def _save_snapshot(
+        embedding: "HuggingFaceEmbeddings",
+        path: str
+    ):
+        import torch
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        torch.save(embedding._client, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _onnx_file_name(self) -> str:
+        if self.backend == "onnx-int8":
+            return f"onnx/model_qint8_{self.onnx_quantization}.onnx"
+        return "onnx/model.onnx"
+
+    def _onnx_export(self) -> str:
+        """
+        Export the model to ONNX, and quantize it for "onnx-int8", unless a previous export is found
+        in 'artifact_dir'. Exporting a large model takes minutes, so it is done once and reused.
+
+        Returns:
+            str: Directory of the exported model.
+        """
+        export_dir = os.path.join(self.artifact_dir, re.sub(r"[^\w.-]", "_", self.model_name))
+        if os.path.exists(os.path.join(export_dir, self._onnx_file_name())):
+            return export_dir
+
+        try:
+            from sentence_transformers import SentenceTransformer
+            from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+            if not os.path.exists(os.path.join(export_dir, "onnx", "model.onnx")):
+                SentenceTransformer(self.model_name, device="cpu", backend="onnx").save_pretrained(export_dir)
+            if self.backend == "onnx-int8":
+                export_dynamic_quantized_onnx_model(
+                    SentenceTransformer(export_dir, device="cpu", backend="onnx"),
+                    quantization_config=self.onnx_quantization,
+                    model_name_or_path=export_dir,
+                )
+        except Exception as e:
+            raise RuntimeError(f"Error exporting {self.model_name} to ONNX: {e}")
+        return export_dir
+
+    def _onnx_model_kwargs(self) -> dict:
+        """
+        Returns:
+            dict: ONNX Runtime options: the exported file, the execution provider and the thread count.
+        """
+        model_kwargs = {
+            "file_name": self._onnx_file_name(),
+            "provider": "CUDAExecutionProvider" if self.device == "cuda" else "CPUExecutionProvider",
+        }
+        if self.num_threads:
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = self.num_threads
+            model_kwargs["session_options"] = session_options
+        return model_kwargs
+
+    @property
+    def dimension(self) -> int:
+        """
+        Returns:
+            int: Size of the vectors produced by the model, read from the model when it reports it
+                and measured on a sample text otherwise.
+        """
+        if self._dimension is None:
+            client = getattr(self.embedding, "_client", None)
+            get_dimension = getattr(client, "get_sentence_embedding_dimension", None)
+            self._dimension = (get_dimension() if get_dimension else None) or len(
+                self.embedding.embed_query("dimension")
+            )
+        return self._dimension
+
+    @property
+    def tokenizer(self) -> Optional[Any]:
+        """
+        Returns:
+            Any, optional: The fast Hugging Face tokenizer of the model, or None when it has none.
+        """
+        return getattr(getattr(self.embedding, "_client", None), "tokenizer", None)
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        """
+        Returns:
+            int, optional: Number of tokens the model reads before truncating, including special tokens.
+        """
+        return self.max_seq_length or getattr(getattr(self.embedding, "_client", None), "max_seq_length", None)
+
     def generate_embeddings(self, text: str) -> list:
         """
         Generate embeddings for a given text.
@@ -44,4 +295,86 @@ class Embedder:
         """
         return self.embedding.embed_documents([text])
 
+    def embed_documents(
+        self,
+        texts: List[str],
+        collection_name: Optional[str] = None
+    ) -> List[List[float]]:
+        """
+        Generate embeddings for several texts, skipping the model for texts found in the cache.
+
+        Args:
+            texts (List[str]): Texts to generate embeddings for.
+            collection_name (str, optional): Collection the vectors are written to, whose projection
+                is applied. The cache holds the vectors of the model, before any projection.
+
+        Returns:
+            List[List[float]]: One embedding vector per text.
+        """
+        if self.cache is None:
+            return self.project(self.embedding.embed_documents(texts), collection_name)
+
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.embedding.embed_documents([texts[i] for i in missing])
+            self.cache.put_many([texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return self.project(vectors, collection_name)
 
+    def embed_query(
+        self,
+        text: str,
+        collection_name: Optional[str] = None
+    ) -> List[float]:
+        """
+        Args:
+            text (str): Query to embed.
+            collection_name (str, optional): Collection searched, whose projection is applied.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        return self.project([self.embedding.embed_query(text)], collection_name)[0]
+
+    def project(
+        self,
+        vectors: List[List[float]],
+        collection_name: Optional[str] = None
+    ) -> List[List[float]]:
+        """
+        Apply the projection of a collection to vectors of the model.
+
+        Args:
+            vectors (List[List[float]]): Vectors of the model.
+            collection_name (str, optional): Name of the collection. Defaults to no projection.
+
+        Returns:
+            List[List[float]]: The vectors as stored in the collection.
+
+        Raises:
+            ValueError: If the collection's projection was fitted on the vectors of another model.
+        """
+        projection = get_projection(collection_name) if collection_name else None
+        if projection is None:
+            return vectors
+        if projection.variant != self.variant:
+            raise ValueError(
+                f"Collection {collection_name} was projected for {projection.variant}, not {self.variant}"
+            )
+        return projection.transform(vectors)
+
+    def collection_dimension(
+        self,
+        collection_name: str
+    ) -> int:
+        """
+        Args:
+            collection_name (str): Name of the collection.
+
+        Returns:
+            int: Size of the vectors stored in the collection: the projected size, or 'dimension'.
+        """
+        projection = get_projection(collection_name)
+        return projection.dimensions if projection is not None else self.dimension
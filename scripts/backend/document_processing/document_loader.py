@@ -1,7 +1,18 @@
+import glob
+import multiprocessing
 import os
-from typing import List
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from scripts.backend.document_processing.pdf_pages import extract_pages, read_pages
+
+_process_pools: Dict[int, ProcessPoolExecutor] = {}
+_process_pools_lock = threading.Lock()
 
 class DocumentLoader:
     """
@@ -33,12 +44,7 @@ class DocumentLoader:
             ValueError: If the file is not a PDF.
             RuntimeError: If there is an error while loading the PDF.
         """
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File {file_path} does not exist")
-        
-        _, file_extension = os.path.splitext(file_path)
-        if file_extension.lower() != '.pdf':
-            raise ValueError(f"File {file_path} is not a PDF")
+        self._validate(file_path)
         
         loader = PyPDFLoader(file_path)
         try:
@@ -47,14 +53,191 @@ class DocumentLoader:
             raise RuntimeError(f"Error cargando {file_path}: {e}") from e
         
         for doc in documents:
-            doc.metadata.update({
-                'source': os.path.basename(file_path),
-                'file_path': file_path,
-                'file_type': 'pdf',
-                'loader': 'PyPDFLoader'
-            })
+            doc.metadata.update(self._file_metadata(file_path))
         
         return documents
 
+    def iter_pages(
+        self,
+        file_path: str,
+        executor: Optional[Executor] = None,
+        max_workers: Optional[int] = None,
+        pages_per_task: int = 8,
+        max_in_flight_pages: int = 64
+    ) -> Iterator[Document]:
+        """
+        Extract the pages of a PDF in parallel and yield them in order as soon as they are ready.
+
+        Page ranges of 'pages_per_task' pages are extracted by the worker processes of 'executor'.
+        At most 'max_in_flight_pages' pages are being extracted or waiting to be consumed at any time,
+        which bounds memory regardless of the size of the PDF. With a single worker, pages are
+        extracted in this process instead, since a pool would only add the cost of spawning it and
+        of parsing the PDF again in the worker.
+
+        Args:
+            file_path (str): Full path to the PDF file.
+            executor (Executor, optional): Process pool to extract pages with. Defaults to the shared
+                pool of 'max_workers' workers, or to extracting in this process for a single worker or
+                a PDF of a single task.
+            max_workers (int, optional): Size of the shared pool used when 'executor' is not given.
+                Defaults to the number of CPUs available to this process.
+            pages_per_task (int): Number of pages extracted by one task. Defaults to 8.
+            max_in_flight_pages (int): Page budget of extracted but unconsumed pages. Defaults to 64.
+
+        Yields:
+            Document: One document per page, with the same metadata as 'load_document'.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            ValueError: If the file is not a PDF.
+            RuntimeError: If there is an error while loading the PDF.
+        """
+        self._validate(file_path)
+
+        try:
+            reader = PdfReader(file_path)
+            total_pages = len(reader.pages)
+        except Exception as e:
+            raise RuntimeError(f"Error cargando {file_path}: {e}") from e
+
+        metadata = {'total_pages': total_pages, **self._file_metadata(file_path)}
+        ranges = [
+            (start, min(start + pages_per_task, total_pages))
+            for start in range(0, total_pages, pages_per_task)
+        ]
+
+        if executor is None and (len(ranges) <= 1 or (max_workers or self.available_cpus()) <= 1):
+            try:
+                for page in read_pages(reader, 0, total_pages):
+                    yield from self._to_documents([page], metadata)
+            except Exception as e:
+                raise RuntimeError(f"Error cargando {file_path}: {e}") from e
+            return
+
+        executor = executor or self.shared_process_pool(max_workers)
+        max_tasks = max(1, max_in_flight_pages // pages_per_task)
+        pending = deque()
+        try:
+            for start, stop in ranges:
+                if len(pending) >= max_tasks:
+                    yield from self._to_documents(self._result(pending.popleft(), file_path), metadata)
+                pending.append(executor.submit(extract_pages, file_path, start, stop))
+            while pending:
+                yield from self._to_documents(self._result(pending.popleft(), file_path), metadata)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def process_pool(
+        max_workers: Optional[int] = None
+    ) -> ProcessPoolExecutor:
+        """
+        Create a process pool for 'iter_pages'. Workers are spawned rather than forked, since the
+        parent process usually runs threads and holds loaded models.
+
+        Args:
+            max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+
+        Returns:
+            ProcessPoolExecutor: The pool.
+        """
+        return ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    @classmethod
+    def shared_process_pool(
+        cls,
+        max_workers: Optional[int] = None
+    ) -> ProcessPoolExecutor:
+        """
+        Get the process pool of 'max_workers' workers shared by every upload of this process. It is
+        created on first use and replaced if a worker died.
+
+        Args:
+            max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs
+                available to this process.
+
+        Returns:
+            ProcessPoolExecutor: The pool.
+        """
+        max_workers = max_workers or cls.available_cpus()
+        with _process_pools_lock:
+            pool = _process_pools.get(max_workers)
+            if pool is None or getattr(pool, "_broken", False):
+                pool = _process_pools[max_workers] = cls.process_pool(max_workers)
+            return pool
+
+    @staticmethod
+    def available_cpus() -> int:
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    @staticmethod
+    def expand_paths(
+        path: str
+    ) -> List[str]:
+        """
+        Expand a directory or a glob pattern into the PDF files it designates.
+
+        Args:
+            path (str): A PDF file, a directory (all its PDFs, recursively) or a glob pattern.
 
+        Returns:
+            List[str]: Sorted list of PDF paths.
+        """
+        if os.path.isdir(path):
+            pattern = os.path.join(path, "**", "*")
+        elif glob.has_magic(path):
+            pattern = path
+        else:
+            return [path]
+        return sorted(
+            match for match in glob.glob(pattern, recursive=True)
+            if os.path.isfile(match) and match.lower().endswith('.pdf')
+        )
+
+    @staticmethod
+    def _validate(
+        file_path: str
+    ):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File {file_path} does not exist")
+        
+        _, file_extension = os.path.splitext(file_path)
+        if file_extension.lower() != '.pdf':
+            raise ValueError(f"File {file_path} is not a PDF")
+
+    @staticmethod
+    def _file_metadata(
+        file_path: str
+    ) -> dict:
+        return {
+            'source': os.path.basename(file_path),
+            'file_path': file_path,
+            'file_type': 'pdf',
+            'loader': 'PyPDFLoader'
+        }
+
+    @staticmethod
+    def _result(
+        future,
+        file_path: str
+    ) -> List[Tuple[int, str, str]]:
+        try:
+            return future.result()
+        except Exception as e:
+            raise RuntimeError(f"Error cargando {file_path}: {e}") from e
 
+    @staticmethod
+    def _to_documents(
+        pages: List[Tuple[int, str, str]],
+        metadata: dict
+    ) -> Iterator[Document]:
+        for number, label, text in pages:
+            yield Document(
+                page_content=text,
+                metadata={**metadata, 'page': number, 'page_label': label}
+            )
@@ -1,31 +1,115 @@
-from typing import List
+import os
+import re
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
 from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+load_dotenv()
+
+SPLITTER_MODES = ("character", "token", "semantic")
+SPLITTER_MODE = os.getenv("SPLITTER_MODE", "character")
+SPLITTER_CHUNK_TOKENS = int(os.getenv("SPLITTER_CHUNK_TOKENS", 128))
+SPLITTER_OVERLAP_TOKENS = int(os.getenv("SPLITTER_OVERLAP_TOKENS", 16))
+SPLITTER_BREAKPOINT_PERCENTILE = float(os.getenv("SPLITTER_BREAKPOINT_PERCENTILE", 90))
+SPLITTER_NAMES = {
+    "character": "RecursiveCharacterTextSplitter",
+    "token": "TokenSplitter",
+    "semantic": "SemanticSplitter",
+}
+# Pages tokenized in one call of the fast tokenizer
+TOKENIZE_BATCH_PAGES = 16
+# Tokens reserved for the [CLS] and [SEP] tokens the embedding model adds
+SPECIAL_TOKENS = 2
+WORD_CHARACTER_PATTERN = re.compile(r"\w")
+SPACE_PATTERN = re.compile(r"\s")
+STOP_CHARACTERS = np.array([ord("."), ord("!"), ord("?")], dtype=np.uint32)
+
+
 class DocumentSplitter:
     """
-    A class to split text into chunks with the RecursiveCharacterTextSplitter method.
+    A class to split text into chunks.
+
+    Three modes are supported:
+        "character": RecursiveCharacterTextSplitter with 'chunk_size' characters per chunk.
+        "token": chunks of at most 'chunk_tokens' tokens of the embedding model's tokenizer, ending
+            at a sentence end when one falls in the second half of the chunk, otherwise at a word end,
+            so no chunk is truncated by the embedding model and none is needlessly short.
+        "semantic": sentences grouped until the embedding distance between two consecutive sentences
+            is above the 'breakpoint_percentile' of the page, within the same token limit.
     """
 
     def __init__(
         self,
         chunk_size: int = 500,
-        chunk_overlap: int = 50
+        chunk_overlap: int = 50,
+        mode: str = SPLITTER_MODE,
+        embedder: Optional[Any] = None,
+        tokenizer: Optional[Any] = None,
+        chunk_tokens: int = SPLITTER_CHUNK_TOKENS,
+        chunk_overlap_tokens: int = SPLITTER_OVERLAP_TOKENS,
+        breakpoint_percentile: float = SPLITTER_BREAKPOINT_PERCENTILE
     ):
         """
         Initialize the DocumentSplitter.
 
         Args:
-            chunk_size (int, optional): Maximum number of characters in each chunk. 
+            chunk_size (int, optional): Maximum number of characters in each chunk.
                 Defaults to 500.
-            chunk_overlap (int, optional): Number of characters to overlap between chunks. 
+            chunk_overlap (int, optional): Number of characters to overlap between chunks.
                 Defaults to 50.
+            mode (str, optional): "character", "token" or "semantic". Defaults to the SPLITTER_MODE
+                environment variable or "character".
+            embedder (Embedder, optional): Embedding model whose tokenizer and sequence length bound the
+                chunks, and which embeds the sentences in "semantic" mode.
+            tokenizer (Any, optional): Fast Hugging Face tokenizer. Defaults to the embedder's; without
+                one, words and punctuation marks are counted as tokens.
+            chunk_tokens (int, optional): Maximum number of tokens in each chunk, capped to the embedder's
+                sequence length. Defaults to the SPLITTER_CHUNK_TOKENS environment variable or 128.
+            chunk_overlap_tokens (int, optional): Number of tokens to overlap between chunks in "token"
+                mode. Defaults to the SPLITTER_OVERLAP_TOKENS environment variable or 16.
+            breakpoint_percentile (float, optional): Percentile of the sentence distances of a page above
+                which a new chunk starts in "semantic" mode. Defaults to the
+                SPLITTER_BREAKPOINT_PERCENTILE environment variable or 90.
         """
+        if mode not in SPLITTER_MODES:
+            raise ValueError(f"Unknown splitter mode {mode!r}, expected one of {SPLITTER_MODES}")
+        if mode == "semantic" and embedder is None:
+            raise ValueError("The semantic splitter needs an embedder")
+
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embedder = embedder
+        self.tokenizer = tokenizer if tokenizer is not None else getattr(embedder, "tokenizer", None)
+        max_tokens = getattr(embedder, "max_tokens", None)
+        self.chunk_tokens = min(chunk_tokens, max_tokens - SPECIAL_TOKENS) if max_tokens else chunk_tokens
+        self.chunk_overlap_tokens = min(chunk_overlap_tokens, self.chunk_tokens // 2)
+        self.breakpoint_percentile = breakpoint_percentile
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
 
+    @property
+    def signature(self) -> str:
+        """
+        Returns:
+            str: The options that change the chunks, empty for the default character splitter, so
+                documents are split again when they change.
+        """
+        if self.mode == "character":
+            if (self.chunk_size, self.chunk_overlap) == (500, 50):
+                return ""
+            return f"@character-{self.chunk_size}-{self.chunk_overlap}"
+        signature = f"@{self.mode}-{self.chunk_tokens}"
+        if self.mode == "token":
+            return f"{signature}-{self.chunk_overlap_tokens}"
+        return f"{signature}-{self.breakpoint_percentile:g}-{getattr(self.embedder, 'variant', '')}"
+
     def split_text(
         self, documents: List[Document]
     ) -> List[Document]:
@@ -38,18 +122,208 @@ class DocumentSplitter:
         Returns:
             List[Document]: List of document chunks.
         """
-        try:
-            chunks = self.text_splitter.split_documents(documents)
-            
-            for i, chunk in enumerate(chunks):
+        chunks = list(self.split_stream(documents))
+        for chunk in chunks:
+            chunk.metadata['total_chunks'] = len(chunks)
+        return chunks
+
+    def split_stream(
+        self, documents: Iterable[Document]
+    ) -> Iterator[Document]:
+        """
+        Splits documents into chunks lazily, yielding the chunks of each document as soon as it arrives.
+        In "token" and "semantic" mode, documents are tokenized TOKENIZE_BATCH_PAGES at a time.
+
+        The chunks are the same as those of 'split_text', but since the total is not known while
+        streaming, their metadata has no 'total_chunks'.
+
+        Args:
+            documents (Iterable[Document]): Documents to split, e.g. pages from 'DocumentLoader.iter_pages'.
+
+        Yields:
+            Document: Document chunks.
+        """
+        chunk_id = 0
+        documents = iter(documents)
+        while batch := list(islice(documents, 1 if self.mode == "character" else TOKENIZE_BATCH_PAGES)):
+            try:
+                chunks = self._split_batch(batch)
+            except Exception as e:
+                raise RuntimeError(f"Failed to split documents: {e}")
+
+            for chunk in chunks:
                 chunk.metadata.update({
-                    'chunk_id': i,
-                    'total_chunks': len(chunks),
-                    'splitter': 'RecursiveCharacterTextSplitter',
+                    'chunk_id': chunk_id,
+                    'splitter': SPLITTER_NAMES[self.mode],
                     'chunk_size': len(chunk.page_content),
                 })
+                chunk_id += 1
+                yield chunk
 
-        except Exception as e:
-            raise RuntimeError(f"Failed to split documents: {e}")
-        
+    def _split_batch(
+        self,
+        documents: List[Document]
+    ) -> List[Document]:
+        if self.mode == "character":
+            return self.text_splitter.split_documents(documents)
+
+        texts = [document.page_content for document in documents]
+        offsets = self.token_offsets(texts)
+        chunks = []
+        for document, text, (starts, ends) in zip(documents, texts, offsets):
+            if self.mode == "token":
+                spans = self.token_spans(text, starts, ends, self.chunk_tokens, self.chunk_overlap_tokens)
+            else:
+                spans = self._semantic_spans(text, starts, ends)
+            for start, end, tokens in spans:
+                chunk_text = text[start:end].strip()
+                if chunk_text:
+                    chunks.append(Document(
+                        page_content=chunk_text,
+                        metadata={**document.metadata, 'chunk_tokens': tokens}
+                    ))
         return chunks
+
+    def token_offsets(
+        self,
+        texts: List[str]
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Tokenize texts in one batched call and return the character span of every token.
+
+        Args:
+            texts (List[str]): Texts to tokenize.
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray]]: Start and end character offsets of the tokens of each text.
+        """
+        if self.tokenizer is None:
+            return [self._word_offsets(text) for text in texts]
+        encoded = self.tokenizer(
+            texts, add_special_tokens=False, return_offsets_mapping=True, return_attention_mask=False
+        )
+        offsets = []
+        for mapping in encoded["offset_mapping"]:
+            mapping = np.asarray(mapping, dtype=np.int64).reshape(-1, 2)
+            offsets.append((mapping[:, 0], mapping[:, 1]))
+        return offsets
+
+    @staticmethod
+    def token_spans(
+        text: str,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        chunk_tokens: int,
+        overlap_tokens: int = 0
+    ) -> List[Tuple[int, int, int]]:
+        """
+        Cut a tokenized text into windows of at most 'chunk_tokens' tokens.
+
+        A window ends after the last sentence end in its second half, otherwise after its last
+        complete word; the next window starts 'overlap_tokens' earlier, at the start of a word.
+
+        Args:
+            text (str): The text.
+            starts (np.ndarray): Start character offset of every token.
+            ends (np.ndarray): End character offset of every token.
+            chunk_tokens (int): Maximum number of tokens per window.
+            overlap_tokens (int): Number of tokens shared by consecutive windows.
+
+        Returns:
+            List[Tuple[int, int, int]]: Start and end character offsets and token count of every window.
+        """
+        count = len(starts)
+        if count == 0:
+            return []
+        # A word ends where the next token does not start right after this one
+        word_end = np.append(starts[1:] > ends[:-1], True)
+        word_start = np.insert(word_end[:-1], 0, True)
+        characters = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        sentence_end = word_end & np.isin(characters[np.maximum(ends - 1, 0)], STOP_CHARACTERS)
+        word_ends = np.flatnonzero(word_end)
+        word_starts = np.flatnonzero(word_start)
+        sentence_ends = np.flatnonzero(sentence_end)
+
+        spans = []
+        first = 0
+        while first < count:
+            limit = first + chunk_tokens
+            if limit >= count:
+                last = count - 1
+            else:
+                # Last sentence end, else last word end, within [first + chunk_tokens // 2, limit)
+                i = np.searchsorted(sentence_ends, limit) - 1
+                if i >= 0 and sentence_ends[i] >= first + chunk_tokens // 2:
+                    last = int(sentence_ends[i])
+                else:
+                    i = np.searchsorted(word_ends, limit) - 1
+                    last = int(word_ends[i]) if i >= 0 and word_ends[i] >= first else limit - 1
+            spans.append((int(starts[first]), int(ends[last]), last - first + 1))
+            if last == count - 1:
+                break
+            following = max(last + 1 - overlap_tokens, first + 1)
+            i = np.searchsorted(word_starts, following)
+            first = int(word_starts[i]) if i < len(word_starts) and word_starts[i] <= last else last + 1
+        return spans
+
+    def _semantic_spans(
+        self,
+        text: str,
+        starts: np.ndarray,
+        ends: np.ndarray
+    ) -> List[Tuple[int, int, int]]:
+        """
+        Group the sentences of a text at embedding-distance breakpoints. Groups longer than
+        'chunk_tokens' are cut into token windows.
+        """
+        sentences = [
+            (match.start(), match.end()) for match in re.finditer(r"\S.*?(?:[.!?](?=\s)|$)", text, re.S)
+        ]
+        if not sentences:
+            return []
+        # Token index at which each sentence starts
+        bounds = np.searchsorted(starts, [start for start, _ in sentences] + [len(text)])
+
+        breaks = np.zeros(len(sentences), dtype=bool)
+        if len(sentences) > 2:
+            vectors = np.asarray(
+                self.embedder.embedding.embed_documents([text[start:end] for start, end in sentences]),
+                dtype=np.float32
+            )
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            distances = 1.0 - (vectors[:-1] * vectors[1:]).sum(axis=1)
+            breaks[1:] = distances > np.percentile(distances, self.breakpoint_percentile)
+        breaks[0] = True
+
+        spans = []
+        group_starts = np.flatnonzero(breaks)
+        for first, following in zip(group_starts, np.append(group_starts[1:], len(sentences))):
+            token_first, token_following = int(bounds[first]), int(bounds[following])
+            if token_following - token_first <= self.chunk_tokens:
+                if token_following > token_first:
+                    spans.append((int(starts[token_first]), int(ends[token_following - 1]),
+                                  token_following - token_first))
+                continue
+            for start, end, tokens in self.token_spans(
+                text, starts[token_first:token_following], ends[token_first:token_following], self.chunk_tokens
+            ):
+                spans.append((start, end, tokens))
+        return spans
+
+    @staticmethod
+    def _word_offsets(
+        text: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Offsets of the words and punctuation marks of a text, found with array operations on a copy
+        where every word character is "a" and every space " ".
+        """
+        masked = SPACE_PATTERN.sub(" ", WORD_CHARACTER_PATTERN.sub("a", text))
+        codes = np.frombuffer(masked.encode("utf-32-le"), dtype=np.uint32)
+        word = codes == ord("a")
+        mark = ~word & (codes != ord(" "))
+        previous_word = np.concatenate(([False], word[:-1]))
+        next_word = np.concatenate((word[1:], [False]))
+        starts = np.flatnonzero(mark | (word & ~previous_word))
+        ends = np.flatnonzero(mark | (word & ~next_word)) + 1
+        return starts, ends
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+"""
+This script defines a content-addressed, on-disk cache of chunk embeddings so chunks that were
+already embedded with a model are never sent through it again.
+"""
+
+
+class EmbeddingCache:
+    """
+    A cache of embeddings keyed by the SHA-256 of (model name, text).
+
+    Each model gets its own directory with three files:
+        - 'vectors.bin': a row-major matrix of float16 or float32 vectors, read through a memory map.
+        - 'keys.bin': the 32-byte digest of every row, in the same order.
+        - 'meta.json': the dimension and dtype of the vectors.
+    New rows are appended to both files, so the cache can only grow. It is safe to share between
+    threads of one process, not between processes writing at the same time.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        model_name: str,
+        dtype: str = "float16"
+    ):
+        """
+        Initialize the EmbeddingCache.
+
+        Args:
+            directory (str): Root directory of the cache.
+            model_name (str): Name of the embedding model the vectors come from.
+            dtype (str): "float16" or "float32". Only used when the cache is created. Defaults to "float16".
+        """
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"Unsupported dtype {dtype}")
+
+        self.model_name = model_name
+        self.directory = os.path.join(directory, re.sub(r"[^\w.-]", "_", model_name))
+        self._vectors_path = os.path.join(self.directory, "vectors.bin")
+        self._keys_path = os.path.join(self.directory, "keys.bin")
+        self._meta_path = os.path.join(self.directory, "meta.json")
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self.dtype = np.dtype(dtype)
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def content_hash(
+        model_name: str,
+        text: str
+    ) -> bytes:
+        """
+        Args:
+            model_name (str): Name of the embedding model.
+            text (str): Chunk text.
+
+        Returns:
+            bytes: SHA-256 digest of the pair.
+        """
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(
+        self,
+        texts: Sequence[str]
+    ) -> List[Optional[List[float]]]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            texts (Sequence[str]): Texts to look up.
+
+        Returns:
+            List[Optional[List[float]]]: The embedding of each text, or None when it is not cached.
+        """
+        with self._lock:
+            rows = [self._rows.get(self.content_hash(self.model_name, text)) for text in texts]
+            if any(row is not None for row in rows) and (
+                self._matrix is None or self._matrix.shape[0] < len(self._rows)
+            ):
+                self._map()
+            return [
+                self._matrix[row].astype(np.float32).tolist() if row is not None else None
+                for row in rows
+            ]
+
+    def put_many(
+        self,
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]]
+    ):
+        """
+        Store embeddings. Texts that are already cached are skipped.
+
+        Args:
+            texts (Sequence[str]): Embedded texts.
+            vectors (Sequence[Sequence[float]]): Their embeddings, in the same order.
+        """
+        with self._lock:
+            new_keys, new_vectors = {}, []
+            for text, vector in zip(texts, vectors):
+                key = self.content_hash(self.model_name, text)
+                if key in self._rows or key in new_keys:
+                    continue
+                new_keys[key] = None
+                new_vectors.append(vector)
+
+            if not new_keys:
+                return
+
+            # Validate before any state changes, so a rejected batch leaves the cache as it was
+            matrix = np.asarray(new_vectors, dtype=self.dtype)
+            if matrix.ndim != 2 or (self.dim is not None and matrix.shape[1] != self.dim):
+                raise ValueError(f"Expected vectors of size {self.dim}, got shape {matrix.shape}")
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                with open(self._meta_path, "w") as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(matrix).tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(new_keys))
+            for key in new_keys:
+                self._rows[key] = len(self._rows)
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+
+        for path in (self._keys_path, self._vectors_path):
+            if not os.path.exists(path):
+                open(path, "ab").close()
+        with open(self._keys_path, "rb") as f:
+            keys = f.read()
+        row_bytes = self.dim * self.dtype.itemsize
+        rows = min(len(keys) // 32, os.path.getsize(self._vectors_path) // row_bytes)
+
+        # A crash in the middle of an append leaves a partial row in one or both files; cut them
+        # back to the last complete row so the next appends stay aligned with their keys
+        for path, size in ((self._keys_path, rows * 32), (self._vectors_path, rows * row_bytes)):
+            if os.path.getsize(path) != size:
+                os.truncate(path, size)
+        self._rows = {keys[i * 32:(i + 1) * 32]: i for i in range(rows)}
+
+    def _map(self):
+        self._matrix = np.memmap(
+            self._vectors_path, dtype=self.dtype, mode="r", shape=(len(self._rows), self.dim)
+        )
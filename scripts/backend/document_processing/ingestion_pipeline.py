@@ -0,0 +1,183 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Sequence
+
+from scripts.backend.runtime.metrics import metrics
+from scripts.backend.runtime.tracing import STAGE_BUCKETS
+
+"""
+This script defines a small stage pipeline: every stage runs in its own thread and hands its output
+to the next one through a bounded queue, so a slow stage makes the previous ones wait instead of
+letting items pile up in memory.
+"""
+
+_END = object()
+
+
+class Stage(NamedTuple):
+    """
+    A pipeline stage.
+
+    Attributes:
+        name (str): Name of the stage, used for thread names and metrics.
+        fn (Callable[[Iterator[Any]], Iterable[Any]]): Turns the stream of input items into a stream
+            of output items, e.g. a generator function.
+        queue_size (int): Capacity of the queue holding the stage's output.
+    """
+    name: str
+    fn: Callable[[Iterator[Any]], Iterable[Any]]
+    queue_size: int = 8
+
+
+class IngestionPipeline:
+    """
+    Runs a source iterator through a sequence of stages, each in its own thread.
+
+    The source is consumed by the first stage's thread. The output of the last stage is returned as an
+    iterator consumed by the caller. An error in any stage stops all the others and is raised to the caller.
+    The depth of every stage's output queue is exported as the 'ingestion_<stage>_queue_depth' gauge.
+    The time every stage spends working, not counting the time it waits for its input or for room
+    in its output queue, is kept in 'stage_seconds' and observed in the 'ingestion_<stage>_seconds'
+    histogram once the run ends.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        poll_interval: float = 0.1
+    ):
+        """
+        Initialize the IngestionPipeline.
+
+        Args:
+            stages (Sequence[Stage]): Stages in processing order.
+            poll_interval (float): Seconds between checks for a stopped pipeline while blocked on a queue.
+                Defaults to 0.1.
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = list(stages)
+        self.poll_interval = poll_interval
+        self.stage_seconds: Dict[str, float] = {}
+
+    def run(
+        self,
+        source: Iterable[Any]
+    ) -> Iterator[Any]:
+        """
+        Start the stage threads and yield the output of the last stage.
+
+        Args:
+            source (Iterable[Any]): Input of the first stage.
+
+        Yields:
+            Any: Output items of the last stage.
+
+        Raises:
+            Exception: The first error raised by a stage.
+        """
+        stop = threading.Event()
+        errors = []
+        self.stage_seconds = {stage.name: 0.0 for stage in self.stages}
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        gauges = [
+            metrics.gauge(f"ingestion_{stage.name}_queue_depth", f"Items waiting after the {stage.name} stage")
+            for stage in self.stages
+        ]
+        threads = []
+
+        for i, stage in enumerate(self.stages):
+            inbound = iter(source) if i == 0 else self._drain(queues[i - 1], gauges[i - 1], stop)
+            thread = threading.Thread(
+                target=self._work,
+                args=(stage, inbound, queues[i], gauges[i], stop, errors, i > 0),
+                name=f"ingestion-{stage.name}",
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+        try:
+            yield from self._drain(queues[-1], gauges[-1], stop)
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            for name, seconds in self.stage_seconds.items():
+                metrics.histogram(
+                    f"ingestion_{name}_seconds", STAGE_BUCKETS, f"Time spent working in the {name} stage per run"
+                ).observe(seconds)
+
+    def _work(
+        self,
+        stage: Stage,
+        inbound: Iterator[Any],
+        outbound: queue.Queue,
+        gauge,
+        stop: threading.Event,
+        errors: list,
+        exclude_input_wait: bool = True
+    ):
+        waited = [0.0]
+
+        def timed(items: Iterator[Any]) -> Iterator[Any]:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    waited[0] += time.perf_counter() - start
+                yield item
+
+        try:
+            outputs = iter(stage.fn(timed(inbound) if exclude_input_wait else inbound))
+            while True:
+                start, waited_before = time.perf_counter(), waited[0]
+                try:
+                    item = next(outputs)
+                except StopIteration:
+                    break
+                finally:
+                    self.stage_seconds[stage.name] += time.perf_counter() - start - (waited[0] - waited_before)
+                if not self._put(outbound, item, stop):
+                    return
+                gauge.set(outbound.qsize())
+            self._put(outbound, _END, stop)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def _put(
+        self,
+        outbound: queue.Queue,
+        item: Any,
+        stop: threading.Event
+    ) -> bool:
+        while not stop.is_set():
+            try:
+                outbound.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(
+        self,
+        inbound: queue.Queue,
+        gauge,
+        stop: threading.Event
+    ) -> Iterator[Any]:
+        while not stop.is_set():
+            try:
+                item = inbound.get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+            gauge.set(inbound.qsize())
+            if item is _END:
+                return
+            yield item
@@ -0,0 +1,1040 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client.http import models
+
+"""
+This script defines an in-process vector index that stores a collection in a memory-mapped NumPy matrix
+with a payload sidecar, and a client exposing the subset of the QdrantClient API used by this project,
+so VectorStore, Retriever and LangChain's QdrantVectorStore run on it unchanged without network round trips.
+
+Search is an exact, vectorized top-k while the collection is small. Once a write takes it above
+'ivf_threshold' points, an IVF index (k-means centroids and inverted lists) is trained in a background
+thread, and then only the 'nprobe' closest lists are scanned. Searches stay exact until it is ready.
+"""
+
+load_dotenv()
+
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", ".cache/vectors")
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32")
+LOCAL_VECTOR_IVF_THRESHOLD = int(os.getenv("LOCAL_VECTOR_IVF_THRESHOLD", 50000))
+LOCAL_VECTOR_NPROBE = int(os.getenv("LOCAL_VECTOR_NPROBE", 8))
+
+DTYPES = ("float32", "float16", "int8")
+SEARCH_BLOCK_ROWS = 65536
+INITIAL_CAPACITY = 1024
+
+PointId = Union[int, str]
+
+
+def normalize_id(point_id: Any) -> PointId:
+    """
+    Args:
+        point_id (Any): Integer or UUID point id, in any UUID notation.
+
+    Returns:
+        PointId: The id as Qdrant returns it: an int, or a UUID in its canonical hyphenated form.
+    """
+    if isinstance(point_id, int):
+        return point_id
+    return str(uuid.UUID(str(point_id)))
+
+
+class LocalVectorIndex:
+    """
+    A single collection: vectors in a memory-mapped matrix, payloads in memory backed by an append-only
+    log, and an optional IVF index. Thread-safe. The rows of deleted points are reused by later inserts,
+    so the matrix grows with the number of live points rather than with the number of writes.
+
+    Files in 'directory':
+        config.json: vector size, distance, dtype and number of rows.
+        vectors.bin (and scales.bin for int8): the row-major vector matrix.
+        payloads.jsonl: log of payload writes and deletions, replayed on open.
+        ivf_centroids.npy, ivf_assignments.npy: the IVF index, once trained.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        size: int,
+        distance: models.Distance = models.Distance.COSINE,
+        dtype: str = LOCAL_VECTOR_DTYPE,
+        ivf_threshold: int = LOCAL_VECTOR_IVF_THRESHOLD,
+        nprobe: int = LOCAL_VECTOR_NPROBE
+    ):
+        """
+        Open the collection stored in 'directory', creating it if needed.
+
+        Args:
+            directory (str): Directory of the collection.
+            size (int): Vector size. Ignored when the collection already exists.
+            distance (Distance): COSINE or DOT. Ignored when the collection already exists.
+            dtype (str): Storage precision, "float32", "float16" or "int8" (symmetric per-row scale).
+                Ignored when the collection already exists. Defaults to LOCAL_VECTOR_DTYPE or "float32".
+            ivf_threshold (int): Number of points above which searches use the IVF index.
+                Defaults to LOCAL_VECTOR_IVF_THRESHOLD or 50000.
+            nprobe (int): Number of IVF lists scanned per search. Defaults to LOCAL_VECTOR_NPROBE or 8.
+        """
+        self.directory = directory
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        config_path = os.path.join(directory, "config.json")
+
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+            size, distance, dtype = config["size"], models.Distance(config["distance"]), config["dtype"]
+            self._count = config["count"]
+            capacity = config["capacity"]
+        else:
+            if distance not in (models.Distance.COSINE, models.Distance.DOT):
+                raise ValueError(f"The local vector backend supports COSINE and DOT, not {distance}")
+            if dtype not in DTYPES:
+                raise ValueError(f"Unknown vector dtype {dtype!r}, expected one of {DTYPES}")
+            os.makedirs(directory, exist_ok=True)
+            self._count = 0
+            capacity = INITIAL_CAPACITY
+
+        self.size = size
+        self.distance = distance
+        self.dtype = dtype
+        self._capacity = capacity
+        self._open_matrix()
+
+        self.ids: List[Optional[PointId]] = [None] * self._count
+        self.payloads: List[Optional[Dict]] = [None] * self._count
+        self._rows: Dict[PointId, int] = {}
+        self._deleted = np.ones(self._capacity, dtype=bool)
+        self._log_lines = 0
+        self._replay_log()
+        # Rows of deleted points, lowest last so they are reused first
+        self._free: List[int] = np.flatnonzero(self._deleted[:self._count])[::-1].tolist()
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._ivf_trained_at = 0
+        self._training: Optional[threading.Thread] = None
+        self._training_dirty: Optional[set] = None
+        self._load_ivf()
+
+        if not os.path.exists(config_path):
+            self._write_config()
+        with self._lock:
+            self._maybe_train_ivf()
+
+    @property
+    def count(self) -> int:
+        """
+        Returns:
+            int: Number of live points.
+        """
+        return len(self._rows)
+
+    def upsert(
+        self,
+        ids: Sequence[PointId],
+        vectors: Sequence[Sequence[float]],
+        payloads: Sequence[Optional[Dict]]
+    ):
+        """
+        Insert points, or overwrite the points with the same ids.
+
+        Args:
+            ids (Sequence[PointId]): Point ids.
+            vectors (Sequence[Sequence[float]]): Their vectors.
+            payloads (Sequence[Optional[Dict]]): Their payloads.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.size)
+        if self.distance == models.Distance.COSINE:
+            matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            rows = []
+            for point_id in ids:
+                point_id = normalize_id(point_id)
+                row = self._rows.get(point_id)
+                if row is None and self._free:
+                    row = self._free.pop()
+                    self._rows[point_id] = row
+                    self.ids[row] = point_id
+                elif row is None:
+                    row = self._count
+                    self._count += 1
+                    self._rows[point_id] = row
+                    self.ids.append(point_id)
+                    self.payloads.append(None)
+                rows.append(row)
+
+            self._ensure_capacity(self._count)
+            rows_array = np.asarray(rows, dtype=np.int64)
+            self._write_rows(rows_array, matrix)
+            self._deleted[rows_array] = False
+            for row, payload in zip(rows, payloads):
+                self.payloads[row] = payload or {}
+            self._append_log([
+                {"op": "put", "row": row, "id": self.ids[row], "payload": self.payloads[row]} for row in rows
+            ])
+
+            if self._centroids is not None:
+                self._assignments[rows_array] = self._nearest_centroids(matrix)
+                self._lists = None
+            if self._training_dirty is not None:
+                self._training_dirty.update(rows)
+            self._maybe_train_ivf()
+
+    def delete(
+        self,
+        rows: Iterable[int]
+    ) -> int:
+        """
+        Delete points by row. Their rows are reused by the next inserts.
+
+        Returns:
+            int: Number of deleted points.
+        """
+        with self._lock:
+            rows = [row for row in dict.fromkeys(rows) if not self._deleted[row]]
+            for row in rows:
+                self._deleted[row] = True
+                self._rows.pop(self.ids[row], None)
+                self.payloads[row] = None
+            self._free.extend(rows)
+            if rows:
+                self._append_log([{"op": "del", "rows": rows}])
+            return len(rows)
+
+    def set_payload(
+        self,
+        rows: Iterable[int],
+        payload: Dict,
+        key: Optional[str] = None
+    ):
+        """
+        Merge 'payload' into the payload of the given rows, or into its nested dict 'key'.
+        """
+        with self._lock:
+            rows = [row for row in rows if not self._deleted[row]]
+            for row in rows:
+                target = self.payloads[row]
+                if key:
+                    for part in key.split("."):
+                        target = target.setdefault(part, {})
+                target.update(payload)
+            if rows:
+                self._append_log([{"op": "set", "rows": rows, "payload": payload, "key": key}])
+
+    def row_of(
+        self,
+        point_id: PointId
+    ) -> Optional[int]:
+        return self._rows.get(normalize_id(point_id))
+
+    def rows_matching(
+        self,
+        predicate: Optional[Callable[[PointId, Dict], bool]] = None
+    ) -> np.ndarray:
+        """
+        Args:
+            predicate (Callable[[PointId, Dict], bool], optional): Test on the id and payload of a point.
+                Defaults to all points.
+
+        Returns:
+            np.ndarray: Rows of the live points passing the test.
+        """
+        with self._lock:
+            if predicate is None:
+                return np.flatnonzero(~self._deleted[:self._count])
+            return np.asarray(
+                [row for point_id, row in self._rows.items() if predicate(point_id, self.payloads[row])],
+                dtype=np.int64
+            )
+
+    def vectors(
+        self,
+        rows: np.ndarray
+    ) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The stored vectors of 'rows' as float32 (normalized for COSINE).
+        """
+        with self._lock:
+            return self._read_rows(np.asarray(rows, dtype=np.int64))
+
+    def search(
+        self,
+        query: Sequence[float],
+        limit: int,
+        rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Find the points closest to 'query'.
+
+        Args:
+            query (Sequence[float]): Query vector.
+            limit (int): Number of results.
+            rows (np.ndarray, optional): Restrict the search to these rows, e.g. those passing a filter.
+                The search is then exact. Defaults to all points.
+
+        Returns:
+            List[Tuple[int, float]]: (row, score) pairs, best first. Scores are cosine similarities
+                for COSINE and dot products for DOT.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if self.distance == models.Distance.COSINE:
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        with self._lock:
+            if limit <= 0 or self.count == 0:
+                return []
+            if rows is None and self._uses_ivf():
+                rows = self._probe(query)
+
+            if rows is None:
+                scores = np.empty(self._count, dtype=np.float32)
+                for start in range(0, self._count, SEARCH_BLOCK_ROWS):
+                    stop = min(start + SEARCH_BLOCK_ROWS, self._count)
+                    scores[start:stop] = self._read_block(start, stop) @ query
+                scores[self._deleted[:self._count]] = -np.inf
+                candidates = np.arange(self._count)
+            else:
+                candidates = rows[~self._deleted[rows]] if len(rows) else rows
+                scores = np.empty(len(candidates), dtype=np.float32)
+                for start in range(0, len(candidates), SEARCH_BLOCK_ROWS):
+                    block = candidates[start:start + SEARCH_BLOCK_ROWS]
+                    scores[start:start + len(block)] = self._read_rows(block) @ query
+
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(candidates[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def search_batch(
+        self,
+        queries: Sequence[Sequence[float]],
+        limit: int
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Find the points closest to each of several queries. An exact search reads the matrix once
+        for all queries instead of once per query; with the IVF index the queries are probed one by one.
+
+        Args:
+            queries (Sequence[Sequence[float]]): Query vectors.
+            limit (int): Number of results per query.
+
+        Returns:
+            List[List[Tuple[int, float]]]: (row, score) pairs of every query, best first.
+        """
+        with self._lock:
+            exact = not self._uses_ivf()
+        if not exact or len(queries) <= 1:
+            return [self.search(query, limit) for query in queries]
+
+        matrix = np.asarray(queries, dtype=np.float32)
+        if self.distance == models.Distance.COSINE:
+            matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            if limit <= 0 or self.count == 0:
+                return [[] for _ in queries]
+            scores = np.empty((self._count, len(matrix)), dtype=np.float32)
+            for start in range(0, self._count, SEARCH_BLOCK_ROWS):
+                stop = min(start + SEARCH_BLOCK_ROWS, self._count)
+                scores[start:stop] = self._read_block(start, stop) @ matrix.T
+            scores[self._deleted[:self._count]] = -np.inf
+
+        results = []
+        for column in scores.T:
+            top = np.argpartition(-column, limit - 1)[:limit] if len(column) > limit else np.arange(len(column))
+            top = top[np.argsort(-column[top], kind="stable")]
+            results.append([(int(i), float(column[i])) for i in top if np.isfinite(column[i])])
+        return results
+
+    def wait_for_ivf(
+        self,
+        timeout: Optional[float] = None
+    ) -> bool:
+        """
+        Wait for the IVF training in progress, if any.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait. Defaults to no limit.
+
+        Returns:
+            bool: Whether searches use the IVF index.
+        """
+        with self._lock:
+            training = self._training
+        if training is not None:
+            training.join(timeout)
+        with self._lock:
+            return self._uses_ivf()
+
+    def flush(self):
+        """
+        Write the matrix, the IVF index and the row count to disk.
+        """
+        with self._lock:
+            self._matrix.flush()
+            if self._scales is not None:
+                self._scales.flush()
+            if self._centroids is not None:
+                np.save(os.path.join(self.directory, "ivf_centroids.npy"), self._centroids)
+                np.save(os.path.join(self.directory, "ivf_assignments.npy"), self._assignments[:self._count])
+            self._write_config()
+
+    def _write_config(self):
+        path = os.path.join(self.directory, "config.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({
+                "size": self.size,
+                "distance": self.distance.value,
+                "dtype": self.dtype,
+                "count": self._count,
+                "capacity": self._capacity,
+            }, f)
+        os.replace(path + ".tmp", path)
+
+    def _open_matrix(self):
+        storage = np.int8 if self.dtype == "int8" else np.dtype(self.dtype)
+        self._matrix = self._memmap("vectors.bin", storage, (self._capacity, self.size))
+        self._scales = (
+            self._memmap("scales.bin", np.float32, (self._capacity,)) if self.dtype == "int8" else None
+        )
+
+    def _memmap(
+        self,
+        name: str,
+        dtype,
+        shape: Tuple[int, ...]
+    ) -> np.memmap:
+        path = os.path.join(self.directory, name)
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < nbytes:
+                f.truncate(nbytes)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _ensure_capacity(
+        self,
+        rows: int
+    ):
+        if rows <= self._capacity:
+            return
+        self._matrix.flush()
+        if self._scales is not None:
+            self._scales.flush()
+        while self._capacity < rows:
+            self._capacity *= 2
+        del self._matrix, self._scales
+        self._open_matrix()
+        deleted = np.ones(self._capacity, dtype=bool)
+        deleted[:len(self._deleted)] = self._deleted
+        self._deleted = deleted
+        if self._assignments is not None:
+            assignments = np.full(self._capacity, -1, dtype=np.int32)
+            assignments[:len(self._assignments)] = self._assignments
+            self._assignments = assignments
+
+    def _write_rows(
+        self,
+        rows: np.ndarray,
+        matrix: np.ndarray
+    ):
+        if self.dtype == "int8":
+            scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12) / 127.0
+            self._matrix[rows] = np.round(matrix / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._matrix[rows] = matrix.astype(self._matrix.dtype)
+
+    def _read_rows(
+        self,
+        rows: np.ndarray
+    ) -> np.ndarray:
+        block = self._matrix[rows].astype(np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows][:, None]
+        return block
+
+    def _read_block(
+        self,
+        start: int,
+        stop: int
+    ) -> np.ndarray:
+        block = np.asarray(self._matrix[start:stop], dtype=np.float32)
+        if self._scales is not None:
+            block = block * self._scales[start:stop][:, None]
+        return block
+
+    def _append_log(
+        self,
+        records: List[Dict]
+    ):
+        with open(os.path.join(self.directory, "payloads.jsonl"), "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        self._log_lines += len(records)
+        if self._log_lines > 2 * self.count + 1000:
+            self._compact_log()
+
+    def _compact_log(self):
+        path = os.path.join(self.directory, "payloads.jsonl")
+        with open(path + ".tmp", "w") as f:
+            for point_id, row in self._rows.items():
+                f.write(json.dumps({"op": "put", "row": row, "id": point_id, "payload": self.payloads[row]}) + "\n")
+        os.replace(path + ".tmp", path)
+        self._log_lines = self.count
+
+    def _replay_log(self):
+        path = os.path.join(self.directory, "payloads.jsonl")
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for line in f:
+                self._log_lines += 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record["op"] == "put":
+                    row = record["row"]
+                    if row >= self._count:
+                        continue
+                    self.ids[row] = record["id"]
+                    self.payloads[row] = record["payload"]
+                    self._rows[record["id"]] = row
+                    self._deleted[row] = False
+                elif record["op"] == "set":
+                    for row in record["rows"]:
+                        if row < self._count and not self._deleted[row]:
+                            target = self.payloads[row]
+                            for part in (record["key"] or "").split(".") if record["key"] else []:
+                                target = target.setdefault(part, {})
+                            target.update(record["payload"])
+                elif record["op"] == "del":
+                    for row in record["rows"]:
+                        if row < self._count and not self._deleted[row]:
+                            self._deleted[row] = True
+                            self._rows.pop(self.ids[row], None)
+                            self.payloads[row] = None
+
+    def _load_ivf(self):
+        centroids_path = os.path.join(self.directory, "ivf_centroids.npy")
+        assignments_path = os.path.join(self.directory, "ivf_assignments.npy")
+        if not (os.path.exists(centroids_path) and os.path.exists(assignments_path)):
+            return
+        self._centroids = np.load(centroids_path)
+        saved = np.load(assignments_path)
+        self._assignments = np.full(self._capacity, -1, dtype=np.int32)
+        self._assignments[:len(saved)] = saved
+        if len(saved) < self._count:
+            rows = np.arange(len(saved), self._count)
+            self._assignments[rows] = self._nearest_centroids(self._read_rows(rows))
+        self._ivf_trained_at = self.count
+
+    def _uses_ivf(self) -> bool:
+        return self._centroids is not None and self.count >= self.ivf_threshold
+
+    def _maybe_train_ivf(self):
+        """
+        Start training the IVF index in a background thread when the collection first crosses
+        'ivf_threshold' points, and again every time it doubles. Called with the lock held.
+        """
+        if self._training is not None or self.count < self.ivf_threshold:
+            return
+        if self._centroids is not None and self.count < 2 * self._ivf_trained_at:
+            return
+        self._training_dirty = set()
+        self._training = threading.Thread(target=self._train_ivf, name="ivf-training", daemon=True)
+        self._training.start()
+
+    def _train_ivf(
+        self,
+        iterations: int = 10,
+        seed: int = 0
+    ):
+        """
+        Train k-means centroids on a sample of the live points and assign every point to its closest one.
+
+        Only the sampling and the reads of each block hold the lock, so writes and searches go on while
+        the centroids are computed; the index is swapped in at the end, and the rows written meanwhile
+        are assigned again with the new centroids.
+        """
+        try:
+            rng = np.random.default_rng(seed)
+            with self._lock:
+                live = self.rows_matching()
+                rows = self._count
+                n_lists = int(min(4096, len(live), max(16, math.sqrt(len(live)))))
+                sample_rows = np.sort(rng.choice(live, size=min(len(live), n_lists * 64), replace=False))
+                sample = self._read_rows(sample_rows)
+            centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, sample)
+                counts = np.bincount(assignment, minlength=n_lists)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+                centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+            centroids = centroids.astype(np.float32)
+
+            assignments = np.empty(rows, dtype=np.int32)
+            for start in range(0, rows, SEARCH_BLOCK_ROWS):
+                stop = min(start + SEARCH_BLOCK_ROWS, rows)
+                with self._lock:
+                    block = self._read_block(start, stop)
+                assignments[start:stop] = np.argmax(block @ centroids.T, axis=1)
+
+            with self._lock:
+                self._centroids = centroids
+                self._assignments = np.full(self._capacity, -1, dtype=np.int32)
+                self._assignments[:rows] = assignments
+                dirty = np.union1d(
+                    np.fromiter(self._training_dirty, dtype=np.int64), np.arange(rows, self._count)
+                )
+                if len(dirty):
+                    self._assignments[dirty] = self._nearest_centroids(self._read_rows(dirty))
+                self._lists = None
+                self._ivf_trained_at = len(live)
+        except Exception as e:
+            print(f"IVF training of {self.directory} failed: {e}")
+        finally:
+            with self._lock:
+                self._training = None
+                self._training_dirty = None
+
+    def _nearest_centroids(
+        self,
+        matrix: np.ndarray
+    ) -> np.ndarray:
+        return np.argmax(matrix @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _probe(
+        self,
+        query: np.ndarray
+    ) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: Rows of the 'nprobe' inverted lists whose centroids are closest to the query.
+        """
+        if self._lists is None:
+            assignments = self._assignments[:self._count]
+            order = np.argsort(assignments, kind="stable")
+            offsets = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+            self._lists = (order, offsets)
+        order, offsets = self._lists
+        nprobe = min(self.nprobe, len(self._centroids))
+        closest = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([order[offsets[i]:offsets[i + 1]] for i in closest])
+
+
+class LocalQdrantClient:
+    """
+    A drop-in replacement for the QdrantClient methods used by this project, backed by one
+    LocalVectorIndex per collection under 'directory'. Filters support FieldCondition with
+    MatchValue, MatchAny, MatchExcept and Range, HasIdCondition, and nested Filters.
+    """
+
+    def __init__(
+        self,
+        directory: str = LOCAL_VECTOR_DIR,
+        dtype: str = LOCAL_VECTOR_DTYPE
+    ):
+        """
+        Initialize the LocalQdrantClient.
+
+        Args:
+            directory (str): Directory holding one subdirectory per collection.
+                Defaults to LOCAL_VECTOR_DIR or ".cache/vectors".
+            dtype (str): Storage precision of new collections. Defaults to LOCAL_VECTOR_DTYPE or "float32".
+        """
+        self.directory = directory
+        self.dtype = dtype
+        self._collections: Dict[str, LocalVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def collection_exists(
+        self,
+        collection_name: str,
+        **kwargs
+    ) -> bool:
+        return self._get(collection_name, required=False) is not None
+
+    def create_collection(
+        self,
+        collection_name: str,
+        vectors_config: models.VectorParams,
+        quantization_config: Optional[models.QuantizationConfig] = None,
+        **kwargs
+    ) -> bool:
+        """
+        Create a collection. Scalar quantization stores it as "int8"; binary quantization is not
+        supported and leaves it at the client's dtype. Searches are exact over the stored vectors,
+        so there is nothing to rescore.
+        """
+        dtype = "int8" if isinstance(quantization_config, models.ScalarQuantization) else self.dtype
+        with self._lock:
+            if collection_name in self._collections or os.path.exists(self._path(collection_name)):
+                raise ValueError(f"Collection {collection_name} already exists")
+            self._collections[collection_name] = LocalVectorIndex(
+                self._path(collection_name),
+                size=vectors_config.size,
+                distance=vectors_config.distance,
+                dtype=dtype,
+            )
+        return True
+
+    def delete_collection(
+        self,
+        collection_name: str,
+        **kwargs
+    ) -> bool:
+        with self._lock:
+            self._collections.pop(collection_name, None)
+            path = self._path(collection_name)
+            if not os.path.exists(path):
+                return False
+            shutil.rmtree(path)
+        return True
+
+    def get_collection(
+        self,
+        collection_name: str
+    ) -> SimpleNamespace:
+        index = self._get(collection_name)
+        return SimpleNamespace(
+            points_count=index.count,
+            payload_schema={},
+            config=SimpleNamespace(params=SimpleNamespace(
+                vectors=models.VectorParams(size=index.size, distance=index.distance)
+            )),
+        )
+
+    def create_payload_index(
+        self,
+        collection_name: str,
+        field_name: str,
+        **kwargs
+    ) -> models.UpdateResult:
+        """
+        Filters are evaluated on the payloads held in memory, so there is nothing to index.
+        """
+        self._get(collection_name)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def upsert(
+        self,
+        collection_name: str,
+        points: Sequence[models.PointStruct],
+        wait: bool = True,
+        **kwargs
+    ) -> models.UpdateResult:
+        index = self._get(collection_name)
+        index.upsert(
+            [point.id for point in points],
+            [point.vector for point in points],
+            [point.payload for point in points],
+        )
+        if wait:
+            index.flush()
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def query_points(
+        self,
+        collection_name: str,
+        query: Sequence[float],
+        query_filter: Optional[models.Filter] = None,
+        limit: int = 10,
+        offset: Optional[int] = None,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        **kwargs
+    ) -> models.QueryResponse:
+        index = self._get(collection_name)
+        rows = index.rows_matching(self._predicate(query_filter)) if query_filter is not None else None
+        offset = offset or 0
+        hits = index.search(query, limit + offset, rows)[offset:]
+        if score_threshold is not None:
+            hits = [(row, score) for row, score in hits if score >= score_threshold]
+        return self._response(index, hits, with_payload, with_vectors)
+
+    def query_batch_points(
+        self,
+        collection_name: str,
+        requests: Sequence[models.QueryRequest],
+        **kwargs
+    ) -> List[models.QueryResponse]:
+        """
+        Run several nearest-neighbour queries. Unfiltered ones share a single pass over the vectors,
+        the others run like 'query_points'.
+        """
+        index = self._get(collection_name)
+        responses: List[Optional[models.QueryResponse]] = [None] * len(requests)
+        plain = [
+            i for i, request in enumerate(requests)
+            if request.filter is None and not request.offset and request.score_threshold is None
+        ]
+        if plain:
+            limit = max(requests[i].limit or 10 for i in plain)
+            hits = index.search_batch([requests[i].query for i in plain], limit)
+            for i, query_hits in zip(plain, hits):
+                request = requests[i]
+                responses[i] = self._response(
+                    index, query_hits[:request.limit or 10], bool(request.with_payload), bool(request.with_vector)
+                )
+
+        for i, request in enumerate(requests):
+            if responses[i] is None:
+                responses[i] = self.query_points(
+                    collection_name, request.query, request.filter, request.limit or 10, request.offset,
+                    bool(request.with_payload), bool(request.with_vector), request.score_threshold
+                )
+        return responses
+
+    def _response(
+        self,
+        index: LocalVectorIndex,
+        hits: List[Tuple[int, float]],
+        with_payload: Union[bool, Sequence[str]],
+        with_vectors: bool
+    ) -> models.QueryResponse:
+        vectors = index.vectors(np.asarray([row for row, _ in hits], dtype=np.int64)) if with_vectors and hits else None
+        return models.QueryResponse(points=[
+            models.ScoredPoint(
+                id=index.ids[row],
+                version=0,
+                score=score,
+                payload=self._include(index.payloads[row], with_payload),
+                vector=vectors[i].tolist() if vectors is not None else None,
+            )
+            for i, (row, score) in enumerate(hits)
+        ])
+
+    def retrieve(
+        self,
+        collection_name: str,
+        ids: Sequence[PointId],
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        **kwargs
+    ) -> List[models.Record]:
+        index = self._get(collection_name)
+        rows = [row for row in (index.row_of(point_id) for point_id in ids) if row is not None]
+        vectors = index.vectors(np.asarray(rows, dtype=np.int64)) if with_vectors and rows else None
+        return [
+            models.Record(
+                id=index.ids[row],
+                payload=self._include(index.payloads[row], with_payload),
+                vector=vectors[i].tolist() if vectors is not None else None,
+            )
+            for i, row in enumerate(rows)
+        ]
+
+    def scroll(
+        self,
+        collection_name: str,
+        scroll_filter: Optional[models.Filter] = None,
+        limit: int = 10,
+        offset: Optional[PointId] = None,
+        with_payload: Union[bool, Sequence[str]] = True,
+        with_vectors: bool = False,
+        **kwargs
+    ) -> Tuple[List[models.Record], Optional[PointId]]:
+        index = self._get(collection_name)
+        rows = np.sort(index.rows_matching(self._predicate(scroll_filter) if scroll_filter is not None else None))
+        start = 0
+        if offset is not None:
+            offset_row = index.row_of(offset)
+            start = int(np.searchsorted(rows, offset_row)) if offset_row is not None else len(rows)
+        page = rows[start:start + limit]
+        next_offset = index.ids[rows[start + limit]] if start + limit < len(rows) else None
+        vectors = index.vectors(page) if with_vectors and len(page) else None
+        return [
+            models.Record(
+                id=index.ids[row],
+                payload=self._include(index.payloads[row], with_payload),
+                vector=vectors[i].tolist() if vectors is not None else None,
+            )
+            for i, row in enumerate(page.tolist())
+        ], next_offset
+
+    def set_payload(
+        self,
+        collection_name: str,
+        payload: Dict,
+        points: Union[models.Filter, models.FilterSelector, Sequence[PointId]],
+        key: Optional[str] = None,
+        **kwargs
+    ) -> models.UpdateResult:
+        index = self._get(collection_name)
+        index.set_payload(self._select(index, points), payload, key)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def batch_update_points(
+        self,
+        collection_name: str,
+        update_operations: Sequence[models.SetPayloadOperation],
+        **kwargs
+    ) -> List[models.UpdateResult]:
+        """
+        Apply payload updates in order. Only SetPayloadOperation is supported.
+        """
+        results = []
+        for operation in update_operations:
+            if not isinstance(operation, models.SetPayloadOperation):
+                raise ValueError(f"The local vector backend does not support {type(operation).__name__}")
+            update = operation.set_payload
+            results.append(self.set_payload(
+                collection_name, update.payload, update.filter or update.points, update.key
+            ))
+        return results
+
+    def delete(
+        self,
+        collection_name: str,
+        points_selector: Union[models.Filter, models.FilterSelector, models.PointIdsList, Sequence[PointId]],
+        **kwargs
+    ) -> models.UpdateResult:
+        index = self._get(collection_name)
+        index.delete(self._select(index, points_selector))
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def count(
+        self,
+        collection_name: str,
+        count_filter: Optional[models.Filter] = None,
+        **kwargs
+    ) -> models.CountResult:
+        index = self._get(collection_name)
+        if count_filter is None:
+            return models.CountResult(count=index.count)
+        return models.CountResult(count=len(index.rows_matching(self._predicate(count_filter))))
+
+    def close(self, **kwargs):
+        with self._lock:
+            for index in self._collections.values():
+                index.flush()
+
+    @staticmethod
+    def _include(
+        payload: Dict,
+        with_payload: Union[bool, Sequence[str]]
+    ) -> Optional[Dict]:
+        if with_payload is True:
+            return payload
+        if not with_payload:
+            return None
+        keys = {key.split(".")[0] for key in with_payload}
+        return {key: value for key, value in payload.items() if key in keys}
+
+    def _path(
+        self,
+        collection_name: str
+    ) -> str:
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", collection_name))
+
+    def _get(
+        self,
+        collection_name: str,
+        required: bool = True
+    ) -> Optional[LocalVectorIndex]:
+        with self._lock:
+            index = self._collections.get(collection_name)
+            if index is None and os.path.exists(os.path.join(self._path(collection_name), "config.json")):
+                index = self._collections[collection_name] = LocalVectorIndex(self._path(collection_name), size=0)
+        if index is None and required:
+            raise ValueError(f"Collection {collection_name} not found")
+        return index
+
+    def _select(
+        self,
+        index: LocalVectorIndex,
+        selector: Union[models.Filter, models.FilterSelector, models.PointIdsList, Sequence[PointId]]
+    ) -> List[int]:
+        if isinstance(selector, models.FilterSelector):
+            selector = selector.filter
+        if isinstance(selector, models.Filter):
+            return index.rows_matching(self._predicate(selector)).tolist()
+        if isinstance(selector, models.PointIdsList):
+            selector = selector.points
+        return [row for row in (index.row_of(point_id) for point_id in selector) if row is not None]
+
+    @classmethod
+    def _predicate(
+        cls,
+        query_filter: models.Filter
+    ) -> Callable[[PointId, Dict], bool]:
+        def test(point_id: PointId, payload: Dict) -> bool:
+            return cls._matches(query_filter, point_id, payload)
+        return test
+
+    @classmethod
+    def _matches(
+        cls,
+        condition: Any,
+        point_id: PointId,
+        payload: Dict
+    ) -> bool:
+        if isinstance(condition, models.Filter):
+            must = condition.must if isinstance(condition.must, list) else [condition.must] if condition.must else []
+            should = condition.should if isinstance(condition.should, list) else [condition.should] if condition.should else []
+            must_not = (
+                condition.must_not if isinstance(condition.must_not, list)
+                else [condition.must_not] if condition.must_not else []
+            )
+            return (
+                all(cls._matches(c, point_id, payload) for c in must)
+                and (not should or any(cls._matches(c, point_id, payload) for c in should))
+                and not any(cls._matches(c, point_id, payload) for c in must_not)
+            )
+        if isinstance(condition, models.HasIdCondition):
+            return point_id in {normalize_id(i) for i in condition.has_id}
+        if isinstance(condition, models.FieldCondition):
+            values = cls._values(payload, condition.key)
+            if condition.match is not None:
+                match = condition.match
+                if isinstance(match, models.MatchValue):
+                    return match.value in values
+                if isinstance(match, models.MatchAny):
+                    return any(value in match.any for value in values)
+                if isinstance(match, models.MatchExcept):
+                    return not any(value in match.except_ for value in values)
+                raise ValueError(f"Unsupported match condition {type(match).__name__}")
+            if condition.range is not None:
+                bounds = condition.range
+                return any(
+                    isinstance(value, (int, float))
+                    and (bounds.gt is None or value > bounds.gt)
+                    and (bounds.gte is None or value >= bounds.gte)
+                    and (bounds.lt is None or value < bounds.lt)
+                    and (bounds.lte is None or value <= bounds.lte)
+                    for value in values
+                )
+        raise ValueError(f"Unsupported filter condition {type(condition).__name__}")
+
+    @staticmethod
+    def _values(
+        payload: Dict,
+        key: str
+    ) -> List[Any]:
+        values = [payload]
+        for part in key.split("."):
+            values = [value.get(part) for value in values if isinstance(value, dict)]
+            values = [item for value in values for item in (value if isinstance(value, list) else [value])]
+        return [value for value in values if value is not None]
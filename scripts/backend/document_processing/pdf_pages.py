@@ -0,0 +1,71 @@
+import os
+from typing import Iterator, List, Optional, Tuple
+
+from pypdf import PdfReader
+
+"""
+This script holds the page extraction function run by the worker processes of 'DocumentLoader.iter_pages'.
+It only depends on pypdf so that spawned workers start quickly.
+"""
+
+# Reader of the last file extracted by this process, reused by the next ranges of the same file
+_reader: Optional[Tuple[Tuple[str, float, int], PdfReader]] = None
+
+
+def open_reader(
+    file_path: str
+) -> PdfReader:
+    """
+    Open a PDF, reusing the reader of the previous call when it was for the same unchanged file,
+    so a worker extracting several ranges of a PDF only parses it once.
+
+    Args:
+        file_path (str): Full path to the PDF file.
+
+    Returns:
+        PdfReader: The reader.
+    """
+    global _reader
+    stat = os.stat(file_path)
+    identity = (os.path.abspath(file_path), stat.st_mtime, stat.st_size)
+    if _reader is None or _reader[0] != identity:
+        _reader = (identity, PdfReader(file_path))
+    return _reader[1]
+
+
+def read_pages(
+    reader: PdfReader,
+    start: int,
+    stop: int
+) -> Iterator[Tuple[int, str, str]]:
+    """
+    Args:
+        reader (PdfReader): Reader of the PDF.
+        start (int): First page, inclusive.
+        stop (int): Last page, exclusive.
+
+    Yields:
+        Tuple[int, str, str]: (page number, page label, text) of every page in the range.
+    """
+    labels = reader.page_labels
+    for number in range(start, stop):
+        yield number, labels[number], reader.pages[number].extract_text().strip()
+
+
+def extract_pages(
+    file_path: str,
+    start: int,
+    stop: int
+) -> List[Tuple[int, str, str]]:
+    """
+    Extract the text of a page range. Runs in a worker process, so it opens its own reader.
+
+    Args:
+        file_path (str): Full path to the PDF file.
+        start (int): First page, inclusive.
+        stop (int): Last page, exclusive.
+
+    Returns:
+        List[Tuple[int, str, str]]: (page number, page label, text) of every page in the range.
+    """
+    return list(read_pages(open_reader(file_path), start, stop))
@@ -0,0 +1,389 @@
+import json
+import os
+import re
+import threading
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+"""
+This script defines a BM25 keyword index over the chunks of a collection, used next to the dense
+vectors for hybrid retrieval. Postings are stored in flat numpy arrays, grouped in immutable segments:
+every upload adds a segment and small segments are merged, so updates never rewrite the whole index.
+"""
+
+load_dotenv()
+
+SPARSE_INDEX_DIR = os.getenv("SPARSE_INDEX_DIR", ".cache/bm25")
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class Segment(NamedTuple):
+    """
+    Postings of a group of chunks in CSR layout: the postings of term 'term_ids[i]' are
+    'doc_indices[offsets[i]:offsets[i + 1]]' with frequencies 'frequencies[offsets[i]:offsets[i + 1]]'.
+    """
+    term_ids: np.ndarray
+    offsets: np.ndarray
+    doc_indices: np.ndarray
+    frequencies: np.ndarray
+
+
+class BM25Index:
+    """
+    A thread-safe BM25 index mapping Qdrant point ids to keyword scores.
+
+    Chunks are identified by their point id; adding a point id that is already indexed is a no-op,
+    which matches the content-derived point ids written at ingestion. Removed chunks are masked out
+    of the scores and their postings are dropped the next time segments are merged.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        max_segments: int = 8
+    ):
+        """
+        Initialize the BM25Index, loading it from 'directory' if it was saved there before.
+
+        Args:
+            directory (str, optional): Where the index is persisted. Defaults to memory only.
+            k1 (float): BM25 term frequency saturation. Defaults to 1.5.
+            b (float): BM25 length normalization. Defaults to 0.75.
+            max_segments (int): Number of segments above which they are merged into one. Defaults to 8.
+        """
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self.vocabulary: Dict[str, int] = {}
+        self.doc_ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._doc_lengths = array("i")
+        self._document_frequencies = array("i")
+        self._segments: List[Segment] = []
+        self._saved_segments = 0
+        self._segment_files: List[str] = []
+        self._generation = 0
+        self._removed: set = set()
+        self._lock = threading.RLock()
+        # True when the saved index could not be loaded and has to be rebuilt from the collection
+        self.stale = False
+        if directory and os.path.exists(os.path.join(directory, "meta.json")):
+            self._load()
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """
+        Args:
+            text (str): Text to split.
+
+        Returns:
+            List[str]: Lowercased word tokens.
+        """
+        return TOKEN_PATTERN.findall(text.lower())
+
+    def __len__(self) -> int:
+        return len(self.doc_ids) - len(self._removed)
+
+    def add(
+        self,
+        ids: List[str],
+        texts: List[str]
+    ) -> int:
+        """
+        Index new chunks as a new segment.
+
+        Args:
+            ids (List[str]): Point ids of the chunks.
+            texts (List[str]): Their texts, in the same order.
+
+        Returns:
+            int: Number of chunks that were not indexed yet.
+        """
+        with self._lock:
+            term_ids, doc_indices, frequencies = [], [], []
+            for point_id, text in zip(ids, texts):
+                point_id = str(point_id)
+                if point_id in self._positions:
+                    continue
+                doc_index = len(self.doc_ids)
+                self._positions[point_id] = doc_index
+                self.doc_ids.append(point_id)
+
+                tokens = self.tokenize(text)
+                self._doc_lengths.append(len(tokens))
+                counts: Dict[int, int] = {}
+                for token in tokens:
+                    term_id = self.vocabulary.setdefault(token, len(self.vocabulary))
+                    counts[term_id] = counts.get(term_id, 0) + 1
+                for term_id, frequency in counts.items():
+                    term_ids.append(term_id)
+                    doc_indices.append(doc_index)
+                    frequencies.append(frequency)
+
+            if not term_ids:
+                return 0
+
+            missing_terms = len(self.vocabulary) - len(self._document_frequencies)
+            self._document_frequencies.extend([0] * missing_terms)
+            document_frequencies = np.frombuffer(self._document_frequencies, dtype=np.int32)
+            np.add.at(document_frequencies, np.asarray(term_ids, dtype=np.int64), 1)
+
+            self._segments.append(self._build_segment(
+                np.asarray(term_ids, dtype=np.int32),
+                np.asarray(doc_indices, dtype=np.int32),
+                np.asarray(frequencies, dtype=np.int32),
+            ))
+            if len(self._segments) > self.max_segments:
+                self._segments = [self._merge(self._segments, self._removed)]
+                self._saved_segments = 0
+            return len(set(doc_indices))
+
+    def remove(
+        self,
+        ids: List[str]
+    ) -> int:
+        """
+        Remove chunks, e.g. those that vanished from a document uploaded again.
+
+        Args:
+            ids (List[str]): Point ids of the chunks.
+
+        Returns:
+            int: Number of chunks that were indexed.
+        """
+        with self._lock:
+            indices = [
+                doc_index for doc_index in (self._positions.pop(str(point_id), None) for point_id in ids)
+                if doc_index is not None
+            ]
+            if not indices:
+                return 0
+
+            removed = np.asarray(indices, dtype=np.int32)
+            document_frequencies = np.frombuffer(self._document_frequencies, dtype=np.int32)
+            for segment in self._segments:
+                mask = np.isin(segment.doc_indices, removed)
+                if mask.any():
+                    term_ids = np.repeat(segment.term_ids, np.diff(segment.offsets))[mask]
+                    np.subtract.at(document_frequencies, term_ids.astype(np.int64), 1)
+            np.frombuffer(self._doc_lengths, dtype=np.int32)[removed] = 0
+            self._removed.update(indices)
+            return len(indices)
+
+    def clear(self):
+        """
+        Remove every chunk, e.g. when the collection is created again.
+        """
+        with self._lock:
+            self.vocabulary = {}
+            self.doc_ids = []
+            self._positions = {}
+            self._doc_lengths = array("i")
+            self._document_frequencies = array("i")
+            self._segments = []
+            self._saved_segments = 0
+            self._removed = set()
+            self.stale = False
+
+    def search(
+        self,
+        query: str,
+        k: int
+    ) -> List[Tuple[str, float]]:
+        """
+        Score every chunk containing a query term with BM25.
+
+        Args:
+            query (str): User's query.
+            k (int): Number of results.
+
+        Returns:
+            List[Tuple[str, float]]: Up to 'k' (point id, score) pairs, best first.
+        """
+        with self._lock:
+            term_ids = sorted({
+                self.vocabulary[token] for token in self.tokenize(query) if token in self.vocabulary
+            })
+            if not term_ids or not len(self):
+                return []
+
+            doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.int32).astype(np.float32)
+            document_frequencies = np.frombuffer(self._document_frequencies, dtype=np.int32)
+            n_docs = len(self)
+            average_length = max(doc_lengths.sum() / n_docs, 1.0)
+            length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / average_length)
+            scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+
+            for term_id in term_ids:
+                df = document_frequencies[term_id]
+                idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for segment in self._segments:
+                    position = np.searchsorted(segment.term_ids, term_id)
+                    if position == len(segment.term_ids) or segment.term_ids[position] != term_id:
+                        continue
+                    start, stop = segment.offsets[position], segment.offsets[position + 1]
+                    docs = segment.doc_indices[start:stop]
+                    tf = segment.frequencies[start:stop].astype(np.float32)
+                    scores[docs] += idf * tf * (self.k1 + 1) / (tf + length_norm[docs])
+
+            if self._removed:
+                scores[np.fromiter(self._removed, dtype=np.int64)] = 0.0
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            candidates = np.sort(candidates)
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self.doc_ids[i], float(scores[i])) for i in candidates]
+
+    def save(self):
+        """
+        Persist the index. Segments already on disk are not written again.
+
+        Every save writes its files under a new generation number and switches to them by replacing
+        meta.json, so an interrupted save leaves the previous generation readable. Files no longer
+        referenced are deleted after the switch.
+        """
+        if not self.directory:
+            return
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            generation = self._generation + 1
+            segment_files = self._segment_files[:self._saved_segments]
+            for i in range(self._saved_segments, len(self._segments)):
+                segment_files.append(f"segment_{generation}_{i}.npz")
+                np.savez(os.path.join(self.directory, segment_files[-1]), **self._segments[i]._asdict())
+            doc_lengths_file = f"doc_lengths_{generation}.npy"
+            document_frequencies_file = f"document_frequencies_{generation}.npy"
+            np.save(
+                os.path.join(self.directory, doc_lengths_file),
+                np.frombuffer(self._doc_lengths, dtype=np.int32)
+            )
+            np.save(
+                os.path.join(self.directory, document_frequencies_file),
+                np.frombuffer(self._document_frequencies, dtype=np.int32)
+            )
+            meta_path = os.path.join(self.directory, "meta.json")
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump({
+                    "generation": generation,
+                    "segments": segment_files,
+                    "doc_lengths": doc_lengths_file,
+                    "document_frequencies": document_frequencies_file,
+                    "vocabulary": self.vocabulary,
+                    "doc_ids": self.doc_ids,
+                    "removed": sorted(self._removed),
+                }, f)
+            os.replace(meta_path + ".tmp", meta_path)
+            self._generation = generation
+            self._segment_files = segment_files
+            self._saved_segments = len(self._segments)
+
+            referenced = {*segment_files, doc_lengths_file, document_frequencies_file}
+            for name in os.listdir(self.directory):
+                if name.startswith(("segment_", "doc_lengths", "document_frequencies")) and name not in referenced:
+                    os.remove(os.path.join(self.directory, name))
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.directory, "meta.json")) as f:
+                meta = json.load(f)
+            # Indexes saved before generations were introduced
+            segment_files = meta["segments"]
+            if isinstance(segment_files, int):
+                segment_files = [f"segment_{i}.npz" for i in range(segment_files)]
+            doc_lengths = np.load(os.path.join(self.directory, meta.get("doc_lengths", "doc_lengths.npy")))
+            document_frequencies = np.load(
+                os.path.join(self.directory, meta.get("document_frequencies", "document_frequencies.npy"))
+            )
+            segments = []
+            for name in segment_files:
+                with np.load(os.path.join(self.directory, name)) as data:
+                    segments.append(Segment(**{field: data[field] for field in Segment._fields}))
+            if len(doc_lengths) != len(meta["doc_ids"]) or len(document_frequencies) != len(meta["vocabulary"]):
+                raise ValueError("meta.json does not match the saved arrays")
+        except (OSError, ValueError, KeyError) as e:
+            # Starting empty keeps the dense search working; the next upload rebuilds the index
+            print(f"Could not load the BM25 index in {self.directory}, starting empty: {e}")
+            self.stale = True
+            return
+
+        self.vocabulary = meta["vocabulary"]
+        self.doc_ids = meta["doc_ids"]
+        self._removed = set(meta.get("removed", []))
+        self._positions = {
+            point_id: i for i, point_id in enumerate(self.doc_ids) if i not in self._removed
+        }
+        self._doc_lengths = array("i", doc_lengths.astype(np.int32).tobytes())
+        self._document_frequencies = array("i", document_frequencies.astype(np.int32).tobytes())
+        self._segments = segments
+        self._generation = meta.get("generation", 0)
+        self._segment_files = list(segment_files)
+        self._saved_segments = len(self._segments)
+
+    @staticmethod
+    def _build_segment(
+        term_ids: np.ndarray,
+        doc_indices: np.ndarray,
+        frequencies: np.ndarray
+    ) -> Segment:
+        order = np.lexsort((doc_indices, term_ids))
+        term_ids, doc_indices, frequencies = term_ids[order], doc_indices[order], frequencies[order]
+        unique_terms, starts = np.unique(term_ids, return_index=True)
+        return Segment(
+            term_ids=unique_terms.astype(np.int32),
+            offsets=np.append(starts, len(term_ids)).astype(np.int64),
+            doc_indices=doc_indices.astype(np.int32),
+            frequencies=np.minimum(frequencies, np.iinfo(np.uint16).max).astype(np.uint16),
+        )
+
+    @classmethod
+    def _merge(
+        cls,
+        segments: List[Segment],
+        removed: Optional[set] = None
+    ) -> Segment:
+        term_ids = np.concatenate([
+            np.repeat(segment.term_ids, np.diff(segment.offsets)) for segment in segments
+        ])
+        doc_indices = np.concatenate([segment.doc_indices for segment in segments])
+        frequencies = np.concatenate([segment.frequencies for segment in segments]).astype(np.int32)
+        if removed:
+            keep = ~np.isin(doc_indices, np.fromiter(removed, dtype=np.int32))
+            term_ids, doc_indices, frequencies = term_ids[keep], doc_indices[keep], frequencies[keep]
+        return cls._build_segment(term_ids, doc_indices, frequencies)
+
+
+_indexes: Dict[str, BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_sparse_index(
+    collection_name: str
+) -> BM25Index:
+    """
+    Get the process-wide BM25 index of a collection, persisted under SPARSE_INDEX_DIR
+    (".cache/bm25" by default, an empty value keeps the indexes in memory only).
+
+    Args:
+        collection_name (str): Name of the collection.
+
+    Returns:
+        BM25Index: The shared index.
+    """
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            directory = (
+                os.path.join(SPARSE_INDEX_DIR, re.sub(r"[^\w.-]", "_", collection_name))
+                if SPARSE_INDEX_DIR else None
+            )
+            index = _indexes[collection_name] = BM25Index(directory)
+        return index
@@ -1,49 +1,374 @@
 import os
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Callable, List, Optional
 from dotenv import load_dotenv
-
 from langchain_qdrant import QdrantVectorStore
 
 from scripts.backend.document_processing.document_loader import DocumentLoader
 from scripts.backend.document_processing.document_embedder import Embedder
 from scripts.backend.document_processing.document_splitter import DocumentSplitter
+from scripts.backend.document_processing.ingestion_pipeline import Stage
+from scripts.backend.document_processing.sparse_index import BM25Index, get_sparse_index
 from scripts.backend.document_processing.vector_store import VectorStore
-from scripts.backend.models.rag import UploadFileRequest
+from scripts.backend.models.rag import (
+    CompressCollectionRequest,
+    CompressionStats,
+    FileIngestionResult,
+    IngestionStats,
+    UploadFileRequest,
+)
+from scripts.backend.query_processing.answer_store import get_answer_store
+from scripts.backend.query_processing.query_cache import get_query_cache
+from scripts.backend.runtime.model_registry import get_registry
 
 load_dotenv()
 
 class UploadFile:
     """  
     A class responsible for loading, splitting, embedding, and storing documents in a Qdrant vector database.  
+
+    Ingestion is a pipeline of load, split, embed and upsert stages, each running in its own thread
+    and connected to the next by a bounded queue. Pages are extracted in parallel by a process pool,
+    and memory stays flat whatever the size of the PDF. The 'total_chunks' metadata, only known at
+    the end, is then written with a single payload update. Written chunks are also added to the
+    collection's BM25 index used by hybrid retrieval. Chunks are embedded with the projection of the
+    collection, if it has one.
+
+    Uploading a document again is incremental. A document is identified by its 'document_id', the
+    absolute path of its file unless the request sets one, and its chunks by that id and their text, so
+    only chunks that are not stored yet are embedded and written, the stored chunks that vanished from
+    the document are deleted in bulk, and those that moved get their position metadata updated.
+    A document whose file hash matches the stored one is skipped.
     """
+    def __init__(
+        self,
+        batch_size: int = int(os.getenv("INGESTION_BATCH_SIZE", 64)),
+        workers: Optional[int] = int(os.getenv("INGESTION_WORKERS", 0)) or None,
+        pages_per_task: int = int(os.getenv("INGESTION_PAGES_PER_TASK", 8)),
+        max_in_flight_pages: int = int(os.getenv("INGESTION_MAX_IN_FLIGHT_PAGES", 64)),
+        max_in_flight_batches: int = int(os.getenv("INGESTION_MAX_IN_FLIGHT_BATCHES", 2))
+    ):
+        """
+        Initialize the UploadFile service.
+
+        Args:
+            batch_size (int, optional): Number of chunks embedded and upserted together.
+                Defaults to the INGESTION_BATCH_SIZE environment variable or 64.
+            workers (int, optional): Number of page extraction processes.
+                Defaults to the INGESTION_WORKERS environment variable or the number of CPUs.
+            pages_per_task (int, optional): Pages extracted by one worker task.
+                Defaults to the INGESTION_PAGES_PER_TASK environment variable or 8.
+            max_in_flight_pages (int, optional): Maximum number of extracted pages held in memory.
+                Defaults to the INGESTION_MAX_IN_FLIGHT_PAGES environment variable or 64.
+            max_in_flight_batches (int, optional): Maximum number of embedded batches waiting to be written.
+                Defaults to the INGESTION_MAX_IN_FLIGHT_BATCHES environment variable or 2.
+
+        Attributes:
+            ingestion_stats (IngestionStats): Statistics of the last upload, if any.
+        """
+        self.batch_size = batch_size
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.max_in_flight_pages = max_in_flight_pages
+        self.max_in_flight_batches = max_in_flight_batches
+        self.ingestion_stats = None
+
     def upload_file(
         self,
         upload_file_request: UploadFileRequest,
         embedder: Embedder,
+        executor: Optional[Executor] = None,
     ) -> bool:
         try:
-            document_loader = DocumentLoader()
-            documents = document_loader.load_document(
-                file_path=upload_file_request.file_path
-            )
-            splitter = DocumentSplitter()
-            split_documents = splitter.split_text(
-                documents=documents
-            )
-            vector_store = VectorStore(
-                api_key=os.getenv("QDRANT_API_KEY") , url=os.getenv("QDRANT_URL")
-            )
+            collection_name = upload_file_request.collection_name
+            document_id = self.document_id(upload_file_request)
+            splitter = DocumentSplitter(embedder=embedder)
+            # Changing the splitter options changes the chunks, so it counts as a change of the document
+            document_hash = VectorStore.file_hash(upload_file_request.file_path) + splitter.signature
+            vector_store = self._vector_store()
             collection_created = vector_store.create_collection(
-                collection_name=upload_file_request.collection_name
+                collection_name=collection_name,
+                embedder=embedder
+            )
+            sparse_index = get_sparse_index(collection_name)
+            if collection_created:
+                sparse_index.clear()
+            elif sparse_index.stale:
+                self._rebuild_sparse_index(vector_store, collection_name, sparse_index)
+
+            # 'total_chunks' is written last, so points of an interrupted upload never look complete
+            stored = {} if collection_created else vector_store.stored_points(collection_name, document_id)
+            if stored and all(
+                metadata.get('document_hash') == document_hash and 'total_chunks' in metadata
+                for metadata in stored.values()
+            ):
+                self.ingestion_stats = IngestionStats(unchanged=len(stored))
+                return True
+
+            document_loader = DocumentLoader()
+            pages = document_loader.iter_pages(
+                file_path=upload_file_request.file_path,
+                executor=executor,
+                max_workers=self.workers,
+                pages_per_task=self.pages_per_task,
+                max_in_flight_pages=self.max_in_flight_pages,
             )
-            qdrant_vector_store = QdrantVectorStore(
-                collection_name=upload_file_request.collection_name,
-                client=vector_store.client,
-                embedding=embedder.embedding
+            total_chunks = 0
+            occurrences = Counter()
+            kept = set()
+            moved = {}
+
+            def load(pages):
+                yield from pages
+
+            def split(pages):
+                nonlocal total_chunks
+                for document in splitter.split_stream(documents=pages):
+                    total_chunks += 1
+                    document.metadata['document_id'] = document_id
+                    content_hash = vector_store.content_hash(document.page_content)
+                    document.metadata['content_hash'] = content_hash
+                    # Repeated texts (headers, boilerplate) are numbered so each copy keeps its own point
+                    document.metadata['occurrence'] = occurrences[content_hash]
+                    occurrences[content_hash] += 1
+                    document.metadata['document_hash'] = document_hash
+                    point_id = vector_store.point_id(document)
+                    if point_id in stored:
+                        kept.add(point_id)
+                        # Text inserted or removed before the chunk shifts its 'chunk_id' and page
+                        if self._position_changed(stored[point_id], document.metadata):
+                            moved[point_id] = document.metadata
+                        continue
+                    yield document
+
+            self.ingestion_stats = vector_store.run_ingestion(
+                pages,
+                [
+                    Stage("load", load, queue_size=self.pages_per_task),
+                    Stage("split", split, queue_size=self.batch_size),
+                    *vector_store.ingestion_stages(
+                        collection_name=collection_name,
+                        embedder=embedder,
+                        batch_size=self.batch_size,
+                        max_in_flight=self.max_in_flight_batches,
+                        deterministic_ids=True,
+                        on_upsert=lambda points: sparse_index.add(
+                            [point.id for point in points],
+                            [point.payload[QdrantVectorStore.CONTENT_KEY] for point in points],
+                        ),
+                    ),
+                ],
             )
-            vector_store.add_documents(
-                documents=split_documents,
-                qdrant_vector_store=qdrant_vector_store,
+            vanished = [point_id for point_id in stored if point_id not in kept]
+            vector_store.delete_points(collection_name, vanished)
+            sparse_index.remove(vanished)
+            sparse_index.save()
+            vector_store.set_metadata(collection_name, moved)
+            vector_store.set_total_chunks(
+                collection_name=collection_name,
+                document_id=document_id,
+                total_chunks=total_chunks,
+                document_hash=document_hash,
             )
+            self.ingestion_stats.unchanged = len(kept)
+            self.ingestion_stats.deleted = len(vanished)
+            get_query_cache().invalidate(collection_name)
+            self._invalidate_answers(collection_name)
             return True
         except Exception as e:
             raise RuntimeError("Error uploading file: " + str(e))
+
+    def delete_document(
+        self,
+        collection_name: str,
+        document_id: str
+    ) -> int:
+        """
+        Delete every chunk of a document from a collection and from its BM25 index.
+
+        Args:
+            collection_name (str): The name of the collection.
+            document_id (str): The 'document_id' of the document, by default the absolute path of
+                the file it was uploaded from.
+
+        Returns:
+            int: Number of deleted chunks, 0 if the document is not in the collection.
+        """
+        try:
+            vector_store = self._vector_store()
+            if not vector_store.client.collection_exists(collection_name=collection_name):
+                return 0
+            ids = list(vector_store.stored_points(collection_name, document_id))
+            if not ids:
+                return 0
+            vector_store.delete_points(collection_name, ids)
+            sparse_index = get_sparse_index(collection_name)
+            if sparse_index.stale:
+                self._rebuild_sparse_index(vector_store, collection_name, sparse_index)
+            sparse_index.remove(ids)
+            sparse_index.save()
+            get_query_cache().invalidate(collection_name)
+            self._invalidate_answers(collection_name)
+            return len(ids)
+        except Exception as e:
+            raise RuntimeError("Error deleting document: " + str(e))
+
+    def compress_collection(
+        self,
+        compress_request: CompressCollectionRequest,
+        embedder: Embedder
+    ) -> CompressionStats:
+        """
+        Copy a collection into a new one with projected and/or quantized vectors, together with
+        its BM25 index. Later uploads to the new collection are projected the same way.
+
+        Args:
+            compress_request (CompressCollectionRequest): Source and new collection, and how to compress.
+            embedder (Embedder): Embedding model of the source collection.
+
+        Returns:
+            CompressionStats: Size of the new collection and of its vectors.
+        """
+        try:
+            target_collection_name = compress_request.target_collection_name
+            vector_store = self._vector_store()
+            if vector_store.client.collection_exists(collection_name=target_collection_name):
+                raise ValueError(f"Collection {target_collection_name} already exists")
+            sparse_index = get_sparse_index(target_collection_name)
+            sparse_index.clear()
+            stats = vector_store.compress_collection(
+                collection_name=compress_request.collection_name,
+                target_collection_name=target_collection_name,
+                embedder=embedder,
+                dimensions=compress_request.dimensions,
+                projection=compress_request.projection or "pca",
+                quantization=compress_request.quantization or "none",
+                sample_size=compress_request.sample_size or 10000,
+                on_upsert=lambda points: sparse_index.add(
+                    [point.id for point in points],
+                    [point.payload[QdrantVectorStore.CONTENT_KEY] for point in points],
+                ),
+            )
+            sparse_index.save()
+            get_query_cache().invalidate(target_collection_name)
+            self._invalidate_answers(target_collection_name)
+            return stats
+        except Exception as e:
+            raise RuntimeError("Error compressing collection: " + str(e))
+
+    @staticmethod
+    def document_id(
+        upload_file_request: UploadFileRequest
+    ) -> str:
+        """
+        Args:
+            upload_file_request (UploadFileRequest): An upload of a single file.
+
+        Returns:
+            str: The identity of the document in its collection: the request's 'document_id', or the
+                absolute path of its file, so files with the same name in different directories stay apart.
+        """
+        return upload_file_request.document_id or os.path.abspath(upload_file_request.file_path)
+
+    @staticmethod
+    def _position_changed(
+        stored: dict,
+        metadata: dict
+    ) -> bool:
+        # 'total_chunks' and 'document_hash' are rewritten on every point once the upload is done
+        ignored = ('total_chunks', 'document_hash')
+        return any(stored.get(key) != value for key, value in metadata.items() if key not in ignored)
+
+    @staticmethod
+    def _rebuild_sparse_index(
+        vector_store: VectorStore,
+        collection_name: str,
+        sparse_index: BM25Index
+    ):
+        # The saved index could not be loaded: index every chunk of the collection again
+        sparse_index.clear()
+        for records in vector_store.iter_points(collection_name):
+            sparse_index.add(
+                [record.id for record in records],
+                [record.payload[QdrantVectorStore.CONTENT_KEY] for record in records],
+            )
+        sparse_index.save()
+
+    @staticmethod
+    def _invalidate_answers(
+        collection_name: str
+    ):
+        # Precomputed answers of the collection are served again once 'scripts.precompute_answers' refreshed them
+        answer_store = get_answer_store()
+        if answer_store is not None:
+            answer_store.invalidate(collection_name)
+
+    @staticmethod
+    def _vector_store() -> VectorStore:
+        return VectorStore(
+            client=get_registry().get_qdrant_client(
+                url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY")
+            )
+        )
+
+    def upload_files(
+        self,
+        upload_file_request: UploadFileRequest,
+        embedder: Embedder,
+        on_progress: Optional[Callable[[List[FileIngestionResult]], None]] = None,
+    ) -> List[FileIngestionResult]:
+        """
+        Upload every PDF of a directory or glob pattern given as 'file_path'. The files share the
+        process pool of page extraction; a file that fails is reported and does not stop the others.
+
+        Args:
+            upload_file_request (UploadFileRequest): Directory or glob pattern and target collection.
+            embedder (Embedder): Embedding model.
+            on_progress (Callable[[List[FileIngestionResult]], None], optional): Called with the results
+                so far every time a file starts or finishes.
+
+        Returns:
+            List[FileIngestionResult]: Outcome of every file. 'ingestion_stats' holds the totals.
+        """
+        paths = DocumentLoader.expand_paths(upload_file_request.file_path)
+        if upload_file_request.document_id is not None and len(paths) > 1:
+            raise ValueError("'document_id' identifies a single file, not a directory or a glob pattern")
+        results = [FileIngestionResult(file_path=path, status="queued") for path in paths]
+        totals = IngestionStats()
+
+        for i, path in enumerate(paths):
+            results[i] = FileIngestionResult(file_path=path, status="running")
+            if on_progress is not None:
+                on_progress(list(results))
+            try:
+                self.upload_file(
+                    UploadFileRequest(
+                        file_path=path,
+                        collection_name=upload_file_request.collection_name,
+                        document_id=upload_file_request.document_id
+                    ),
+                    embedder,
+                )
+            except Exception as e:
+                results[i] = FileIngestionResult(file_path=path, status="failed", detail=str(e))
+            else:
+                stats = self.ingestion_stats
+                unchanged = stats.chunks == 0 and stats.deleted == 0 and stats.unchanged > 0
+                results[i] = FileIngestionResult(
+                    file_path=path, status="unchanged" if unchanged else "completed", stats=stats
+                )
+                totals.chunks += stats.chunks
+                totals.batches += stats.batches
+                totals.seconds += stats.seconds
+                totals.unchanged += stats.unchanged
+                totals.deleted += stats.deleted
+                for stage, seconds in (self.ingestion_stats.stage_seconds or {}).items():
+                    totals.stage_seconds = totals.stage_seconds or {}
+                    totals.stage_seconds[stage] = totals.stage_seconds.get(stage, 0.0) + seconds
+            if on_progress is not None:
+                on_progress(list(results))
+
+        totals.chunks_per_second = totals.chunks / totals.seconds if totals.seconds > 0 else 0.0
+        self.ingestion_stats = totals
+        return results
@@ -0,0 +1,238 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import models
+
+"""
+This script defines the two ways a collection can store smaller vectors than the embedding model produces:
+a linear projection to fewer dimensions, fitted on vectors already ingested, and Qdrant quantization.
+
+A projection belongs to a collection and is persisted under VECTOR_PROJECTION_DIR, so the Embedder applies
+the same one to the chunks written into the collection and to the queries searching it. Quantized
+collections keep their original vectors on disk and only the quantized ones in RAM; searches rescore the
+quantized candidates with the original vectors.
+"""
+
+load_dotenv()
+
+PROJECTIONS = ("pca", "truncate")
+QUANTIZATIONS = ("none", "scalar", "binary")
+VECTOR_PROJECTION_DIR = os.getenv("VECTOR_PROJECTION_DIR", ".cache/projections")
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+VECTOR_OVERSAMPLING = float(os.getenv("VECTOR_OVERSAMPLING", 2.0))
+
+SEARCH_PARAMS = models.SearchParams(
+    quantization=models.QuantizationSearchParams(rescore=True, oversampling=VECTOR_OVERSAMPLING)
+)
+
+
+class Projection:
+    """
+    A linear map from the model's vectors to 'dimensions' dimensions, for cosine collections.
+
+    Vectors are L2-normalized before they are projected, so the dot product of two projected vectors
+    approximates the cosine similarity of the original ones; the closer 'retained' is to 1, the better.
+
+    Args:
+        components (np.ndarray): Projection matrix, one row per output dimension.
+        method (str): How it was fitted, one of PROJECTIONS.
+        variant (str): Variant of the embedding model whose vectors it projects.
+        retained (float): Share of the squared norm of the fitted vectors kept by the projection.
+    """
+
+    def __init__(
+        self,
+        components: np.ndarray,
+        method: str,
+        variant: str,
+        retained: float = 1.0
+    ):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.method = method
+        self.variant = variant
+        self.retained = retained
+
+    @property
+    def dimensions(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def input_dimensions(self) -> int:
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(
+        cls,
+        vectors: np.ndarray,
+        dimensions: int,
+        method: str = "pca",
+        variant: str = ""
+    ) -> "Projection":
+        """
+        Args:
+            vectors (np.ndarray): Sample of the vectors to project, one row per vector.
+            dimensions (int): Number of output dimensions.
+            method (str): "pca" keeps the directions of largest uncentered variance of the sample,
+                "truncate" keeps the first dimensions, which suits Matryoshka-trained models.
+                Defaults to "pca".
+            variant (str): Variant of the embedding model that produced the vectors.
+
+        Returns:
+            Projection: The fitted projection.
+
+        Raises:
+            ValueError: If the method is unknown, or 'dimensions' is not below the vector size,
+                or the sample has fewer vectors than 'dimensions' for "pca".
+        """
+        if method not in PROJECTIONS:
+            raise ValueError(f"Unknown projection {method!r}, expected one of {PROJECTIONS}")
+        vectors = cls._normalize(np.asarray(vectors, dtype=np.float32))
+        if not 0 < dimensions < vectors.shape[1]:
+            raise ValueError(f"Cannot project vectors of size {vectors.shape[1]} to {dimensions} dimensions")
+
+        # Second moment of the unit vectors: its top eigenvectors keep most of every dot product
+        moment = vectors.T.astype(np.float64) @ vectors
+        if method == "truncate":
+            components = np.eye(vectors.shape[1], dtype=np.float32)[:dimensions]
+            retained = np.trace(moment[:dimensions, :dimensions]) / max(np.trace(moment), 1e-12)
+        else:
+            if len(vectors) < dimensions:
+                raise ValueError(f"Fitting {dimensions} dimensions needs at least as many vectors, got {len(vectors)}")
+            eigenvalues, eigenvectors = np.linalg.eigh(moment)
+            components = eigenvectors[:, ::-1][:, :dimensions].T
+            retained = eigenvalues[::-1][:dimensions].sum() / max(eigenvalues.sum(), 1e-12)
+        return cls(components, method, variant, float(retained))
+
+    def transform(
+        self,
+        vectors: Sequence[Sequence[float]]
+    ) -> List[List[float]]:
+        """
+        Args:
+            vectors (Sequence[Sequence[float]]): Vectors of the model, one per row.
+
+        Returns:
+            List[List[float]]: The projected vectors, in the same order.
+        """
+        if len(vectors) == 0:
+            return []
+        matrix = self._normalize(np.asarray(vectors, dtype=np.float32))
+        return (matrix @ self.components.T).tolist()
+
+    def save(
+        self,
+        path: str
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        meta = {"method": self.method, "variant": self.variant, "retained": self.retained}
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, components=self.components, meta=np.array(json.dumps(meta)))
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(
+        cls,
+        path: str
+    ) -> "Projection":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(data["components"], meta["method"], meta["variant"], meta["retained"])
+
+    @staticmethod
+    def _normalize(
+        matrix: np.ndarray
+    ) -> np.ndarray:
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def quantization_config(
+    quantization: str
+) -> Optional[models.QuantizationConfig]:
+    """
+    Args:
+        quantization (str): One of QUANTIZATIONS. "scalar" stores every dimension as an int8,
+            "binary" as a single bit; both keep the quantized vectors in RAM.
+
+    Returns:
+        QuantizationConfig, optional: Qdrant configuration of the quantization, None for "none".
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+    if quantization == "scalar":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+        ))
+    if quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def vector_bytes(
+    dimensions: int,
+    quantization: str = "none"
+) -> float:
+    """
+    Args:
+        dimensions (int): Size of the stored vectors.
+        quantization (str): One of QUANTIZATIONS.
+
+    Returns:
+        float: Bytes per vector held in RAM for search. Quantized collections also keep the
+            float32 vectors on disk for rescoring.
+    """
+    return {"none": 4.0, "scalar": 1.0, "binary": 1 / 8}[quantization] * dimensions
+
+
+_projections: Dict[str, Optional[Projection]] = {}
+_projections_lock = threading.Lock()
+
+
+def _projection_path(
+    collection_name: str
+) -> str:
+    return os.path.join(VECTOR_PROJECTION_DIR, re.sub(r"[^\w.-]", "_", collection_name) + ".npz")
+
+
+def get_projection(
+    collection_name: str
+) -> Optional[Projection]:
+    """
+    Get the projection of a collection, persisted under VECTOR_PROJECTION_DIR (".cache/projections"
+    by default, an empty value keeps the projections in memory only).
+
+    Args:
+        collection_name (str): Name of the collection.
+
+    Returns:
+        Projection, optional: The projection, or None when the collection stores the model's vectors.
+    """
+    with _projections_lock:
+        if collection_name not in _projections:
+            path = _projection_path(collection_name) if VECTOR_PROJECTION_DIR else None
+            _projections[collection_name] = Projection.load(path) if path and os.path.exists(path) else None
+        return _projections[collection_name]
+
+
+def set_projection(
+    collection_name: str,
+    projection: Optional[Projection]
+):
+    """
+    Args:
+        collection_name (str): Name of the collection.
+        projection (Projection, optional): Its projection, or None to remove it.
+    """
+    with _projections_lock:
+        _projections[collection_name] = projection
+        if not VECTOR_PROJECTION_DIR:
+            return
+        path = _projection_path(collection_name)
+        if projection is not None:
+            projection.save(path)
+        elif os.path.exists(path):
+            os.remove(path)
@@ -1,10 +1,46 @@
-from typing import List
+import hashlib
+import itertools
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
+import numpy as np
 from langchain_core.documents import Document
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    MatchValue,
+    PayloadSchemaType,
+    PointIdsList,
+    PointStruct,
+    Record,
+    SetPayload,
+    SetPayloadOperation,
+    VectorParams,
+)
 
+from scripts.backend.document_processing.document_embedder import Embedder
+from scripts.backend.document_processing.ingestion_pipeline import Stage, IngestionPipeline
+from scripts.backend.document_processing.vector_compression import (
+    VECTOR_QUANTIZATION,
+    Projection,
+    get_projection,
+    quantization_config,
+    set_projection,
+    vector_bytes,
+)
+from scripts.backend.models.rag import CompressionStats, IngestionStats
+from scripts.backend.runtime.metrics import metrics
+
+PAYLOAD_INDEXES: Dict[str, PayloadSchemaType] = {
+    "source": PayloadSchemaType.KEYWORD,
+    "document_id": PayloadSchemaType.KEYWORD,
+    "file_type": PayloadSchemaType.KEYWORD,
+    "chunk_id": PayloadSchemaType.INTEGER,
+}
 
 class VectorStore:
     """
@@ -13,57 +49,563 @@ class VectorStore:
 
     def __init__(
         self,
-        api_key: str,
-        url: str
+        api_key: Optional[str] = None,
+        url: Optional[str] = None,
+        client: Optional[QdrantClient] = None
     ):
         """
         Initialize a VectorStore.
 
         Args:
-            api_key (str): The API key for Qdrant.
-            url (str): The URL of the Qdrant server.
+            api_key (str, optional): The API key for Qdrant.
+            url (str, optional): The URL of the Qdrant server.
+            client (QdrantClient, optional): An already connected client, e.g. QdrantClient(":memory:").
+                When given, 'api_key' and 'url' are ignored.
         """
-        self.client = QdrantClient(url=url, api_key=api_key)
+        self.client = client if client is not None else QdrantClient(url=url, api_key=api_key)
         self.api_key = api_key
         self.url = url
 
     def create_collection(
         self,
         collection_name: str,
-        size: int = 1024,
+        size: Optional[int] = None,
         distance: Distance = Distance.COSINE,
+        embedder: Optional[Embedder] = None,
+        quantization: str = VECTOR_QUANTIZATION,
     )-> bool:
         """
-        Create a collection in Qdrant.
+        Create a collection in Qdrant, with payload indexes on the PAYLOAD_INDEXES metadata fields
+        so filtered searches only visit the matching points. For an existing collection, the vector
+        size is checked and missing payload indexes are added.
 
         Args:
             collection_name (str): The name of the collection.
-            size (int): The size of the vectors. Defaults to 1024.
+            size (int, optional): The size of the vectors. Defaults to the size 'embedder' produces
+                for the collection, which is smaller when the collection has a projection.
             distance (Distance): The distance metric to use. Defaults to COSINE.
+            embedder (Embedder, optional): Embedding model whose vectors the collection stores.
+            quantization (str): Quantization of a new collection: "none", "scalar" or "binary".
+                Quantized collections keep their original vectors on disk for rescoring.
+                Defaults to the VECTOR_QUANTIZATION environment variable or "none".
 
         Returns:
             bool: True if collection is created, False if it already exists.
+
+        Raises:
+            ValueError: If neither 'size' nor 'embedder' is given, or the existing collection
+                stores vectors of another size.
         """
+        if size is None:
+            if embedder is None:
+                raise ValueError("Either size or embedder is needed to create a collection")
+            size = embedder.collection_dimension(collection_name)
+
         if self.client.collection_exists(collection_name=collection_name):
+            info = self.client.get_collection(collection_name=collection_name)
+            existing_size = info.config.params.vectors.size
+            if existing_size != size:
+                raise ValueError(
+                    f"Collection {collection_name} stores vectors of size {existing_size}, not {size}"
+                )
+            self.create_payload_indexes(collection_name, existing=set(info.payload_schema or {}))
             return False
-            
+
+        quantization_settings = quantization_config(quantization)
         self.client.create_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=size, distance=distance),
+            vectors_config=VectorParams(size=size, distance=distance, on_disk=quantization_settings is not None),
+            quantization_config=quantization_settings,
         )
+        self.create_payload_indexes(collection_name)
         return True
 
+    def compress_collection(
+        self,
+        collection_name: str,
+        target_collection_name: str,
+        embedder: Embedder,
+        dimensions: Optional[int] = None,
+        projection: str = "pca",
+        quantization: str = VECTOR_QUANTIZATION,
+        sample_size: int = 10000,
+        batch_size: int = 256,
+        on_upsert: Optional[Callable[[List[PointStruct]], None]] = None,
+    ) -> CompressionStats:
+        """
+        Copy a collection into a new one storing smaller vectors. With 'dimensions', a projection is
+        fitted on up to 'sample_size' stored vectors and applied to every copied point; it is saved as
+        the projection of the new collection, so 'embedder' applies it to the chunks and queries of
+        that collection from then on. The new collection is quantized as 'quantization' says.
+
+        Args:
+            collection_name (str): The collection to copy, storing the vectors of 'embedder'.
+            target_collection_name (str): The new collection.
+            embedder (Embedder): Embedding model of the collection.
+            dimensions (int, optional): Size of the projected vectors. Defaults to no projection.
+            projection (str): "pca" or "truncate", see Projection.fit. Defaults to "pca".
+            quantization (str): "none", "scalar" or "binary". Defaults to VECTOR_QUANTIZATION or "none".
+            sample_size (int): Maximum number of vectors the projection is fitted on. Defaults to 10000.
+            batch_size (int): Points copied per request. Defaults to 256.
+            on_upsert (Callable[[List[PointStruct]], None], optional): Called with every batch of
+                copied points, e.g. to fill the keyword index of the new collection.
+
+        Returns:
+            CompressionStats: Size of the new collection and of its vectors.
+
+        Raises:
+            ValueError: If the collection does not exist or is itself projected, or the new one exists.
+        """
+        start = time.perf_counter()
+        if not self.client.collection_exists(collection_name=collection_name):
+            raise ValueError(f"Collection {collection_name} does not exist")
+        if self.client.collection_exists(collection_name=target_collection_name):
+            raise ValueError(f"Collection {target_collection_name} already exists")
+        if get_projection(collection_name) is not None:
+            raise ValueError(f"Collection {collection_name} is projected, compress its full-size source instead")
+
+        params = self.client.get_collection(collection_name=collection_name).config.params.vectors
+        fitted = None
+        if dimensions:
+            if params.distance != Distance.COSINE:
+                raise ValueError("Only collections with cosine distance can be projected")
+            sample = []
+            for records in self.iter_points(collection_name, batch_size=batch_size, with_vectors=True):
+                sample.extend(record.vector for record in records[:sample_size - len(sample)])
+                if len(sample) >= sample_size:
+                    break
+            if not sample:
+                raise ValueError(f"Collection {collection_name} has no vectors to fit a projection on")
+            fitted = Projection.fit(np.asarray(sample, dtype=np.float32), dimensions, projection, embedder.variant)
+
+        self.create_collection(
+            collection_name=target_collection_name,
+            size=fitted.dimensions if fitted is not None else params.size,
+            distance=params.distance,
+            quantization=quantization,
+        )
+        points_count = 0
+        try:
+            set_projection(target_collection_name, fitted)
+            for records in self.iter_points(collection_name, batch_size=batch_size, with_vectors=True):
+                vectors = [record.vector for record in records]
+                points = [
+                    PointStruct(id=record.id, vector=vector, payload=record.payload)
+                    for record, vector in zip(records, fitted.transform(vectors) if fitted is not None else vectors)
+                ]
+                self.client.upsert(collection_name=target_collection_name, points=points, wait=True)
+                if on_upsert is not None:
+                    on_upsert(points)
+                points_count += len(points)
+        except Exception:
+            self.client.delete_collection(collection_name=target_collection_name)
+            set_projection(target_collection_name, None)
+            raise
+
+        size = fitted.dimensions if fitted is not None else params.size
+        return CompressionStats(
+            collection_name=collection_name,
+            target_collection_name=target_collection_name,
+            points=points_count,
+            dimensions=size,
+            source_dimensions=params.size,
+            projection=fitted.method if fitted is not None else None,
+            retained=fitted.retained if fitted is not None else None,
+            quantization=quantization,
+            vector_bytes=vector_bytes(size, quantization),
+            source_vector_bytes=vector_bytes(params.size),
+            seconds=time.perf_counter() - start,
+        )
+
+    def iter_points(
+        self,
+        collection_name: str,
+        batch_size: int = 1024,
+        with_vectors: bool = False
+    ) -> Iterator[List[Record]]:
+        """
+        Scroll through every point of a collection.
+
+        Args:
+            collection_name (str): The name of the collection.
+            batch_size (int): Points fetched per request. Defaults to 1024.
+            with_vectors (bool): Fetch the vectors too. Defaults to False.
+
+        Yields:
+            List[Record]: The points of every request, with their payload.
+        """
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=with_vectors,
+            )
+            if records:
+                yield records
+            if offset is None:
+                return
+
+    def create_payload_indexes(
+        self,
+        collection_name: str,
+        existing: Iterable[str] = (),
+    ):
+        """
+        Index the PAYLOAD_INDEXES metadata fields of a collection.
+
+        Args:
+            collection_name (str): The name of the collection.
+            existing (Iterable[str]): Already indexed payload keys, which are skipped.
+        """
+        existing = set(existing)
+        for field, schema in PAYLOAD_INDEXES.items():
+            key = f"{QdrantVectorStore.METADATA_KEY}.{field}"
+            if key not in existing:
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=key,
+                    field_schema=schema,
+                    wait=True,
+                )
+
     def add_documents(
         self,
-        documents: List[Document],
-        qdrant_vector_store: QdrantVectorStore,
+        documents: Iterable[Document],
+        collection_name: str,
+        embedder: Embedder,
+        batch_size: int = 64,
+        max_in_flight: int = 2,
+        deterministic_ids: bool = False,
+    ) -> IngestionStats:
+        """
+        Embed and add documents to the collection in batches.
+
+        Each batch is embedded with a single 'embed_documents' call and written with a single
+        upsert. Upserts run on a background writer so the next batch is embedded while the
+        previous one is still being written; at most 'max_in_flight' writes are pending at once.
+        'documents' may be a lazy iterator: a batch is processed as soon as it is complete.
+
+        Args:
+            documents (Iterable[Document]): The documents to add.
+            collection_name (str): The name of the collection.
+            embedder (Embedder): Embedding model used to vectorize the documents.
+            batch_size (int): Number of chunks embedded and upserted together. Defaults to 64.
+            max_in_flight (int): Maximum number of pending upserts. Defaults to 2.
+            deterministic_ids (bool): Use 'point_id' as point id, so upserting a document again
+                overwrites it. Defaults to random ids.
+
+        Returns:
+            IngestionStats: Number of chunks and batches written and the observed throughput.
+        """
+        return self.run_ingestion(
+            documents,
+            self.ingestion_stages(
+                collection_name=collection_name,
+                embedder=embedder,
+                batch_size=batch_size,
+                max_in_flight=max_in_flight,
+                deterministic_ids=deterministic_ids,
+            ),
+        )
+
+    def ingestion_stages(
+        self,
+        collection_name: str,
+        embedder: Embedder,
+        batch_size: int = 64,
+        max_in_flight: int = 2,
+        deterministic_ids: bool = False,
+        on_upsert: Optional[Callable[[List[PointStruct]], None]] = None,
+    ) -> List[Stage]:
+        """
+        Build the "embed" and "upsert" pipeline stages. The "embed" stage turns a stream of documents
+        into batches of points, the "upsert" stage writes them and yields the size of every written batch.
+
+        Args:
+            collection_name (str): The name of the collection.
+            embedder (Embedder): Embedding model used to vectorize the documents.
+            batch_size (int): Number of chunks embedded and upserted together. Defaults to 64.
+            max_in_flight (int): Number of embedded batches waiting to be written. Defaults to 2.
+            deterministic_ids (bool): Use 'point_id' as point id. Defaults to random ids.
+            on_upsert (Callable[[List[PointStruct]], None], optional): Called with every batch of points
+                once it is written, e.g. to update the keyword index.
+
+        Returns:
+            List[Stage]: The two stages, to be appended to a pipeline producing documents.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        def embed(documents: Iterator[Document]) -> Iterator[List[PointStruct]]:
+            while batch := list(itertools.islice(documents, batch_size)):
+                vectors = embedder.embed_documents(
+                    [document.page_content for document in batch],
+                    collection_name=collection_name,
+                )
+                batch_ids = [self.point_id(document) for document in batch] if deterministic_ids else None
+                yield self._build_points(batch, vectors, batch_ids)
+
+        def upsert(batches: Iterator[List[PointStruct]]) -> Iterator[int]:
+            for points in batches:
+                self.client.upsert(
+                    collection_name=collection_name,
+                    points=points,
+                    wait=True,
+                )
+                if on_upsert is not None:
+                    on_upsert(points)
+                yield len(points)
+
+        return [
+            Stage("embed", embed, queue_size=max_in_flight),
+            Stage("upsert", upsert, queue_size=max_in_flight),
+        ]
+
+    @staticmethod
+    def run_ingestion(
+        source: Iterable,
+        stages: List[Stage],
+    ) -> IngestionStats:
+        """
+        Run an ingestion pipeline whose last stage yields the size of every written batch.
+
+        Args:
+            source (Iterable): Input of the first stage.
+            stages (List[Stage]): Pipeline stages, ending with those of 'ingestion_stages'.
+
+        Returns:
+            IngestionStats: Number of chunks and batches written, the observed throughput and
+                the working time of every stage.
+        """
+        start = time.perf_counter()
+        chunks = 0
+        batches = 0
+        pipeline = IngestionPipeline(stages)
+        for written in pipeline.run(source):
+            chunks += written
+            batches += 1
+
+        elapsed = time.perf_counter() - start
+        metrics.counter("ingestion_chunks_total", "Chunks written to the vector store").inc(chunks)
+        return IngestionStats(
+            chunks=chunks,
+            batches=batches,
+            seconds=elapsed,
+            chunks_per_second=chunks / elapsed if elapsed > 0 else 0.0,
+            stage_seconds=pipeline.stage_seconds,
+        )
+
+    def set_total_chunks(
+        self,
+        collection_name: str,
+        document_id: str,
+        total_chunks: int,
+        document_hash: Optional[str] = None
+    ):
+        """
+        Record the number of chunks of a document on all its points, once it is known.
+
+        Args:
+            collection_name (str): The name of the collection.
+            document_id (str): The 'document_id' metadata of the document.
+            total_chunks (int): The number of chunks of the document.
+            document_hash (str, optional): Hash of the document file, also recorded when given.
+        """
+        payload: Dict[str, Any] = {"total_chunks": total_chunks}
+        if document_hash is not None:
+            payload["document_hash"] = document_hash
+        self.client.set_payload(
+            collection_name=collection_name,
+            payload=payload,
+            key=QdrantVectorStore.METADATA_KEY,
+            points=self.document_filter(document_id),
+        )
+
+    def set_metadata(
+        self,
+        collection_name: str,
+        metadata: Dict[str, Dict[str, Any]],
+        batch_size: int = 1024
     ):
         """
-        Add documents to the collection.
+        Update the metadata of points whose chunk text is unchanged but whose position in the
+        document moved, without embedding or writing them again.
 
         Args:
-            documents (List[Document]): The documents to add.
-            qdrant_vector_store (QdrantVectorStore): The QdrantVectorStore to use.
+            collection_name (str): The name of the collection.
+            metadata (Dict[str, Dict[str, Any]]): Metadata fields to set, by point id.
+            batch_size (int): Points updated per request. Defaults to 1024.
+        """
+        operations = [
+            SetPayloadOperation(set_payload=SetPayload(
+                payload=fields, points=[point_id], key=QdrantVectorStore.METADATA_KEY
+            ))
+            for point_id, fields in metadata.items()
+        ]
+        for start in range(0, len(operations), batch_size):
+            self.client.batch_update_points(
+                collection_name=collection_name,
+                update_operations=operations[start:start + batch_size],
+                wait=True,
+            )
+
+    def stored_points(
+        self,
+        collection_name: str,
+        document_id: str,
+        batch_size: int = 1024
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        List the points of a document, without their vectors.
+
+        Args:
+            collection_name (str): The name of the collection.
+            document_id (str): The 'document_id' metadata of the document.
+            batch_size (int): Points fetched per request. Defaults to 1024.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The metadata of every point, by point id.
+        """
+        points: Dict[str, Dict[str, Any]] = {}
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=self.document_filter(document_id),
+                limit=batch_size,
+                offset=offset,
+                with_payload=[QdrantVectorStore.METADATA_KEY],
+                with_vectors=False,
+            )
+            for record in records:
+                points[str(record.id)] = (record.payload or {}).get(QdrantVectorStore.METADATA_KEY) or {}
+            if offset is None:
+                return points
+
+    def delete_points(
+        self,
+        collection_name: str,
+        ids: List[str],
+        batch_size: int = 1024
+    ) -> int:
+        """
+        Delete points by id, in bulk requests.
+
+        Args:
+            collection_name (str): The name of the collection.
+            ids (List[str]): Point ids.
+            batch_size (int): Points deleted per request. Defaults to 1024.
+
+        Returns:
+            int: Number of ids sent for deletion.
+        """
+        for start in range(0, len(ids), batch_size):
+            self.client.delete(
+                collection_name=collection_name,
+                points_selector=PointIdsList(points=ids[start:start + batch_size]),
+                wait=True,
+            )
+        return len(ids)
+
+    @staticmethod
+    def document_filter(
+        document_id: str
+    ) -> Filter:
+        """
+        Args:
+            document_id (str): The 'document_id' metadata of a document.
+
+        Returns:
+            Filter: Filter matching the points of the document.
+        """
+        return Filter(must=[FieldCondition(
+            key=f"{QdrantVectorStore.METADATA_KEY}.document_id",
+            match=MatchValue(value=document_id),
+        )])
+
+    @staticmethod
+    def file_hash(
+        file_path: str
+    ) -> str:
+        """
+        Args:
+            file_path (str): Path of a document file.
+
+        Returns:
+            str: Hex SHA-256 digest of the file's bytes.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def content_hash(
+        text: str
+    ) -> str:
+        """
+        Args:
+            text (str): Chunk text.
+
+        Returns:
+            str: Hex SHA-256 digest of the text.
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def point_id(
+        document: Document
+    ) -> str:
+        """
+        Derive a deterministic point id from the chunk's document and text, so uploading the same
+        chunk again overwrites its point instead of adding a duplicate. The document is identified by
+        its 'document_id' metadata, or by its 'source' for chunks without one. A text repeated within
+        the document gets one point per repetition, numbered by its 'occurrence' metadata.
+
+        Args:
+            document (Document): The chunk.
+
+        Returns:
+            str: A UUID built from the chunk hash.
+        """
+        key = f"{document.metadata.get('document_id') or document.metadata.get('source', '')}\0"
+        occurrence = document.metadata.get('occurrence', 0)
+        if occurrence:
+            key += f"{occurrence}\0"
+        digest = hashlib.sha256(f"{key}{document.page_content}".encode("utf-8")).hexdigest()
+        return str(uuid.UUID(digest[:32]))
+
+    @staticmethod
+    def _build_points(
+        documents: List[Document],
+        vectors: List[List[float]],
+        ids: Optional[List[str]] = None
+    ) -> List[PointStruct]:
+        """
+        Build Qdrant points using the payload layout expected by QdrantVectorStore,
+        so the stored chunks stay searchable through LangChain.
+
+        Args:
+            documents (List[Document]): The documents of the batch.
+            vectors (List[List[float]]): Their embeddings, in the same order.
+            ids (List[str], optional): Their point ids. Defaults to random ids.
+
+        Returns:
+            List[PointStruct]: Points ready to be upserted.
         """
-        for document in documents:
-            qdrant_vector_store.add_documents(documents=[document])
+        ids = ids or [uuid.uuid4().hex for _ in documents]
+        return [
+            PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={
+                    QdrantVectorStore.CONTENT_KEY: document.page_content,
+                    QdrantVectorStore.METADATA_KEY: document.metadata,
+                },
+            )
+            for point_id, document, vector in zip(ids, documents, vectors)
+        ]
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional, Union
 
 from pydantic import BaseModel
 
@@ -9,14 +9,96 @@ This script defines Pydantic models for handling file upload requests, query par
 class UploadFileRequest(BaseModel):
     file_path: str
     collection_name: str
+    # Identity of the document in the collection, defaults to the absolute path of 'file_path'.
+    # Uploading a document with the same id again replaces its chunks.
+    document_id: Optional[str] = None
     # length: Optional[int] = 500
 
 class QueryRequest(BaseModel):
     query: str
     collection_name: str
-    search_type: Optional[str] = "similarity"
+    search_type: Optional[Literal["similarity", "hybrid", "mmr"]] = "similarity"
     k: Optional[int] = 5
+    rerank: Optional[bool] = False
+    rerank_budget_ms: Optional[float] = None
+    # Metadata field -> value, or list of accepted values, e.g. {"source": "SQLova.pdf"}
+    filters: Optional[Dict[str, Union[str, int, bool, List[Union[str, int]]]]] = None
 
 class QueryResponse(BaseModel):
     response: str
     context: Optional[List[str]] = None
+
+class BatchQueryRequest(BaseModel):
+    # Either the queries themselves or a JSONL file with one query object per line
+    queries: Optional[List[QueryRequest]] = None
+    file_path: Optional[str] = None
+    # Defaults for the lines of 'file_path' that do not set these fields
+    collection_name: Optional[str] = None
+    search_type: Optional[Literal["similarity", "hybrid", "mmr"]] = "similarity"
+    k: Optional[int] = 5
+    rerank: Optional[bool] = False
+
+class BatchQueryResult(BaseModel):
+    # Position of the query in the batch; results are returned in completion order
+    index: int
+    id: Optional[str] = None
+    query: str
+    response: str
+    context: Optional[List[str]] = None
+
+class IngestionStats(BaseModel):
+    chunks: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    chunks_per_second: float = 0.0
+    stage_seconds: Optional[Dict[str, float]] = None
+    # Chunks already stored and left untouched, and stored chunks deleted because they vanished
+    unchanged: int = 0
+    deleted: int = 0
+
+class FileIngestionResult(BaseModel):
+    file_path: str
+    status: str
+    detail: Optional[str] = None
+    stats: Optional[IngestionStats] = None
+
+class DeleteDocumentResponse(BaseModel):
+    collection_name: str
+    document_id: str
+    deleted: int
+
+class CompressCollectionRequest(BaseModel):
+    collection_name: str
+    target_collection_name: str
+    # Project the vectors to this many dimensions, fitted on up to 'sample_size' stored vectors
+    dimensions: Optional[int] = None
+    projection: Optional[Literal["pca", "truncate"]] = "pca"
+    quantization: Optional[Literal["none", "scalar", "binary"]] = "none"
+    sample_size: Optional[int] = 10000
+
+class CompressionStats(BaseModel):
+    collection_name: str
+    target_collection_name: str
+    points: int
+    dimensions: int
+    source_dimensions: int
+    projection: Optional[str] = None
+    # Share of the squared norm of the sampled vectors kept by the projection
+    retained: Optional[float] = None
+    quantization: str = "none"
+    # Bytes per vector held in RAM for search, in the new and in the source collection
+    vector_bytes: float = 0.0
+    source_vector_bytes: float = 0.0
+    seconds: float = 0.0
+
+class UploadJobStatus(BaseModel):
+    job_id: str
+    status: str
+    file_path: str
+    collection_name: str
+    detail: Optional[str] = None
+    stats: Optional[IngestionStats] = None
+    files: Optional[List[FileIngestionResult]] = None
+    created_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
@@ -0,0 +1,291 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+from scripts.backend.models.rag import QueryRequest, QueryResponse
+from scripts.backend.query_processing.query_cache import CacheKey
+from scripts.backend.runtime.metrics import metrics
+
+"""
+This script defines an on-disk store of precomputed answers to frequent questions. The answers are
+built offline by 'scripts.precompute_answers' and looked up before anything else on the query path.
+
+The store is a SQLite file; every process keeps its fresh answers in a dictionary, so a lookup is a
+dictionary access, and reloads it when another process has written to the file. When a collection
+changes, its answers are marked stale and no longer served until they are refreshed.
+"""
+
+load_dotenv()
+
+ANSWER_STORE_PATH = os.getenv("ANSWER_STORE_PATH", ".cache/answers.sqlite3")
+ANSWER_STORE_RELOAD_SECONDS = float(os.getenv("ANSWER_STORE_RELOAD_SECONDS", 1.0))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    collection_name TEXT NOT NULL,
+    query_key TEXT NOT NULL,
+    request TEXT NOT NULL,
+    response TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    stale INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (collection_name, query_key)
+) WITHOUT ROWID
+"""
+
+
+class StoredAnswer(NamedTuple):
+    key: CacheKey
+    query_request: QueryRequest
+    response: QueryResponse
+    hits: int
+    stale: bool
+
+
+class AnswerStore:
+    """
+    A thread-safe store of precomputed responses, keyed like the QueryCache on (collection,
+    normalized query, k, model versions), so an answer is only served to the exact request it was
+    built for, with the same models.
+    """
+
+    def __init__(
+        self,
+        path: str = ANSWER_STORE_PATH,
+        reload_seconds: float = ANSWER_STORE_RELOAD_SECONDS
+    ):
+        """
+        Initialize the AnswerStore, creating the file if needed.
+
+        Args:
+            path (str): SQLite file, ":memory:" for a store private to this instance.
+                Defaults to the ANSWER_STORE_PATH environment variable or ".cache/answers.sqlite3".
+            reload_seconds (float): Seconds between checks for writes of other processes.
+                Defaults to the ANSWER_STORE_RELOAD_SECONDS environment variable or 1.
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(SCHEMA)
+        self._lock = threading.Lock()
+        self._answers: Dict[CacheKey, QueryResponse] = {}
+        self._data_version = None
+        self._checked_at = 0.0
+
+        self.hits = metrics.counter("answer_store_hits_total", "Queries answered from the answer store")
+        self.size = metrics.gauge("answer_store_entries", "Fresh answers in the answer store")
+        with self._lock:
+            self._reload()
+
+    @staticmethod
+    def _query_key(
+        key: CacheKey
+    ) -> str:
+        _, normalized, k, model_versions = key
+        return json.dumps([normalized, k, list(model_versions)])
+
+    @staticmethod
+    def _cache_key(
+        collection_name: str,
+        query_key: str
+    ) -> CacheKey:
+        normalized, k, model_versions = json.loads(query_key)
+        return (collection_name, normalized, k, tuple(model_versions))
+
+    def get(
+        self,
+        key: CacheKey
+    ) -> Optional[QueryResponse]:
+        """
+        Args:
+            key (CacheKey): Key of the request, see QueryCache.make_key
+
+        Returns:
+            QueryResponse, optional: The precomputed response, or None when there is no fresh one
+        """
+        if time.monotonic() - self._checked_at > self.reload_seconds:
+            with self._lock:
+                self._reload_if_changed()
+        response = self._answers.get(key)
+        if response is not None:
+            self.hits.inc()
+        return response
+
+    def put(
+        self,
+        key: CacheKey,
+        query_request: QueryRequest,
+        response: QueryResponse,
+        hits: int = 0
+    ):
+        """
+        Store a fresh response, replacing any previous one.
+
+        Args:
+            key (CacheKey): Key of the request
+            query_request (QueryRequest): The request, kept to refresh the answer later
+            response (QueryResponse): Its response
+            hits (int): How often the question was asked. Defaults to 0.
+        """
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, 0, ?)",
+                (key[0], self._query_key(key), query_request.model_dump_json(),
+                 response.model_dump_json(), hits, time.time())
+            )
+            self._answers[key] = response
+            self._track_writes()
+
+    def mark_fresh(
+        self,
+        key: CacheKey,
+        hits: Optional[int] = None
+    ) -> bool:
+        """
+        Serve a stale response again, once it is known to be unchanged.
+
+        Args:
+            key (CacheKey): Key of the request
+            hits (int, optional): New question frequency. Defaults to keeping the stored one.
+
+        Returns:
+            bool: False if the store has no response for the key.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE answers SET stale = 0, hits = COALESCE(?, hits), updated_at = ? "
+                "WHERE collection_name = ? AND query_key = ? RETURNING response",
+                (hits, time.time(), key[0], self._query_key(key))
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                self._answers[key] = QueryResponse.model_validate_json(row[0])
+            self._track_writes()
+            return row is not None
+
+    def entries(
+        self,
+        collection_name: Optional[str] = None,
+        stale: Optional[bool] = None
+    ) -> List[StoredAnswer]:
+        """
+        Args:
+            collection_name (str, optional): Only list the answers of this collection
+            stale (bool, optional): Only list stale (True) or fresh (False) answers
+
+        Returns:
+            List[StoredAnswer]: The stored answers, most asked first
+        """
+        conditions, parameters = [], []
+        if collection_name is not None:
+            conditions.append("collection_name = ?")
+            parameters.append(collection_name)
+        if stale is not None:
+            conditions.append("stale = ?")
+            parameters.append(int(stale))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT collection_name, query_key, request, response, hits, stale FROM answers "
+                f"{where} ORDER BY hits DESC", parameters
+            ).fetchall()
+        return [
+            StoredAnswer(
+                key=self._cache_key(collection, query_key),
+                query_request=QueryRequest.model_validate_json(request),
+                response=QueryResponse.model_validate_json(response),
+                hits=hits,
+                stale=bool(is_stale)
+            )
+            for collection, query_key, request, response, hits, is_stale in rows
+        ]
+
+    def invalidate(
+        self,
+        collection_name: str
+    ) -> int:
+        """
+        Mark every answer of a collection stale, e.g. after chunks were written to or deleted from it.
+
+        Args:
+            collection_name (str): Name of the collection
+
+        Returns:
+            int: Number of answers marked stale
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE answers SET stale = 1 WHERE collection_name = ? AND stale = 0", (collection_name,)
+            )
+            for key in [key for key in self._answers if key[0] == collection_name]:
+                del self._answers[key]
+            self._track_writes()
+            return cursor.rowcount
+
+    def remove(
+        self,
+        keys: Iterable[CacheKey]
+    ) -> int:
+        """
+        Args:
+            keys (Iterable[CacheKey]): Keys of the answers to delete
+
+        Returns:
+            int: Number of deleted answers
+        """
+        removed = 0
+        with self._lock:
+            for key in keys:
+                removed += self._connection.execute(
+                    "DELETE FROM answers WHERE collection_name = ? AND query_key = ?",
+                    (key[0], self._query_key(key))
+                ).rowcount
+                self._answers.pop(key, None)
+            self._track_writes()
+        return removed
+
+    def _reload_if_changed(self):
+        self._checked_at = time.monotonic()
+        if self._connection.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._reload()
+
+    def _reload(self):
+        rows = self._connection.execute(
+            "SELECT collection_name, query_key, response FROM answers WHERE stale = 0"
+        ).fetchall()
+        self._answers = {
+            self._cache_key(collection, query_key): QueryResponse.model_validate_json(response)
+            for collection, query_key, response in rows
+        }
+        self._track_writes()
+
+    def _track_writes(self):
+        # 'data_version' only changes with the commits of other connections, not with our own
+        self._data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+        self._checked_at = time.monotonic()
+        self.size.set(len(self._answers))
+
+
+_answer_store: Optional[AnswerStore] = None
+_answer_store_lock = threading.Lock()
+
+
+def get_answer_store() -> Optional[AnswerStore]:
+    """
+    Returns:
+        AnswerStore, optional: The process-wide answer store at ANSWER_STORE_PATH, opened on first
+            use, or None when ANSWER_STORE_PATH is empty.
+    """
+    global _answer_store
+    with _answer_store_lock:
+        if _answer_store is None and ANSWER_STORE_PATH:
+            _answer_store = AnswerStore(ANSWER_STORE_PATH)
+        return _answer_store
@@ -0,0 +1,166 @@
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+"""
+This script defines the packing of retrieved chunks into the generation prompt. Chunks are taken in
+retrieval order until a token budget is filled, and the text that adjacent chunks of the same source
+share because of the splitter's overlap is only kept once.
+"""
+
+load_dotenv()
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 400))
+MIN_OVERLAP_CHARACTERS = 8
+MAX_OVERLAP_CHARACTERS = 200
+MIN_FRAGMENT_TOKENS = 32
+SEPARATOR = "\n\n"
+
+
+class PackedContext(NamedTuple):
+    """
+    Result of packing retrieved chunks.
+
+    Attributes:
+        text (str): The context passed to the generator.
+        documents (List[Document]): Chunks that contributed to the context, in retrieval order.
+        tokens_used (int): Tokens of the context.
+        tokens_dropped (int): Tokens left out: removed overlaps, duplicate chunks and chunks over the budget.
+    """
+    text: str
+    documents: List[Document]
+    tokens_used: int
+    tokens_dropped: int
+
+
+class ContextPacker:
+    """
+    Packs retrieved chunks into a context of at most 'token_budget' tokens, measured with the
+    generator's tokenizer so the budget matches what the model reads.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Optional[Any] = None,
+        token_budget: int = CONTEXT_TOKEN_BUDGET
+    ):
+        """
+        Initialize the ContextPacker.
+
+        Args:
+            tokenizer (Any, optional): Hugging Face tokenizer of the generation model. Defaults to counting words.
+            token_budget (int): Maximum number of context tokens, 0 for no limit. Defaults to the
+                CONTEXT_TOKEN_BUDGET environment variable or 400, which leaves room for the prompt
+                and the query within the 512 input tokens of flan-t5.
+        """
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget
+
+    def pack(
+        self,
+        documents: List[Document]
+    ) -> PackedContext:
+        """
+        Take chunks in order, best first, until the budget is full.
+
+        A chunk already taken, with the same 'source' and 'chunk_id', or the same text, is skipped.
+        When the previous or next chunk of the same source was already taken, the text they
+        share is removed from this one. A chunk that does not fit is cut to the remaining budget
+        when at least MIN_FRAGMENT_TOKENS remain, and skipped otherwise so a shorter one may fit.
+
+        Args:
+            documents (List[Document]): Retrieved chunks, best first
+
+        Returns:
+            PackedContext: The context and its token accounting
+        """
+        taken: Dict[Tuple[Any, Any], str] = {}
+        texts: List[str] = []
+        packed: List[Document] = []
+        seen_texts = set()
+        used = 0
+        dropped = 0
+        separator_tokens = self._count(SEPARATOR) if documents else 0
+
+        for document in documents:
+            text = document.page_content
+            # Chunks of uploads carry the document identity; same-named files are different documents
+            source = document.metadata.get("document_id") or document.metadata.get("source")
+            chunk_id = document.metadata.get("chunk_id")
+            full_tokens = self._count(text)
+            if (chunk_id is not None and (source, chunk_id) in taken) or text in seen_texts:
+                dropped += full_tokens
+                continue
+            seen_texts.add(text)
+
+            if isinstance(chunk_id, int):
+                previous = taken.get((source, chunk_id - 1))
+                if previous is not None:
+                    text = text[self.overlap(previous, text):]
+                following = taken.get((source, chunk_id + 1))
+                if following is not None:
+                    text = text[:len(text) - self.overlap(text, following)]
+            text = text.strip()
+
+            tokens = self._count(text) if text != document.page_content else full_tokens
+            cost = tokens + (separator_tokens if texts else 0)
+            remaining = self.token_budget - used if self.token_budget > 0 else cost
+            if cost > remaining:
+                fragment_tokens = remaining - (separator_tokens if texts else 0)
+                if fragment_tokens < MIN_FRAGMENT_TOKENS:
+                    dropped += full_tokens
+                    continue
+                text = self._truncate(text, fragment_tokens)
+                tokens = self._count(text)
+                cost = tokens + (separator_tokens if texts else 0)
+
+            if not text:
+                dropped += full_tokens
+                continue
+            taken[(source, chunk_id)] = document.page_content
+            texts.append(text)
+            packed.append(document)
+            used += cost
+            dropped += full_tokens - tokens
+
+        return PackedContext(SEPARATOR.join(texts), packed, used, dropped)
+
+    @staticmethod
+    def overlap(
+        first: str,
+        second: str
+    ) -> int:
+        """
+        Args:
+            first (str): Text of a chunk
+            second (str): Text of the chunk that follows it in the document
+
+        Returns:
+            int: Length of the longest suffix of 'first' that is also a prefix of 'second', between
+                MIN_OVERLAP_CHARACTERS and MAX_OVERLAP_CHARACTERS, or 0 if there is none.
+        """
+        longest = min(len(first), len(second), MAX_OVERLAP_CHARACTERS)
+        for length in range(longest, MIN_OVERLAP_CHARACTERS - 1, -1):
+            if first.endswith(second[:length]):
+                return length
+        return 0
+
+    def _count(
+        self,
+        text: str
+    ) -> int:
+        if self.tokenizer is None:
+            return len(text.split())
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def _truncate(
+        self,
+        text: str,
+        tokens: int
+    ) -> str:
+        if self.tokenizer is None:
+            return " ".join(text.split()[:tokens])
+        ids = self.tokenizer.encode(text, add_special_tokens=False)[:tokens]
+        return self.tokenizer.decode(ids, skip_special_tokens=True)
@@ -0,0 +1,272 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from scripts.backend.models.rag import QueryResponse
+from scripts.backend.runtime.metrics import metrics
+
+"""
+This script defines a two-tier query cache: an exact-match LRU keyed on the normalized query and a
+semantic tier that reuses answers of queries whose embeddings are close enough to the new one.
+"""
+
+load_dotenv()
+
+CacheKey = Tuple[str, str, int, Tuple[str, ...]]
+
+
+@dataclass
+class CacheEntry:
+    response: QueryResponse
+    vector: Optional[np.ndarray]
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class QueryCache:
+    """
+    A thread-safe LRU cache of query responses with TTL expiration and a semantic lookup tier.
+
+    Entries are keyed on (collection, normalized query, k, model versions). A semantic lookup only
+    considers entries with the same collection, k and model versions, and returns the most similar one
+    whose cosine similarity to the query embedding reaches 'similarity_threshold'.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: float = 0.95
+    ):
+        """
+        Initialize the QueryCache.
+
+        Args:
+            max_entries (int): Maximum number of cached responses. Defaults to 1024.
+            ttl_seconds (float): Seconds a response stays valid. Defaults to 3600.
+            similarity_threshold (float): Minimum cosine similarity for a semantic hit. Values above 1
+                disable the semantic tier. Defaults to 0.95.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self._groups: Dict[Tuple, Dict[CacheKey, None]] = {}
+        self._matrices: Dict[Tuple, Tuple[List[CacheKey], np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+        self.exact_hits = metrics.counter("query_cache_exact_hits_total", "Exact query cache hits")
+        self.semantic_hits = metrics.counter("query_cache_semantic_hits_total", "Semantic query cache hits")
+        self.misses = metrics.counter("query_cache_misses_total", "Query cache misses")
+        self.size = metrics.gauge("query_cache_entries", "Responses currently cached")
+
+    @classmethod
+    def from_env(cls) -> "QueryCache":
+        """
+        Build a cache configured by the QUERY_CACHE_SIZE, QUERY_CACHE_TTL and QUERY_CACHE_SIMILARITY
+        environment variables.
+        """
+        return cls(
+            max_entries=int(os.getenv("QUERY_CACHE_SIZE", 1024)),
+            ttl_seconds=float(os.getenv("QUERY_CACHE_TTL", 3600)),
+            similarity_threshold=float(os.getenv("QUERY_CACHE_SIMILARITY", 0.95)),
+        )
+
+    @staticmethod
+    def make_key(
+        collection_name: str,
+        query: str,
+        k: int,
+        model_versions: Tuple[str, ...]
+    ) -> CacheKey:
+        """
+        Build the exact-match key of a query. Case and whitespace differences are ignored.
+
+        Args:
+            collection_name (str): Name of the collection searched
+            query (str): User's query
+            k (int): Number of retrieved documents
+            model_versions (Tuple[str, ...]): Names of the embedding and generation models, and any
+                other setting that changes the answer, such as the search type
+
+        Returns:
+            CacheKey: The cache key
+        """
+        normalized = " ".join(query.lower().split())
+        return (collection_name, normalized, k, tuple(model_versions))
+
+    def get(
+        self,
+        key: CacheKey
+    ) -> Optional[QueryResponse]:
+        """
+        Look up an exact match.
+
+        Args:
+            key (CacheKey): Key built with 'make_key'
+
+        Returns:
+            Optional[QueryResponse]: The cached response, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        self.exact_hits.inc()
+        return entry.response
+
+    def get_similar(
+        self,
+        key: CacheKey,
+        vector: List[float]
+    ) -> Optional[QueryResponse]:
+        """
+        Look up the cached response of the most similar query. Counts a miss when nothing matches.
+
+        Args:
+            key (CacheKey): Key built with 'make_key'
+            vector (List[float]): Embedding of the query
+
+        Returns:
+            Optional[QueryResponse]: The cached response, or None
+        """
+        if self.similarity_threshold <= 1.0:
+            query_vector = self._normalize(vector)
+            with self._lock:
+                keys, matrix = self._group_matrix(self._group(key))
+                if keys:
+                    scores = matrix @ query_vector
+                    best = int(np.argmax(scores))
+                    entry = self._entries.get(keys[best])
+                    if scores[best] >= self.similarity_threshold and entry is not None and not self._expired(entry):
+                        self._entries.move_to_end(keys[best])
+                        self.semantic_hits.inc()
+                        return entry.response
+
+        self.misses.inc()
+        return None
+
+    def put(
+        self,
+        key: CacheKey,
+        response: QueryResponse,
+        vector: Optional[List[float]] = None
+    ):
+        """
+        Store a response, evicting the least recently used entries beyond 'max_entries'.
+
+        Args:
+            key (CacheKey): Key built with 'make_key'
+            response (QueryResponse): Response to cache
+            vector (List[float], optional): Embedding of the query, enables semantic hits
+        """
+        entry = CacheEntry(
+            response=response,
+            vector=self._normalize(vector) if vector is not None else None
+        )
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            if entry.vector is not None:
+                group = self._group(key)
+                self._groups.setdefault(group, {})[key] = None
+                self._matrices.pop(group, None)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self.size.set(len(self._entries))
+
+    def invalidate(
+        self,
+        collection_name: str
+    ) -> int:
+        """
+        Drop every cached response of a collection, e.g. after new chunks were written to it.
+
+        Args:
+            collection_name (str): Name of the collection
+
+        Returns:
+            int: Number of dropped responses
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == collection_name]
+            for key in keys:
+                self._remove(key)
+            self.size.set(len(self._entries))
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._matrices.clear()
+            self.size.set(0)
+
+    def _expired(
+        self,
+        entry: CacheEntry
+    ) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _remove(
+        self,
+        key: CacheKey
+    ):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.vector is not None:
+            group = self._group(key)
+            members = self._groups.get(group, {})
+            members.pop(key, None)
+            if not members:
+                self._groups.pop(group, None)
+            self._matrices.pop(group, None)
+
+    def _group_matrix(
+        self,
+        group: Tuple
+    ) -> Tuple[List[CacheKey], np.ndarray]:
+        cached = self._matrices.get(group)
+        if cached is None:
+            keys = list(self._groups.get(group, {}))
+            matrix = (
+                np.stack([self._entries[key].vector for key in keys])
+                if keys else np.empty((0, 0), dtype=np.float32)
+            )
+            cached = self._matrices[group] = (keys, matrix)
+        return cached
+
+    @staticmethod
+    def _group(
+        key: CacheKey
+    ) -> Tuple:
+        collection_name, _, k, model_versions = key
+        return (collection_name, k, model_versions)
+
+    @staticmethod
+    def _normalize(
+        vector: List[float]
+    ) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+
+_query_cache = QueryCache.from_env()
+
+
+def get_query_cache() -> QueryCache:
+    """
+    Returns:
+        QueryCache: The process-wide query cache.
+    """
+    return _query_cache
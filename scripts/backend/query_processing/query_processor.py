@@ -1,19 +1,37 @@
-from typing import List
+import asyncio
+import json
+import os
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
 from langchain_qdrant import QdrantVectorStore
+from qdrant_client import AsyncQdrantClient
 from scripts.backend.document_processing.document_embedder import Embedder
-from scripts.backend.models.rag import QueryRequest, QueryResponse
+from scripts.backend.models.rag import BatchQueryRequest, QueryRequest, QueryResponse
+from scripts.backend.query_processing.answer_store import AnswerStore
+from scripts.backend.query_processing.context_packer import ContextPacker, PackedContext
+from scripts.backend.query_processing.query_cache import CacheKey, QueryCache
+from scripts.backend.query_processing.reranker import Reranker
 from scripts.backend.query_processing.retriever import Retriever
-from scripts.backend.query_processing.response_generator import ResponseGenerator
+from scripts.backend.query_processing.response_generator import ERROR_PREFIX, ResponseGenerator
+from scripts.backend.runtime.inference_executor import InferenceExecutor, InferenceQueueFullError
+from scripts.backend.runtime.micro_batcher import MicroBatcher
+from scripts.backend.runtime.tracing import count, record_error, span
 
 class QueryProcessor:
     """
     A class responsible for processing user queries and generating responses.
+
+    A request whose answer was precomputed in the AnswerStore is answered from it, before the cache.
     """
     def __init__(
         self, 
         embedder: Embedder, 
         vector_store: QdrantVectorStore,
-        response_generator: ResponseGenerator
+        response_generator: ResponseGenerator,
+        query_cache: Optional[QueryCache] = None,
+        reranker: Optional[Reranker] = None,
+        answer_store: Optional[AnswerStore] = None
     ):
         """
         Initialize the QueryProcessor.
@@ -22,45 +40,609 @@ class QueryProcessor:
             embedder (Embedder): Embedding model
             vector_store (QdrantVectorStore): Vector store to search in
             response_generator (ResponseGenerator): Model for generating responses
+            query_cache (QueryCache, optional): Cache of previous responses. Defaults to no caching.
+            reranker (Reranker, optional): Cross-encoder applied to the retrieved chunks of requests
+                with 'rerank' set. Defaults to no reranking.
+            answer_store (AnswerStore, optional): Precomputed answers of frequent questions.
+                Defaults to none.
         """
-        self.retriever = Retriever(embedder, vector_store)
+        self.retriever = Retriever(embedder, vector_store, ContextPacker(response_generator.tokenizer))
         self.response_generator = response_generator
+        self.query_cache = query_cache
+        self.reranker = reranker
+        self.answer_store = answer_store
 
     def process_query(
         self, 
-        query_request: QueryRequest
+        query_request: QueryRequest,
+        query_vector: Optional[List[float]] = None,
+        packed: Optional[PackedContext] = None
     ) -> QueryResponse:
         """
         Process the query by retrieving context and generating a response.
         
         Args:
             query_request (QueryRequest): Query details
+            query_vector (List[float], optional): Precomputed query embedding
+            packed (PackedContext, optional): Context already retrieved for the query, e.g. by a
+                SpeculativeRetriever. Defaults to retrieving it.
         
         Returns:
             QueryResponse: Generated response based on retrieved context
         """
         try:
-            context_docs = self.retriever.retrieve_context(
-                query=query_request.query,
-                collection_name=query_request.collection_name,
-                k=query_request.k
-            )
-            
-            context = self.retriever.format_context(context_docs)
+            precomputed = self.precomputed(query_request)
+            if precomputed is not None:
+                return precomputed
+
+            cache_key = self._cache_key(query_request)
+            if cache_key is not None:
+                cached = self.query_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+            if cache_key is not None:
+                if query_vector is None:
+                    query_vector = self.retriever.embed_query(query_request.query, query_request.collection_name)
+                cached = self.query_cache.get_similar(cache_key, query_vector)
+                if cached is not None:
+                    return cached
+
+            if packed is None:
+                packed = self.retrieve(query_request, query_vector)
+            context, context_docs = packed.text, packed.documents
             
             response = self.response_generator.generate_response(
                 query=query_request.query, 
                 context=context
             )
                         
-            return QueryResponse(
+            query_response = QueryResponse(
                 response=response, 
                 context=[doc.page_content for doc in context_docs]
             )
+            self._cache_response(cache_key, query_response, query_vector)
+            return query_response
         
         except Exception as e:
-            return QueryResponse(
-                response=f"Error processing query: {str(e)}",
-                context=[],
-                sources=None
+            record_error("query")
+            return self._error_response(e)
+
+    async def aprocess_query(
+        self,
+        query_request: QueryRequest,
+        executor: InferenceExecutor,
+        async_client: Optional[AsyncQdrantClient] = None,
+        embedding_batcher: Optional[MicroBatcher] = None,
+        generation_batcher: Optional[MicroBatcher] = None
+    ) -> QueryResponse:
+        """
+        Process the query without blocking the event loop. Embedding and generation run on the
+        inference executor, vector search goes through the async Qdrant client.
+
+        Args:
+            query_request (QueryRequest): Query details
+            executor (InferenceExecutor): Executor for CPU-bound model calls
+            async_client (AsyncQdrantClient, optional): Client for the vector search
+            embedding_batcher (MicroBatcher, optional): Batcher that embeds this query together with
+                those of concurrent requests. Defaults to embedding it alone.
+            generation_batcher (MicroBatcher, optional): Batcher that generates this answer together with
+                those of concurrent requests. Items are (query, context) pairs. Defaults to generating it alone.
+
+        Returns:
+            QueryResponse: Generated response based on retrieved context
+
+        Raises:
+            InferenceQueueFullError: If the executor cannot accept more work.
+        """
+        try:
+            cached, query_vector = await self.acached(query_request, executor, embedding_batcher)
+            if cached is not None:
+                return cached
+            if query_vector is None:
+                query_vector = await self._aembed_query(
+                    query_request.query, query_request.collection_name, executor, embedding_batcher
+                )
+
+            context_docs, context = await self.aretrieve(
+                query_request, executor, async_client, embedding_batcher, query_vector
+            )
+
+            with span("generate", observe=False):
+                if generation_batcher is not None:
+                    response = await generation_batcher.submit((query_request.query, context))
+                else:
+                    response = await executor.run(
+                        self.response_generator.generate_response,
+                        query=query_request.query,
+                        context=context
+                    )
+
+            query_response = QueryResponse(
+                response=response,
+                context=[doc.page_content for doc in context_docs]
+            )
+            self._cache_response(self._cache_key(query_request), query_response, query_vector)
+            return query_response
+
+        except InferenceQueueFullError:
+            raise
+
+        except Exception as e:
+            record_error("query")
+            return self._error_response(e)
+
+    def retrieve(
+        self,
+        query_request: QueryRequest,
+        query_vector: Optional[List[float]] = None
+    ) -> PackedContext:
+        """
+        Retrieve, rerank if the request asks for it, and pack the context of a query.
+
+        Args:
+            query_request (QueryRequest): Query details
+            query_vector (List[float], optional): Precomputed query embedding
+
+        Returns:
+            PackedContext: The context and the documents it uses
+        """
+        context_docs = self.retriever.retrieve_context(
+            query=query_request.query,
+            collection_name=query_request.collection_name,
+            k=self._fetch_k(query_request),
+            query_vector=query_vector,
+            search_type=query_request.search_type or "similarity",
+            filters=query_request.filters
+        )
+        if self._reranks(query_request):
+            context_docs = self.reranker.rerank(
+                query_request.query,
+                context_docs,
+                query_request.k,
+                self.reranker.deadline(query_request.rerank_budget_ms)
+            )
+        return self.retriever.pack_context(context_docs)
+
+    def precomputed(
+        self,
+        query_request: QueryRequest
+    ) -> Optional[QueryResponse]:
+        """
+        Args:
+            query_request (QueryRequest): Query details
+
+        Returns:
+            QueryResponse, optional: The answer precomputed for this exact request, if it is still fresh
+        """
+        if self.answer_store is None:
+            return None
+        response = self.answer_store.get(self.query_key(query_request))
+        if response is not None:
+            count("precomputed_answers", 1)
+        return response
+
+    async def acached(
+        self,
+        query_request: QueryRequest,
+        executor: InferenceExecutor,
+        embedding_batcher: Optional[MicroBatcher] = None
+    ) -> Tuple[Optional[QueryResponse], Optional[List[float]]]:
+        """
+        Look the request up in the answer store, then in the exact and the semantic tiers of the
+        query cache. The semantic tier needs the query embedding, which is returned so that the
+        retrieval of a miss does not compute it again.
+
+        Args:
+            query_request (QueryRequest): Query details
+            executor (InferenceExecutor): Executor for CPU-bound model calls
+            embedding_batcher (MicroBatcher, optional): Batcher for the query embedding
+
+        Returns:
+            Tuple[Optional[QueryResponse], Optional[List[float]]]: The stored answer, if any, and the
+                query embedding if it was computed
+
+        Raises:
+            InferenceQueueFullError: If the executor cannot accept more work.
+        """
+        precomputed = self.precomputed(query_request)
+        if precomputed is not None:
+            return precomputed, None
+
+        cache_key = self._cache_key(query_request)
+        if cache_key is None:
+            return None, None
+        cached = self.query_cache.get(cache_key)
+        if cached is not None:
+            return cached, None
+
+        query_vector = await self._aembed_query(
+            query_request.query, query_request.collection_name, executor, embedding_batcher
+        )
+        return self.query_cache.get_similar(cache_key, query_vector), query_vector
+
+    def process_batch(
+        self,
+        query_requests: List[QueryRequest],
+        chunk_size: int = int(os.getenv("BATCH_QUERY_CHUNK_SIZE", 64))
+    ) -> Iterator[Tuple[int, QueryResponse]]:
+        """
+        Answer many queries with batched model and Qdrant calls.
+
+        The queries are processed in chunks of 'chunk_size'. Within a chunk, the queries missing from
+        the cache are embedded in one pass, the queries of each collection are searched with one
+        'query_batch_points' call, and the prompts are sorted by length and generated in batches of
+        the generator's 'batch_size', so a batch holds prompts of similar length. A failing query
+        gets an error response and does not stop the others.
+
+        Args:
+            query_requests (List[QueryRequest]): Queries to answer
+            chunk_size (int): Queries processed together. Defaults to the BATCH_QUERY_CHUNK_SIZE
+                environment variable or 64.
+
+        Yields:
+            Tuple[int, QueryResponse]: Position of a query in 'query_requests' and its response,
+                as soon as it is ready
+        """
+        count("batch_queries", len(query_requests))
+        for start in range(0, len(query_requests), chunk_size):
+            yield from self._process_chunk([
+                (i, query_requests[i]) for i in range(start, min(start + chunk_size, len(query_requests)))
+            ])
+
+    def _process_chunk(
+        self,
+        items: List[Tuple[int, QueryRequest]]
+    ) -> Iterator[Tuple[int, QueryResponse]]:
+        pending = []
+        for index, query_request in items:
+            cache_key = self._cache_key(query_request)
+            cached = self.precomputed(query_request)
+            if cached is None and cache_key is not None:
+                cached = self.query_cache.get(cache_key)
+            if cached is not None:
+                yield index, cached
+            else:
+                pending.append((index, query_request, cache_key))
+        if not pending:
+            return
+
+        try:
+            query_vectors = self.retriever.embed_queries(
+                [query_request.query for _, query_request, _ in pending],
+                [query_request.collection_name for _, query_request, _ in pending]
+            )
+        except Exception as e:
+            for index, _, _ in pending:
+                record_error("query")
+                yield index, self._error_response(e)
+            return
+
+        by_collection: Dict[str, List[Tuple[int, QueryRequest, Optional[CacheKey], List[float]]]] = {}
+        for (index, query_request, cache_key), query_vector in zip(pending, query_vectors):
+            cached = self.query_cache.get_similar(cache_key, query_vector) if cache_key is not None else None
+            if cached is not None:
+                yield index, cached
+            else:
+                by_collection.setdefault(query_request.collection_name, []).append(
+                    (index, query_request, cache_key, query_vector)
+                )
+
+        generating = []
+        for collection_name, group in by_collection.items():
+            try:
+                contexts = self.retriever.retrieve_batch(
+                    queries=[query_request.query for _, query_request, _, _ in group],
+                    query_vectors=[query_vector for _, _, _, query_vector in group],
+                    collection_name=collection_name,
+                    ks=[self._fetch_k(query_request) for _, query_request, _, _ in group],
+                    search_types=[query_request.search_type or "similarity" for _, query_request, _, _ in group],
+                    filters=[query_request.filters for _, query_request, _, _ in group]
+                )
+            except Exception as e:
+                for index, _, _, _ in group:
+                    record_error("query")
+                    yield index, self._error_response(e)
+                continue
+
+            for (index, query_request, cache_key, query_vector), context_docs in zip(group, contexts):
+                try:
+                    if self._reranks(query_request):
+                        context_docs = self.reranker.rerank(
+                            query_request.query,
+                            context_docs,
+                            query_request.k,
+                            self.reranker.deadline(query_request.rerank_budget_ms)
+                        )
+                    packed = self.retriever.pack_context(context_docs)
+                except Exception as e:
+                    record_error("query")
+                    yield index, self._error_response(e)
+                    continue
+                prompt_tokens = packed.tokens_used + self.response_generator.count_tokens(query_request.query)
+                generating.append((prompt_tokens, index, query_request, cache_key, query_vector, packed))
+
+        generating.sort(key=lambda item: item[0])
+        batch_size = max(1, self.response_generator.batch_size)
+        for start in range(0, len(generating), batch_size):
+            group = generating[start:start + batch_size]
+            responses = self.response_generator.generate_batch(
+                queries=[query_request.query for _, _, query_request, _, _, _ in group],
+                contexts=[packed.text for _, _, _, _, _, packed in group]
+            )
+            for (_, index, _, cache_key, query_vector, packed), response in zip(group, responses):
+                query_response = QueryResponse(
+                    response=response,
+                    context=[doc.page_content for doc in packed.documents]
+                )
+                self._cache_response(cache_key, query_response, query_vector)
+                yield index, query_response
+
+    def astream_batch(
+        self,
+        query_requests: List[QueryRequest],
+        executor: InferenceExecutor
+    ) -> AsyncIterator[Tuple[int, QueryResponse]]:
+        """
+        Run 'process_batch' on the inference executor and stream its results. The whole batch
+        occupies one worker, so it cannot starve interactive queries of the others.
+
+        Args:
+            query_requests (List[QueryRequest]): Queries to answer
+            executor (InferenceExecutor): Executor for CPU-bound model calls
+
+        Returns:
+            AsyncIterator[Tuple[int, QueryResponse]]: Positions and responses, in completion order
+
+        Raises:
+            InferenceQueueFullError: If the executor cannot accept more work.
+        """
+        return self._stream_on(executor, lambda: self.process_batch(query_requests))
+
+    @staticmethod
+    def load_requests(
+        file_path: str,
+        defaults: BatchQueryRequest,
+        skip_invalid: bool = False
+    ) -> List[Tuple[Optional[str], QueryRequest]]:
+        """
+        Read queries from a JSONL file with one object per line. The text is taken from "query" or,
+        failing that, "title"; "id" or "request_id" identifies the line in the results. The other
+        QueryRequest fields may be set per line and otherwise come from 'defaults'.
+
+        Args:
+            file_path (str): JSONL file
+            defaults (BatchQueryRequest): Collection, search type, k and rerank of lines that do not set them
+            skip_invalid (bool): Skip the lines that are not JSON objects or have no query text or
+                collection, e.g. other entries of a log, instead of failing. Defaults to False.
+
+        Returns:
+            List[Tuple[Optional[str], QueryRequest]]: Id and query of every line
+
+        Raises:
+            ValueError: If a line has no query text or no collection, unless 'skip_invalid' is set.
+        """
+        query_requests = []
+        with open(file_path) as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record: Dict[str, Any] = json.loads(line)
+                except json.JSONDecodeError:
+                    if skip_invalid:
+                        continue
+                    raise
+                if not isinstance(record, dict):
+                    if skip_invalid:
+                        continue
+                    raise ValueError(f"Line {number} of {file_path} is not a JSON object")
+                text = record.get("query") or record.get("title")
+                collection_name = record.get("collection_name") or defaults.collection_name
+                if not text or not collection_name:
+                    if skip_invalid:
+                        continue
+                    raise ValueError(f"Line {number} of {file_path} has no query text or no collection name")
+                record_id = record.get("id", record.get("request_id"))
+                query_requests.append((
+                    None if record_id is None else str(record_id),
+                    QueryRequest(
+                        query=text,
+                        collection_name=collection_name,
+                        search_type=record.get("search_type", defaults.search_type),
+                        k=record.get("k", defaults.k),
+                        rerank=record.get("rerank", defaults.rerank),
+                        rerank_budget_ms=record.get("rerank_budget_ms"),
+                        filters=record.get("filters")
+                    )
+                ))
+        return query_requests
+
+    async def aretrieve(
+        self,
+        query_request: QueryRequest,
+        executor: InferenceExecutor,
+        async_client: Optional[AsyncQdrantClient] = None,
+        embedding_batcher: Optional[MicroBatcher] = None,
+        query_vector: Optional[List[float]] = None
+    ) -> Tuple[List[Document], str]:
+        """
+        Embed the query and retrieve its context without blocking the event loop. When the request
+        asks for reranking, the candidates are reranked on the inference executor.
+
+        Args:
+            query_request (QueryRequest): Query details
+            executor (InferenceExecutor): Executor for CPU-bound model calls
+            async_client (AsyncQdrantClient, optional): Client for the vector search
+            embedding_batcher (MicroBatcher, optional): Batcher for the query embedding
+            query_vector (List[float], optional): Precomputed query embedding
+
+        Returns:
+            Tuple[List[Document], str]: Documents packed into the context, and the context
+        """
+        if query_vector is None:
+            query_vector = await self._aembed_query(
+                query_request.query, query_request.collection_name, executor, embedding_batcher
             )
+
+        context_docs = await self.retriever.aretrieve_context(
+            query_vector=query_vector,
+            collection_name=query_request.collection_name,
+            k=self._fetch_k(query_request),
+            async_client=async_client,
+            search_type=query_request.search_type or "similarity",
+            query=query_request.query,
+            filters=query_request.filters
+        )
+        if self._reranks(query_request):
+            # The budget starts before queueing on the executor, so waiting for a worker counts against it
+            deadline = self.reranker.deadline(query_request.rerank_budget_ms)
+            with span("rerank", observe=False):
+                context_docs = await executor.run(
+                    self.reranker.rerank, query_request.query, context_docs, query_request.k, deadline
+                )
+
+        packed = self.retriever.pack_context(context_docs)
+        return packed.documents, packed.text
+
+    def astream_response(
+        self,
+        query: str,
+        context: str,
+        executor: InferenceExecutor
+    ) -> AsyncIterator[str]:
+        """
+        Start generating a response on the inference executor and stream its tokens.
+
+        Generation is scheduled before this method returns, so a full executor raises here and not
+        while the response is already being streamed.
+
+        Args:
+            query (str): User's query
+            context (str): Retrieved context
+            executor (InferenceExecutor): Executor for CPU-bound model calls
+
+        Returns:
+            AsyncIterator[str]: Tokens as the model produces them
+
+        Raises:
+            InferenceQueueFullError: If the executor cannot accept more work.
+        """
+        return self._stream_on(executor, lambda: self.response_generator.stream_response(query, context))
+
+    @staticmethod
+    def _stream_on(
+        executor: InferenceExecutor,
+        produce_items: Callable[[], Iterator[Any]]
+    ) -> AsyncIterator[Any]:
+        """
+        Iterate 'produce_items()' on the executor and hand its items to the event loop. The work is
+        scheduled before this method returns, and stops when the consumer stops iterating.
+        """
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for item in produce_items():
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, item)
+            finally:
+                loop.call_soon_threadsafe(items.put_nowait, done)
+
+        work = executor.submit(produce)
+
+        async def stream() -> AsyncIterator[Any]:
+            try:
+                while (item := await items.get()) is not done:
+                    yield item
+                await work
+            finally:
+                stopped.set()
+
+        return stream()
+
+    async def _aembed_query(
+        self,
+        query: str,
+        collection_name: str,
+        executor: InferenceExecutor,
+        embedding_batcher: Optional[MicroBatcher] = None
+    ) -> List[float]:
+        with span("embed_query", observe=False):
+            if embedding_batcher is not None:
+                # The batcher is shared by all collections, so it returns the model's vectors
+                query_vector = await embedding_batcher.submit(query)
+                return self.retriever.embedder.project([query_vector], collection_name)[0]
+            return await executor.run(self.retriever.embed_query, query, collection_name)
+
+    def _reranks(
+        self,
+        query_request: QueryRequest
+    ) -> bool:
+        return bool(query_request.rerank) and self.reranker is not None
+
+    def _fetch_k(
+        self,
+        query_request: QueryRequest
+    ) -> int:
+        if self._reranks(query_request):
+            return max(query_request.k, self.reranker.candidates)
+        return query_request.k
+
+    def _cache_key(
+        self,
+        query_request: QueryRequest
+    ) -> Optional[CacheKey]:
+        if self.query_cache is None:
+            return None
+        return self.query_key(query_request)
+
+    def query_key(
+        self,
+        query_request: QueryRequest
+    ) -> CacheKey:
+        """
+        Args:
+            query_request (QueryRequest): Query details
+
+        Returns:
+            CacheKey: Key of the request in the query cache and the answer store. It includes the
+                models and every option that changes the answer.
+        """
+        model_versions = (
+            self.retriever.embedder.variant,
+            self.response_generator.model_name,
+            query_request.search_type or "similarity"
+        )
+        if query_request.filters:
+            model_versions += (json.dumps(query_request.filters, sort_keys=True),)
+        if self._reranks(query_request):
+            model_versions += (f"rerank:{self.reranker.model_name}@{self.reranker.top_k}",)
+        return QueryCache.make_key(
+            collection_name=query_request.collection_name,
+            query=query_request.query,
+            k=query_request.k,
+            model_versions=model_versions
+        )
+
+    @staticmethod
+    def _error_response(
+        error: Exception
+    ) -> QueryResponse:
+        return QueryResponse(
+            response=f"Error processing query: {str(error)}",
+            context=[]
+        )
+
+    def _cache_response(
+        self,
+        cache_key: Optional[CacheKey],
+        query_response: QueryResponse,
+        query_vector: Optional[List[float]]
+    ):
+        if cache_key is not None and not query_response.response.startswith(ERROR_PREFIX):
+            self.query_cache.put(cache_key, query_response, query_vector)
@@ -0,0 +1,130 @@
+import os
+import time
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+from scripts.backend.runtime.tracing import count, span
+
+load_dotenv()
+
+DEFAULT_RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+class Reranker:
+    """
+    Reorders retrieved chunks with a cross-encoder that reads the query and the chunk together.
+
+    The cross-encoder scores a larger candidate set than the bi-encoder search returns, so chunks
+    ranked just below the dense cut can still reach the context. Candidates are scored in batches
+    in dense order and scoring stops early when the latency budget runs out: scored candidates are
+    ordered by score and unscored ones keep their dense order after them, so an exhausted budget
+    degrades to plain dense retrieval.
+
+    Attributes:
+        model_name (str): Name of the cross-encoder.
+        device (str): Device the model is loaded on.
+        candidates (int): Number of chunks retrieved for reranking.
+        top_k (int): Maximum number of chunks kept after reranking.
+        batch_size (int): Query-chunk pairs scored per forward pass.
+        budget_ms (float): Default time allowed for reranking a query, in milliseconds.
+        model (CrossEncoder): Loaded cross-encoder.
+    """
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        device: Optional[str] = None,
+        candidates: int = int(os.getenv("RERANK_CANDIDATES", 50)),
+        top_k: int = int(os.getenv("RERANK_TOP_K", 3)),
+        batch_size: int = int(os.getenv("RERANK_BATCH_SIZE", 16)),
+        budget_ms: float = float(os.getenv("RERANK_BUDGET_MS", 250)),
+        max_length: int = int(os.getenv("RERANK_MAX_LENGTH", 256))
+    ):
+        """
+        Initialize the Reranker.
+
+        Args:
+            model_name (str): Name of the Hugging Face cross-encoder. Defaults to the RERANK_MODEL
+                environment variable or "cross-encoder/ms-marco-MiniLM-L-6-v2".
+            device (str, optional): "cuda" or "cpu". Defaults to CPU.
+            candidates (int): Number of chunks retrieved for reranking. Defaults to RERANK_CANDIDATES or 50.
+            top_k (int): Maximum number of chunks kept, so generation reads fewer, better chunks.
+                Defaults to RERANK_TOP_K or 3.
+            batch_size (int): Query-chunk pairs scored per forward pass. Smaller batches let the budget
+                cut scoring shorter. Defaults to RERANK_BATCH_SIZE or 16.
+            budget_ms (float): Default time allowed for reranking a query. Defaults to RERANK_BUDGET_MS or 250.
+            max_length (int): Tokens of the query-chunk pair read by the model. Defaults to RERANK_MAX_LENGTH or 256.
+        """
+        self.model_name = model_name
+        self.device = device or "cpu"
+        self.candidates = candidates
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        try:
+            from sentence_transformers import CrossEncoder
+
+            self.model = CrossEncoder(model_name, device=self.device, max_length=max_length)
+        except Exception as e:
+            raise RuntimeError(f"Error loading reranker: {e}")
+
+    def deadline(
+        self,
+        budget_ms: Optional[float] = None
+    ) -> float:
+        """
+        Args:
+            budget_ms (float, optional): Time allowed from now. Defaults to 'budget_ms'.
+
+        Returns:
+            float: The 'time.perf_counter()' value at which reranking must stop.
+        """
+        return time.perf_counter() + (self.budget_ms if budget_ms is None else budget_ms) / 1000
+
+    def rerank(
+        self,
+        query: str,
+        documents: List[Document],
+        k: int,
+        deadline: Optional[float] = None
+    ) -> List[Document]:
+        """
+        Keep the 'k' best documents according to the cross-encoder.
+
+        A batch is only started when the previous batch would still fit before the deadline.
+
+        Args:
+            query (str): User's query
+            documents (List[Document]): Retrieved documents, best first
+            k (int): Number of documents to keep, at most 'top_k'
+            deadline (float, optional): 'time.perf_counter()' value at which scoring stops, e.g. from
+                'deadline' when the request started. Defaults to 'budget_ms' from now.
+
+        Returns:
+            List[Document]: The kept documents, best first
+        """
+        k = min(k, self.top_k)
+        if deadline is None:
+            deadline = self.deadline()
+
+        with span("rerank"):
+            scores: List[float] = []
+            batch_seconds = 0.0
+            for start in range(0, len(documents), self.batch_size):
+                now = time.perf_counter()
+                if now + batch_seconds > deadline:
+                    break
+                batch = documents[start:start + self.batch_size]
+                scores.extend(float(score) for score in self.model.predict(
+                    [(query, document.page_content) for document in batch],
+                    batch_size=len(batch),
+                    show_progress_bar=False
+                ))
+                batch_seconds = time.perf_counter() - now
+
+        count("reranked_chunks", len(scores))
+        if len(scores) < len(documents):
+            count("rerank_budget_exceeded")
+
+        order = sorted(range(len(scores)), key=lambda i: -scores[i]) + list(range(len(scores), len(documents)))
+        return [documents[i] for i in order[:k]]
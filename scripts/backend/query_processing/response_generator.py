@@ -1,34 +1,73 @@
-from langchain_huggingface import HuggingFacePipeline
+import os
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models import BaseLLM
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from scripts.backend.runtime.tracing import count, record_error, span
+
+ERROR_PREFIX = "Error generating response"
+
+PROMPT_TEMPLATE = (
+    "Context:\n{context}\n\n"
+    "Based on the context, answer the following query:\n"
+    "Query: {query}\n\n"
+    "Answer:"
+)
+
 class ResponseGenerator:
     def __init__(
         self, 
         model_name: str = "google/flan-t5-small",
-        temperature: float = 0.3
+        temperature: float = 0.3,
+        device: Optional[str] = None,
+        batch_size: int = int(os.getenv("GENERATION_BATCH_SIZE", 8))
     ):
         """
         Initialize the response generator with a Hugging Face model: A lightweight T5-based model fine-tuned for instruction following.
+        The prompt and the LCEL chain are compiled once here and reused by every call.
 
         Args:
             model_name (str): Name of the Hugging Face model
             temperature (float): Sampling temperature for text generation
+            device (str, optional): "cuda" or "cpu". Defaults to CPU.
+            batch_size (int): Number of prompts the pipeline generates in one forward pass.
+                Defaults to the GENERATION_BATCH_SIZE environment variable or 8.
         """
+        self.model_name = model_name
+        self.device = device or "cpu"
+        self.temperature = temperature
+        self.batch_size = batch_size
         try:
-            self.llm = HuggingFacePipeline.from_model_id(
-                model_id=model_name,
-                task="text2text-generation",
-                model_kwargs={
-                    "temperature": temperature,
-                    "max_length": 500
-                }
-            )
+            self.llm = self._load_llm()
             self.output_parser = StrOutputParser()
+            self.prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+            self.chain = self.prompt | self.llm | self.output_parser
         except Exception as e:
             print(f"Error initializing model: {e}")
             raise
 
+    def _load_llm(self) -> BaseLLM:
+        """
+        Loads the text2text-generation pipeline based on the model name.
+
+        Returns:
+            BaseLLM: Loaded Hugging Face pipeline.
+        """
+        from langchain_huggingface import HuggingFacePipeline
+
+        return HuggingFacePipeline.from_model_id(
+            model_id=self.model_name,
+            task="text2text-generation",
+            device=0 if self.device == "cuda" else -1,
+            batch_size=self.batch_size,
+            model_kwargs={
+                "temperature": self.temperature,
+                "max_length": 500
+            }
+        )
+
     def generate_response(
         self, 
         query: str, 
@@ -45,23 +84,114 @@ class ResponseGenerator:
             str: Generated response
         """
         try:
-            prompt_template = (
-                "Context:\n{context}\n\n"
-                "Based on the context, answer the following query:\n"
-                "Query: {query}\n\n"
-                "Answer:"
-            )
-
-            prompt = ChatPromptTemplate.from_template(prompt_template)
-
-            chain = prompt | self.llm | self.output_parser
-            
-            response = chain.invoke({
-                "context": context,
-                "query": query
-            })
+            with span("generate"):
+                response = self.chain.invoke({
+                    "context": context,
+                    "query": query
+                })
+            self._count_tokens([query], [context], [response])
             
             return response
         
         except Exception as e:
-            return f"Error generating response: {e}"
\ No newline at end of file
+            record_error("generation")
+            return f"{ERROR_PREFIX}: {e}"
+
+    def generate_batch(
+        self,
+        queries: List[str],
+        contexts: List[str]
+    ) -> List[str]:
+        """
+        Generate responses for several queries with a single 'generate' call on the pipeline,
+        which runs the prompts through the model in batches of 'batch_size'.
+
+        Args:
+            queries (List[str]): User queries
+            contexts (List[str]): Retrieved context for each query, in the same order
+
+        Returns:
+            List[str]: Generated responses, in the same order. A failed prompt yields an error message.
+        """
+        if len(queries) != len(contexts):
+            raise ValueError("queries and contexts must have the same length")
+
+        with span("generate_batch"):
+            responses = self.chain.batch(
+                [{"context": context, "query": query} for query, context in zip(queries, contexts)],
+                return_exceptions=True
+            )
+        for response in responses:
+            if isinstance(response, Exception):
+                record_error("generation")
+        self._count_tokens(
+            queries, contexts, [response for response in responses if not isinstance(response, Exception)]
+        )
+        return [
+            f"{ERROR_PREFIX}: {response}" if isinstance(response, Exception) else response
+            for response in responses
+        ]
+
+    def stream_response(
+        self,
+        query: str,
+        context: str
+    ) -> Iterator[str]:
+        """
+        Generate a response token by token.
+
+        Args:
+            query (str): User's query
+            context (str): Retrieved context from documents
+
+        Yields:
+            str: Pieces of the response as soon as the model produces them
+        """
+        tokens = 0
+        for token in self.chain.stream({
+            "context": context,
+            "query": query
+        }):
+            if token:
+                tokens += 1
+                yield token
+        self._count_tokens([query], [context], [])
+        count("generation_output_tokens", tokens)
+
+    @property
+    def tokenizer(self) -> Optional[Any]:
+        """
+        Returns:
+            Any, optional: The Hugging Face tokenizer of the model, or None when the LLM has none.
+        """
+        return getattr(getattr(self.llm, "pipeline", None), "tokenizer", None)
+
+    def count_tokens(
+        self,
+        text: str
+    ) -> int:
+        """
+        Count the tokens of a text with the model's tokenizer, or its words when the LLM has none.
+
+        Args:
+            text (str): Text to measure
+
+        Returns:
+            int: Number of tokens
+        """
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            return len(text.split())
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def _count_tokens(
+        self,
+        queries: List[str],
+        contexts: List[str],
+        responses: List[str]
+    ):
+        count("generation_input_tokens", sum(
+            self.count_tokens(query) + self.count_tokens(context) for query, context in zip(queries, contexts)
+        ))
+        if responses:
+            count("generation_output_tokens", sum(self.count_tokens(response) for response in responses))
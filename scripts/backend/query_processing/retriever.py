@@ -1,16 +1,47 @@
-from typing import List
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+from dotenv import load_dotenv
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.documents import Document
+from qdrant_client import AsyncQdrantClient, models
+from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue, Record, ScoredPoint
 from scripts.backend.document_processing.document_embedder import Embedder
+from scripts.backend.document_processing.sparse_index import get_sparse_index
+from scripts.backend.document_processing.vector_compression import SEARCH_PARAMS
+from scripts.backend.query_processing.context_packer import ContextPacker, PackedContext
+from scripts.backend.runtime.tracing import count, span
+
+load_dotenv()
+
+SEARCH_TYPES = ("similarity", "hybrid", "mmr")
+FETCH_FACTOR = int(os.getenv("RETRIEVAL_FETCH_FACTOR", 4))
+RRF_K = int(os.getenv("RRF_K", 60))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.5))
 
 class Retriever:
     """
     A class responsible for retrieving relevant documents from a vector store.
+
+    Three search types are supported:
+        "similarity": the k nearest chunks by embedding.
+        "hybrid": the nearest chunks by embedding and the best BM25 keyword matches, each fetched
+            with RETRIEVAL_FETCH_FACTOR * k candidates and fused with reciprocal rank fusion.
+        "mmr": maximal marginal relevance over RETRIEVAL_FETCH_FACTOR * k nearest chunks, trading
+            relevance for diversity with MMR_LAMBDA, so near-duplicate chunks do not fill the context.
+
+    Metadata filters are pushed down into Qdrant's filtered search, which uses the payload indexes
+    created with the collection. BM25 results are checked against the filters before fusion.
+
+    Queries are embedded with the projection of the collection they search, and every search asks
+    Qdrant to rescore quantized candidates with the original vectors (see vector_compression).
     """
     def __init__(
         self, 
         embedder: Embedder, 
-        vector_store: QdrantVectorStore
+        vector_store: QdrantVectorStore,
+        context_packer: Optional[ContextPacker] = None
     ):
         """
         Initialize the Retriever.
@@ -18,39 +49,535 @@ class Retriever:
         Args:
             embedder (Embedder): Embedding model used for query embedding
             vector_store (QdrantVectorStore): Vector store to search in
+            context_packer (ContextPacker, optional): Packs the retrieved documents into a token budget.
+                Defaults to a packer counting words, without a budget.
         """
         self.embedder = embedder
         self.vector_store = vector_store
+        self.context_packer = context_packer or ContextPacker(token_budget=0)
 
     def retrieve_context(
         self, 
         query: str, 
         collection_name: str, 
-        k: int = 5
+        k: int = 5,
+        query_vector: Optional[List[float]] = None,
+        search_type: str = "similarity",
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[Document]:
         """
-        Retrieve the most relevant documents for a given query applying similarity search.
+        Retrieve the most relevant documents for a given query.
         
         Args:
             query (str): User's query
             collection_name (str): Name of the collection to search
             k (int, optional): Number of top similar documents to retrieve. Defaults to 5.
+            query_vector (List[float], optional): Precomputed query embedding, avoids embedding the query again.
+                It must be projected like the collection's vectors, see 'embed_query'.
+            search_type (str, optional): "similarity", "hybrid" or "mmr". Defaults to "similarity".
+            filters (Dict[str, Any], optional): Metadata field -> value, or list of accepted values.
         
         Returns:
             List[Document]: Most relevant documents
         """
         try:
+            self._check_search_type(search_type)
+            query_filter = self.metadata_filter(filters)
+            if query_vector is None:
+                query_vector = self.embed_query(query, collection_name)
+            with span("retrieve"):
+                if search_type == "mmr":
+                    return self.vector_store.max_marginal_relevance_search_by_vector(
+                        embedding=query_vector,
+                        k=k,
+                        fetch_k=k * FETCH_FACTOR,
+                        lambda_mult=MMR_LAMBDA,
+                        filter=query_filter,
+                        search_params=SEARCH_PARAMS
+                    )
+                if search_type == "hybrid":
+                    dense = self.vector_store.similarity_search_by_vector(
+                        embedding=query_vector,
+                        k=k * FETCH_FACTOR,
+                        filter=query_filter,
+                        search_params=SEARCH_PARAMS
+                    )
+                    return self._hybrid(query, dense, collection_name, k, filters)
+
+                return self.vector_store.similarity_search_by_vector(
+                    embedding=query_vector,
+                    k=k,
+                    filter=query_filter,
+                    search_params=SEARCH_PARAMS
+                )
+
+        except Exception as e:
+            raise RuntimeError(f"Error retrieving context: {e}")
+
+    def embed_query(
+        self,
+        query: str,
+        collection_name: Optional[str] = None
+    ) -> List[float]:
+        """
+        Embed a query with the retriever's embedding model.
+
+        Args:
+            query (str): User's query
+            collection_name (str, optional): Collection to search, whose projection is applied
+
+        Returns:
+            List[float]: Query embedding
+        """
+        with span("embed_query"):
+            return self.embedder.embed_query(query, collection_name)
+
+    def embed_queries(
+        self,
+        queries: List[str],
+        collection_names: Optional[List[str]] = None
+    ) -> List[List[float]]:
+        """
+        Embed several queries in one pass through the embedding model.
 
-            context_docs = self.vector_store.similarity_search(
-                query=query, 
-                k=k
+        Args:
+            queries (List[str]): User queries
+            collection_names (List[str], optional): Collection each query searches, whose projection is applied
+
+        Returns:
+            List[List[float]]: Query embeddings, in the same order
+        """
+        with span("embed_query"):
+            query_vectors = self.embedder.embedding.embed_documents(queries)
+            if collection_names is None:
+                return query_vectors
+            return [
+                self.embedder.project([query_vector], collection_name)[0]
+                for query_vector, collection_name in zip(query_vectors, collection_names)
+            ]
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        query_vectors: List[List[float]],
+        collection_name: str,
+        ks: List[int],
+        search_types: List[str],
+        filters: List[Optional[Dict[str, Any]]]
+    ) -> List[List[Document]]:
+        """
+        Retrieve the context of several embedded queries of one collection with a single
+        'query_batch_points' call. The dense candidates of "hybrid" and "mmr" queries come from the
+        same call; their keyword search and diversity selection then run per query.
+
+        Args:
+            queries (List[str]): User queries
+            query_vectors (List[List[float]]): Query embeddings
+            collection_name (str): Name of the collection to search
+            ks (List[int]): Number of documents to retrieve for each query
+            search_types (List[str]): "similarity", "hybrid" or "mmr" for each query
+            filters (List[Dict[str, Any]]): Metadata filters of each query, or None
+
+        Returns:
+            List[List[Document]]: Most relevant documents of each query, in the same order
+        """
+        try:
+            for search_type in search_types:
+                self._check_search_type(search_type)
+            requests = [
+                models.QueryRequest(
+                    query=query_vector,
+                    filter=self.metadata_filter(query_filters),
+                    limit=k if search_type == "similarity" else k * FETCH_FACTOR,
+                    params=SEARCH_PARAMS,
+                    with_payload=True,
+                    with_vector=search_type == "mmr"
+                )
+                for query_vector, k, search_type, query_filters in zip(query_vectors, ks, search_types, filters)
+            ]
+            with span("retrieve"):
+                responses = self.vector_store.client.query_batch_points(
+                    collection_name=collection_name, requests=requests
+                )
+
+                results = []
+                for query, query_vector, k, search_type, query_filters, response in zip(
+                    queries, query_vectors, ks, search_types, filters, responses
+                ):
+                    points = response.points
+                    if search_type == "mmr" and points:
+                        points = [points[i] for i in self.mmr_select(
+                            np.asarray(query_vector, dtype=np.float32),
+                            np.asarray([point.vector for point in points], dtype=np.float32),
+                            k,
+                            MMR_LAMBDA
+                        )]
+                    documents = [self._to_document(point, collection_name) for point in points]
+                    if search_type == "hybrid":
+                        documents = self._hybrid(query, documents, collection_name, k, query_filters)
+                    results.append(documents)
+            return results
+
+        except Exception as e:
+            raise RuntimeError(f"Error retrieving context: {e}")
+
+    def _hybrid(
+        self,
+        query: str,
+        dense: List[Document],
+        collection_name: str,
+        k: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """
+        Fuse the dense candidates of a query with its BM25 matches.
+
+        Args:
+            query (str): User's query
+            dense (List[Document]): Dense candidates, best first, already filtered
+            collection_name (str): Name of the collection searched
+            k (int): Number of documents to return
+            filters (Dict[str, Any], optional): Metadata filters the BM25 matches must pass
+
+        Returns:
+            List[Document]: The 'k' best fused documents
+        """
+        sparse = get_sparse_index(collection_name).search(query, k * FETCH_FACTOR)
+        known = {}
+        if filters:
+            unknown = self._unknown_ids(dense, sparse)
+            records = self.vector_store.client.retrieve(
+                collection_name=collection_name, ids=unknown, with_payload=True
+            ) if unknown else []
+            sparse, known = self._filter_sparse(dense, sparse, records, filters, collection_name)
+        ranked_ids, documents = self._fuse(dense, sparse, k)
+        documents.update(known)
+        missing = [point_id for point_id in ranked_ids if point_id not in documents]
+        if missing:
+            records = self.vector_store.client.retrieve(
+                collection_name=collection_name, ids=missing, with_payload=True
             )
-            
-            return context_docs
+            documents.update(self._by_id(records, collection_name))
+        return [documents[point_id] for point_id in ranked_ids if point_id in documents]
+
+    async def aretrieve_context(
+        self,
+        query_vector: List[float],
+        collection_name: str,
+        k: int = 5,
+        async_client: Optional[AsyncQdrantClient] = None,
+        search_type: str = "similarity",
+        query: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """
+        Retrieve the most relevant documents for an already embedded query without blocking the event loop.
+
+        Args:
+            query_vector (List[float]): Query embedding
+            collection_name (str): Name of the collection to search
+            k (int, optional): Number of top similar documents to retrieve. Defaults to 5.
+            async_client (AsyncQdrantClient, optional): Client used for the search. When not given,
+                the sync vector store is searched in a worker thread.
+            search_type (str, optional): "similarity", "hybrid" or "mmr". Defaults to "similarity".
+            query (str, optional): User's query, needed by the keyword side of "hybrid".
+            filters (Dict[str, Any], optional): Metadata field -> value, or list of accepted values.
+
+        Returns:
+            List[Document]: Most relevant documents
+        """
+        try:
+            self._check_search_type(search_type)
+            if search_type == "hybrid":
+                with span("retrieve"):
+                    return await self._ahybrid(
+                        query or "", query_vector, collection_name, k, async_client, filters
+                    )
+            if search_type == "mmr":
+                with span("retrieve"):
+                    return await self._ammr(query_vector, collection_name, k, async_client, filters)
+
+            query_filter = self.metadata_filter(filters)
+            with span("retrieve"):
+                if async_client is None:
+                    return await asyncio.to_thread(
+                        self.vector_store.similarity_search_by_vector,
+                        embedding=query_vector,
+                        k=k,
+                        filter=query_filter,
+                        search_params=SEARCH_PARAMS
+                    )
+
+                response = await async_client.query_points(
+                    collection_name=collection_name,
+                    query=query_vector,
+                    query_filter=query_filter,
+                    search_params=SEARCH_PARAMS,
+                    limit=k,
+                    with_payload=True
+                )
+            return [self._to_document(point, collection_name) for point in response.points]
 
         except Exception as e:
             raise RuntimeError(f"Error retrieving context: {e}")
 
+    async def _ahybrid(
+        self,
+        query: str,
+        query_vector: List[float],
+        collection_name: str,
+        k: int,
+        async_client: Optional[AsyncQdrantClient],
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        fetch_k = k * FETCH_FACTOR
+        query_filter = self.metadata_filter(filters)
+        sparse_search = asyncio.to_thread(get_sparse_index(collection_name).search, query, fetch_k)
+        if async_client is None:
+            dense, sparse = await asyncio.gather(
+                asyncio.to_thread(
+                    self.vector_store.similarity_search_by_vector,
+                    embedding=query_vector, k=fetch_k, filter=query_filter, search_params=SEARCH_PARAMS
+                ),
+                sparse_search
+            )
+        else:
+            response, sparse = await asyncio.gather(
+                async_client.query_points(
+                    collection_name=collection_name, query=query_vector, query_filter=query_filter,
+                    search_params=SEARCH_PARAMS, limit=fetch_k, with_payload=True
+                ),
+                sparse_search
+            )
+            dense = [self._to_document(point, collection_name) for point in response.points]
+
+        known = {}
+        if filters:
+            unknown = self._unknown_ids(dense, sparse)
+            records = await self._aretrieve_records(unknown, collection_name, async_client)
+            sparse, known = self._filter_sparse(dense, sparse, records, filters, collection_name)
+
+        ranked_ids, documents = self._fuse(dense, sparse, k)
+        documents.update(known)
+        missing = [point_id for point_id in ranked_ids if point_id not in documents]
+        if missing:
+            records = await self._aretrieve_records(missing, collection_name, async_client)
+            documents.update(self._by_id(records, collection_name))
+        return [documents[point_id] for point_id in ranked_ids if point_id in documents]
+
+    async def _aretrieve_records(
+        self,
+        ids: List[str],
+        collection_name: str,
+        async_client: Optional[AsyncQdrantClient]
+    ) -> List[Record]:
+        if not ids:
+            return []
+        if async_client is None:
+            return await asyncio.to_thread(
+                self.vector_store.client.retrieve,
+                collection_name=collection_name, ids=ids, with_payload=True
+            )
+        return await async_client.retrieve(collection_name=collection_name, ids=ids, with_payload=True)
+
+    async def _ammr(
+        self,
+        query_vector: List[float],
+        collection_name: str,
+        k: int,
+        async_client: Optional[AsyncQdrantClient],
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        query_filter = self.metadata_filter(filters)
+        if async_client is None:
+            return await asyncio.to_thread(
+                self.vector_store.max_marginal_relevance_search_by_vector,
+                embedding=query_vector, k=k, fetch_k=k * FETCH_FACTOR, lambda_mult=MMR_LAMBDA,
+                filter=query_filter, search_params=SEARCH_PARAMS
+            )
+
+        response = await async_client.query_points(
+            collection_name=collection_name,
+            query=query_vector,
+            query_filter=query_filter,
+            search_params=SEARCH_PARAMS,
+            limit=k * FETCH_FACTOR,
+            with_payload=True,
+            with_vectors=True
+        )
+        points = response.points
+        if not points:
+            return []
+        selected = self.mmr_select(
+            np.asarray(query_vector, dtype=np.float32),
+            np.asarray([point.vector for point in points], dtype=np.float32),
+            k,
+            MMR_LAMBDA
+        )
+        return [self._to_document(points[i], collection_name) for i in selected]
+
+    @staticmethod
+    def mmr_select(
+        query_vector: np.ndarray,
+        candidates: np.ndarray,
+        k: int,
+        lambda_mult: float = MMR_LAMBDA
+    ) -> List[int]:
+        """
+        Pick 'k' candidates by maximal marginal relevance: each step takes the candidate maximizing
+        lambda * similarity to the query - (1 - lambda) * highest similarity to the already picked ones.
+
+        Args:
+            query_vector (np.ndarray): Query embedding
+            candidates (np.ndarray): Candidate embeddings, one row per candidate
+            k (int): Number of candidates to pick
+            lambda_mult (float): 1 ranks by relevance only, 0 by diversity only
+
+        Returns:
+            List[int]: Indices of the picked candidates, in picking order
+        """
+        candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+        query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+        relevance = candidates @ query_vector
+        redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+        selected: List[int] = []
+        for _ in range(min(k, len(candidates))):
+            scores = lambda_mult * relevance - (1 - lambda_mult) * np.where(
+                np.isinf(redundancy), 0.0, redundancy
+            )
+            scores[selected] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            redundancy = np.maximum(redundancy, candidates @ candidates[best])
+        return selected
+
+    @staticmethod
+    def _fuse(
+        dense: List[Document],
+        sparse: List[Tuple[str, float]],
+        k: int
+    ) -> Tuple[List[str], Dict[str, Document]]:
+        """
+        Fuse dense and keyword rankings with reciprocal rank fusion: a chunk scores
+        1 / (RRF_K + rank) in every ranking it appears in.
+
+        Args:
+            dense (List[Document]): Dense results, best first
+            sparse (List[Tuple[str, float]]): BM25 (point id, score) pairs, best first
+            k (int): Number of results
+
+        Returns:
+            Tuple[List[str], Dict[str, Document]]: The 'k' best point ids and the documents already
+                known from the dense results
+        """
+        scores: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        for rank, document in enumerate(dense):
+            point_id = str(document.metadata.get("_id"))
+            documents[point_id] = document
+            scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        for rank, (point_id, _) in enumerate(sparse):
+            scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        ranked_ids = sorted(scores, key=scores.get, reverse=True)[:k]
+        return ranked_ids, documents
+
+    @staticmethod
+    def metadata_filter(
+        filters: Optional[Dict[str, Any]]
+    ) -> Optional[Filter]:
+        """
+        Build the Qdrant filter matching every given metadata field.
+
+        Args:
+            filters (Dict[str, Any], optional): Metadata field -> value, or list of accepted values
+
+        Returns:
+            Filter, optional: The filter, or None when there is nothing to filter on
+        """
+        if not filters:
+            return None
+        return Filter(must=[
+            FieldCondition(
+                key=f"{QdrantVectorStore.METADATA_KEY}.{field}",
+                match=MatchAny(any=value) if isinstance(value, list) else MatchValue(value=value)
+            )
+            for field, value in filters.items()
+        ])
+
+    @staticmethod
+    def _unknown_ids(
+        dense: List[Document],
+        sparse: List[Tuple[str, float]]
+    ) -> List[str]:
+        known = {str(document.metadata.get("_id")) for document in dense}
+        return [point_id for point_id, _ in sparse if point_id not in known]
+
+    @classmethod
+    def _filter_sparse(
+        cls,
+        dense: List[Document],
+        sparse: List[Tuple[str, float]],
+        records: List[Record],
+        filters: Dict[str, Any],
+        collection_name: str
+    ) -> Tuple[List[Tuple[str, float]], Dict[str, Document]]:
+        """
+        Keep the BM25 results that pass the metadata filters. Dense results already do, the others
+        are checked on their fetched 'records'.
+
+        Returns:
+            Tuple[List[Tuple[str, float]], Dict[str, Document]]: The kept BM25 results, and the
+                documents of those that were not among the dense results
+        """
+        passing = {
+            point_id: document for point_id, document in cls._by_id(records, collection_name).items()
+            if all(
+                document.metadata.get(field) in (value if isinstance(value, list) else [value])
+                for field, value in filters.items()
+            )
+        }
+        dense_ids = {str(document.metadata.get("_id")) for document in dense}
+        return [hit for hit in sparse if hit[0] in dense_ids or hit[0] in passing], passing
+
+    @classmethod
+    def _by_id(
+        cls,
+        records: List[Record],
+        collection_name: str
+    ) -> Dict[str, Document]:
+        return {str(record.id): cls._to_document(record, collection_name) for record in records}
+
+    @staticmethod
+    def _check_search_type(
+        search_type: str
+    ):
+        if search_type not in SEARCH_TYPES:
+            raise ValueError(f"Unknown search type {search_type!r}, expected one of {SEARCH_TYPES}")
+
+    @staticmethod
+    def _to_document(
+        point: Union[ScoredPoint, Record],
+        collection_name: str
+    ) -> Document:
+        """
+        Convert a Qdrant point into a Document the same way QdrantVectorStore does.
+
+        Args:
+            point (Union[ScoredPoint, Record]): Point returned by Qdrant
+            collection_name (str): Name of the collection the point belongs to
+
+        Returns:
+            Document: Document with the point's content and metadata
+        """
+        payload = point.payload or {}
+        metadata = dict(payload.get(QdrantVectorStore.METADATA_KEY) or {})
+        metadata["_id"] = point.id
+        metadata["_collection_name"] = collection_name
+        return Document(
+            page_content=payload.get(QdrantVectorStore.CONTENT_KEY, ""),
+            metadata=metadata
+        )
+
     def format_context(
         self, 
         context_docs: List[Document]
@@ -64,12 +591,27 @@ class Retriever:
         Returns:
             str: Formatted context string
         """
-        content_list = []
+        return self.pack_context(context_docs).text
 
-        for doc in context_docs:
-            content = doc.page_content
-            content_list.append(content)
+    def pack_context(
+        self,
+        context_docs: List[Document]
+    ) -> PackedContext:
+        """
+        Pack retrieved documents into the context with the retriever's ContextPacker, removing
+        duplicated overlaps and stopping at its token budget.
 
-        context = "\n\n".join(content_list)
+        Args:
+            context_docs (List[Document]): List of retrieved documents, best first
+
+        Returns:
+            PackedContext: The context, the documents it uses and the tokens used and dropped
+        """
+        with span("format_context"):
+            packed = self.context_packer.pack(context_docs)
 
-        return context
+        count("retrieved_chunks", len(context_docs))
+        count("context_characters", len(packed.text))
+        count("context_tokens", packed.tokens_used)
+        count("context_tokens_dropped", packed.tokens_dropped)
+        return packed
@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from scripts.backend.models.rag import QueryRequest, QueryResponse
+from scripts.backend.query_processing.context_packer import PackedContext
+from scripts.backend.query_processing.query_processor import QueryProcessor
+from scripts.backend.runtime.metrics import metrics
+
+"""
+This script defines the speculative retrieval of the Streamlit app. While the user is still typing,
+the partial query is embedded and its context retrieved in a background thread, once the input has
+not changed for PREFETCH_DEBOUNCE_SECONDS. When the query is submitted, the prefetched context is
+reused if the final query is the same, or if its embedding is close enough to the prefetched one, so
+only the generation is left to wait for.
+"""
+
+load_dotenv()
+
+PREFETCH_DEBOUNCE_SECONDS = float(os.getenv("PREFETCH_DEBOUNCE_SECONDS", 0.3))
+PREFETCH_MIN_CHARACTERS = int(os.getenv("PREFETCH_MIN_CHARACTERS", 8))
+PREFETCH_SIMILARITY = float(os.getenv("PREFETCH_SIMILARITY", 0.97))
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", 60))
+
+
+class Prefetch(NamedTuple):
+    """
+    A query embedded and retrieved ahead of its submission.
+
+    Attributes:
+        query_request (QueryRequest): The request that was prefetched.
+        query_vector (List[float]): Its query embedding.
+        packed (PackedContext, optional): Its retrieved context, None when only the embedding is known.
+        fetched_at (float): time.monotonic() when the retrieval finished.
+    """
+    query_request: QueryRequest
+    query_vector: List[float]
+    packed: Optional[PackedContext]
+    fetched_at: float
+
+
+class SpeculativeRetriever:
+    """
+    Prefetches the context of the latest partial query of one user.
+
+    Only the latest input is prefetched: inputs replaced within the debounce delay are never retrieved,
+    and a single worker thread runs while there is something to prefetch, so an idle session holds
+    no thread.
+    """
+
+    def __init__(
+        self,
+        processor: QueryProcessor,
+        debounce_seconds: float = PREFETCH_DEBOUNCE_SECONDS,
+        min_characters: int = PREFETCH_MIN_CHARACTERS,
+        similarity_threshold: float = PREFETCH_SIMILARITY,
+        ttl_seconds: float = PREFETCH_TTL
+    ):
+        """
+        Initialize the SpeculativeRetriever.
+
+        Args:
+            processor (QueryProcessor): Processor of the collection the user queries.
+            debounce_seconds (float): Seconds the input must stay unchanged before it is prefetched.
+                Defaults to the PREFETCH_DEBOUNCE_SECONDS environment variable or 0.3.
+            min_characters (int): Shorter inputs are not prefetched.
+                Defaults to the PREFETCH_MIN_CHARACTERS environment variable or 8.
+            similarity_threshold (float): Minimum cosine similarity between the final and the prefetched
+                query embeddings to reuse the context of a different query. Values above 1 only reuse
+                it for the same query. Defaults to the PREFETCH_SIMILARITY environment variable or 0.97.
+            ttl_seconds (float): Seconds a prefetched context can be reused.
+                Defaults to the PREFETCH_TTL environment variable or 60.
+        """
+        self.processor = processor
+        self.debounce_seconds = debounce_seconds
+        self.min_characters = min_characters
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._requested: Optional[QueryRequest] = None
+        self._requested_at = 0.0
+        self._running: Optional[QueryRequest] = None
+        self._latest: Optional[Prefetch] = None
+
+        self.prefetches = metrics.counter("speculative_prefetches_total", "Partial queries retrieved ahead")
+        self.exact_hits = metrics.counter("speculative_exact_hits_total", "Submitted queries that were prefetched")
+        self.similar_hits = metrics.counter(
+            "speculative_similar_hits_total", "Submitted queries close enough to the prefetched one"
+        )
+        self.misses = metrics.counter("speculative_misses_total", "Submitted queries retrieved on submission")
+
+    def update(
+        self,
+        query_request: QueryRequest
+    ):
+        """
+        Report the current partial input. It is prefetched once it has not changed for the debounce delay.
+
+        Args:
+            query_request (QueryRequest): The request the input would submit.
+        """
+        if len(query_request.query.strip()) < self.min_characters:
+            return
+        key = self.processor.query_key(query_request)
+        with self._condition:
+            latest = self._latest.query_request if self._fresh(self._latest) else None
+            for current in (self._requested, self._running, latest):
+                if current is not None and self.processor.query_key(current) == key:
+                    return
+            self._requested = query_request
+            self._requested_at = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="speculative-retrieval", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def claim(
+        self,
+        query_request: QueryRequest
+    ) -> Optional[Prefetch]:
+        """
+        Take the prefetched context of a submitted query. A prefetch of the same query that is still
+        running is waited for; one that is still in its debounce delay is dropped.
+
+        Args:
+            query_request (QueryRequest): The submitted request.
+
+        Returns:
+            Prefetch, optional: The query embedding and the context to answer the request with, or None
+                when nothing was prefetched. The context is None when the prefetched one is not close
+                enough, but the query was already embedded to find out.
+        """
+        key = self.processor.query_key(query_request)
+        with self._condition:
+            if self._requested is not None and self.processor.query_key(self._requested) == key:
+                self._requested = None
+            if self._running is not None and self.processor.query_key(self._running) == key:
+                self._condition.wait_for(lambda: self._running is None)
+            latest = self._latest
+
+        if not self._fresh(latest):
+            self.misses.inc()
+            return None
+        latest_key = self.processor.query_key(latest.query_request)
+        if latest_key == key:
+            self.exact_hits.inc()
+            return latest
+        # Only the query text may differ: same collection, k, models and search options
+        if latest_key[0] != key[0] or latest_key[2:] != key[2:] or self.similarity_threshold > 1.0:
+            self.misses.inc()
+            return None
+
+        try:
+            query_vector = self.processor.retriever.embed_query(query_request.query, query_request.collection_name)
+        except Exception:
+            # process_query embeds it again and reports the error
+            self.misses.inc()
+            return None
+        if self._similarity(query_vector, latest.query_vector) < self.similarity_threshold:
+            self.misses.inc()
+            return Prefetch(query_request, query_vector, None, latest.fetched_at)
+        self.similar_hits.inc()
+        return Prefetch(query_request, query_vector, latest.packed, latest.fetched_at)
+
+    def process_query(
+        self,
+        query_request: QueryRequest
+    ) -> QueryResponse:
+        """
+        Answer a submitted query with its prefetched context when there is one.
+
+        Args:
+            query_request (QueryRequest): The submitted request.
+
+        Returns:
+            QueryResponse: Generated response based on retrieved context
+        """
+        prefetch = self.claim(query_request)
+        if prefetch is None:
+            return self.processor.process_query(query_request)
+        return self.processor.process_query(query_request, prefetch.query_vector, prefetch.packed)
+
+    def clear(self):
+        """
+        Drop the pending and the prefetched input, e.g. after the collection changed.
+        """
+        with self._condition:
+            self._requested = None
+            self._latest = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._requested is None:
+                    self._thread = None
+                    return
+                remaining = self._requested_at + self.debounce_seconds - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                query_request, self._requested = self._requested, None
+                self._running = query_request
+
+            prefetch = None
+            try:
+                query_vector = self.processor.retriever.embed_query(
+                    query_request.query, query_request.collection_name
+                )
+                packed = self.processor.retrieve(query_request, query_vector)
+                prefetch = Prefetch(query_request, query_vector, packed, time.monotonic())
+                self.prefetches.inc()
+            except Exception as e:
+                # The submitted query retrieves its context again and reports the error
+                print(f"Speculative retrieval of {query_request.query!r} failed: {e}")
+
+            with self._condition:
+                self._running = None
+                if prefetch is not None:
+                    self._latest = prefetch
+                self._condition.notify_all()
+
+    def _fresh(
+        self,
+        prefetch: Optional[Prefetch]
+    ) -> bool:
+        return prefetch is not None and time.monotonic() - prefetch.fetched_at <= self.ttl_seconds
+
+    @staticmethod
+    def _similarity(
+        a: List[float],
+        b: List[float]
+    ) -> float:
+        a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+        return float(a @ b / max(np.linalg.norm(a) * np.linalg.norm(b), 1e-12))
@@ -0,0 +1,187 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from dotenv import load_dotenv
+
+from scripts.backend.runtime.metrics import metrics
+
+"""
+This script defines a dedicated executor for CPU-bound model calls with a bounded wait queue, so async
+endpoints never block the event loop and shed load instead of queueing without limit.
+"""
+
+load_dotenv()
+
+
+class InferenceQueueFullError(RuntimeError):
+    """
+    Raised when an InferenceExecutor already has as many pending calls as it accepts.
+
+    Attributes:
+        retry_after (int): Seconds the client should wait before retrying.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        retry_after: int
+    ):
+        super().__init__(f"The {name} queue is full, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    A thread pool for model calls with a concurrency limit and a bounded wait queue.
+
+    At most 'max_concurrency' calls run at the same time and at most 'max_queue' more wait for a free
+    worker. Submitting beyond that raises InferenceQueueFullError immediately.
+    """
+
+    def __init__(
+        self,
+        name: str = "inference",
+        max_concurrency: int = 2,
+        max_queue: int = 16,
+        retry_after: int = 1
+    ):
+        """
+        Initialize the InferenceExecutor.
+
+        Args:
+            name (str): Name used in thread names and error messages. Defaults to "inference".
+            max_concurrency (int): Number of calls running at the same time. Defaults to 2.
+            max_queue (int): Number of calls allowed to wait for a worker. Defaults to 16.
+            retry_after (int): Seconds suggested to rejected clients. Defaults to 1.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._pending = 0
+        self.pending_gauge = metrics.gauge(f"{name}_executor_pending", f"Running and waiting {name} calls")
+        self.queue_depth_gauge = metrics.gauge(f"{name}_executor_queue_depth", f"{name} calls waiting for a worker")
+        self.rejected = metrics.counter(f"{name}_executor_rejected_total", f"{name} calls rejected with a full queue")
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix=name
+        )
+
+    @classmethod
+    def from_env(
+        cls,
+        name: str,
+        default_concurrency: int,
+        default_queue: int
+    ) -> "InferenceExecutor":
+        """
+        Build an executor configured by the <NAME>_CONCURRENCY, <NAME>_QUEUE_SIZE and
+        <NAME>_RETRY_AFTER environment variables.
+
+        Args:
+            name (str): Executor name, also used as environment variable prefix.
+            default_concurrency (int): Concurrency limit when the variable is not set.
+            default_queue (int): Queue size when the variable is not set.
+
+        Returns:
+            InferenceExecutor: The configured executor.
+        """
+        prefix = name.upper()
+        return cls(
+            name=name,
+            max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", default_concurrency)),
+            max_queue=int(os.getenv(f"{prefix}_QUEUE_SIZE", default_queue)),
+            retry_after=int(os.getenv(f"{prefix}_RETRY_AFTER", 1)),
+        )
+
+    @property
+    def pending(self) -> int:
+        """
+        Returns:
+            int: Number of running and waiting calls.
+        """
+        return self._pending
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Returns:
+            int: Number of calls waiting for a free worker.
+        """
+        return max(0, self._pending - self.max_concurrency)
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        **kwargs
+    ) -> asyncio.Future:
+        """
+        Schedule a call on the executor. Must be called from the event loop.
+
+        Args:
+            fn (Callable[..., Any]): Function to run.
+            *args: Positional arguments for 'fn'.
+            **kwargs: Keyword arguments for 'fn'.
+
+        Returns:
+            asyncio.Future: Future resolved with the result of the call.
+
+        Raises:
+            InferenceQueueFullError: If the executor already has its maximum number of pending calls.
+        """
+        if self._pending >= self.max_concurrency + self.max_queue:
+            self.rejected.inc()
+            raise InferenceQueueFullError(self.name, self.retry_after)
+
+        self._pending += 1
+        self._update_gauges()
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        **kwargs
+    ) -> Any:
+        """
+        Run a call on the executor and wait for its result.
+
+        Raises:
+            InferenceQueueFullError: If the executor already has its maximum number of pending calls.
+        """
+        return await self.submit(fn, *args, **kwargs)
+
+    def shutdown(
+        self,
+        wait: bool = True
+    ):
+        """
+        Stop the worker threads.
+
+        Args:
+            wait (bool): Wait for running calls to finish. Defaults to True.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _release(
+        self,
+        future: asyncio.Future
+    ):
+        self._pending -= 1
+        self._update_gauges()
+
+    def _update_gauges(self):
+        self.pending_gauge.set(self._pending)
+        self.queue_depth_gauge.set(self.queue_depth)
@@ -0,0 +1,117 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from scripts.backend.models.rag import IngestionStats, UploadFileRequest, UploadJobStatus
+
+"""
+This script defines an in-memory store that tracks background upload jobs so clients can poll their status.
+"""
+
+
+class JobStore:
+    """
+    A thread-safe, bounded store of upload jobs. The oldest finished jobs are dropped once
+    'max_jobs' is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = 1000
+    ):
+        """
+        Initialize the JobStore.
+
+        Args:
+            max_jobs (int): Maximum number of jobs remembered. Defaults to 1000.
+        """
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, UploadJobStatus]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(
+        self,
+        upload_file_request: UploadFileRequest
+    ) -> UploadJobStatus:
+        """
+        Register a new queued job.
+
+        Args:
+            upload_file_request (UploadFileRequest): The upload the job performs.
+
+        Returns:
+            UploadJobStatus: The new job.
+        """
+        job = UploadJobStatus(
+            job_id=uuid.uuid4().hex,
+            status="queued",
+            file_path=upload_file_request.file_path,
+            collection_name=upload_file_request.collection_name,
+            created_at=time.time(),
+        )
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._trim()
+        return job.model_copy()
+
+    def get(
+        self,
+        job_id: str
+    ) -> Optional[UploadJobStatus]:
+        """
+        Args:
+            job_id (str): Job identifier.
+
+        Returns:
+            Optional[UploadJobStatus]: A snapshot of the job, or None if it is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy() if job is not None else None
+
+    def update(
+        self,
+        job_id: str,
+        **changes
+    ):
+        """
+        Update fields of a job.
+
+        Args:
+            job_id (str): Job identifier.
+            **changes: Fields to set.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs[job_id] = job.model_copy(update=changes)
+
+    def run(
+        self,
+        job_id: str,
+        upload: Callable[[], Optional[IngestionStats]]
+    ):
+        """
+        Run an upload, recording its progress and outcome on the job. Errors are stored, not raised.
+
+        Args:
+            job_id (str): Job identifier.
+            upload (Callable[[], Optional[IngestionStats]]): Function performing the upload.
+        """
+        self.update(job_id, status="running", started_at=time.time())
+        try:
+            stats = upload()
+        except Exception as e:
+            self.update(job_id, status="failed", detail=str(e), finished_at=time.time())
+        else:
+            self.update(job_id, status="completed", stats=stats, finished_at=time.time())
+
+    def _trim(self):
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in ("completed", "failed")
+        ]
+        while len(self._jobs) > self.max_jobs and finished:
+            del self._jobs[finished.pop(0)]
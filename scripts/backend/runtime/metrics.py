@@ -0,0 +1,183 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+"""
+This script defines lightweight, thread-safe metrics (counters, gauges and histograms) and renders
+them in the Prometheus text exposition format.
+"""
+
+
+class Counter:
+    """
+    A monotonically increasing value.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str = ""
+    ):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(
+        self,
+        amount: float = 1.0
+    ):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {self._value:g}",
+        ]
+
+
+class Gauge(Counter):
+    """
+    A value that can go up and down.
+    """
+
+    def set(
+        self,
+        value: float
+    ):
+        with self._lock:
+            self._value = value
+
+    def dec(
+        self,
+        amount: float = 1.0
+    ):
+        self.inc(-amount)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {self._value:g}",
+        ]
+
+
+class Histogram:
+    """
+    Counts observations into cumulative buckets, like a Prometheus histogram.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        buckets: Sequence[float],
+        description: str = ""
+    ):
+        self.name = name
+        self.description = description
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        value: float
+    ):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict:
+        """
+        Returns:
+            Dict: Cumulative bucket counts keyed by upper bound, plus the sum and count of observations.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(self.buckets + [float("inf")], counts):
+            running += bucket_count
+            cumulative["+Inf" if bound == float("inf") else f"{bound:g}"] = running
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+    def render(self) -> List[str]:
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for bound, count in snapshot["buckets"].items():
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f"{self.name}_sum {snapshot['sum']:g}")
+        lines.append(f"{self.name}_count {snapshot['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds named metrics. Asking twice for the same name returns the same metric.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(
+        self,
+        name: str,
+        description: str = ""
+    ) -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, description))
+
+    def gauge(
+        self,
+        name: str,
+        description: str = ""
+    ) -> Gauge:
+        return self._get_or_create(name, lambda: Gauge(name, description))
+
+    def histogram(
+        self,
+        name: str,
+        buckets: Sequence[float],
+        description: str = ""
+    ) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, buckets, description))
+
+    def get(
+        self,
+        name: str
+    ) -> Optional[object]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Returns:
+            str: All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _get_or_create(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+        return metric
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, List, Optional
+
+from dotenv import load_dotenv
+
+from scripts.backend.runtime.inference_executor import InferenceExecutor
+from scripts.backend.runtime.metrics import metrics
+from scripts.backend.runtime.tracing import STAGE_BUCKETS
+
+"""
+This script defines a micro-batcher that groups items submitted by concurrent requests into a single
+batched model call and hands each result back to the request that submitted it.
+"""
+
+load_dotenv()
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+
+
+class MicroBatcher:
+    """
+    Collects items from concurrent callers for up to 'max_wait_ms' milliseconds or until 'max_batch_size'
+    items are waiting, then runs 'batch_fn' once on the whole batch in the inference executor.
+
+    'batch_fn' takes a list of items and returns a list of results in the same order. The size of every
+    batch is recorded in the '<name>_batch_size' histogram.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        executor: InferenceExecutor,
+        name: str,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 1
+    ):
+        """
+        Initialize the MicroBatcher.
+
+        Args:
+            batch_fn (Callable[[List[Any]], List[Any]]): Batched model call.
+            executor (InferenceExecutor): Executor the batches run on.
+            name (str): Name used for the metrics.
+            max_batch_size (int): Maximum number of items per batch. Defaults to 16.
+            max_wait_ms (float): Maximum time the first item of a batch waits for others. Defaults to 5.
+            max_concurrent_batches (int): Number of batches running at the same time. Defaults to 1.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent_batches = max_concurrent_batches
+        self.batch_sizes = metrics.histogram(
+            f"{name}_batch_size", BATCH_SIZE_BUCKETS, f"Number of items per {name} batch"
+        )
+        self.pending = metrics.gauge(
+            f"{name}_batch_pending", f"Items waiting for the next {name} batch"
+        )
+        self.batch_seconds = metrics.histogram(
+            f"{name}_batch_seconds", STAGE_BUCKETS, f"Time to run a {name} batch, including executor wait"
+        )
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+    @classmethod
+    def from_env(
+        cls,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        executor: InferenceExecutor,
+        name: str,
+        default_batch_size: int = 16,
+        default_wait_ms: float = 5.0
+    ) -> "MicroBatcher":
+        """
+        Build a batcher configured by the <NAME>_BATCH_SIZE and <NAME>_BATCH_WAIT_MS environment variables.
+        """
+        prefix = name.upper()
+        return cls(
+            batch_fn=batch_fn,
+            executor=executor,
+            name=name,
+            max_batch_size=int(os.getenv(f"{prefix}_BATCH_SIZE", default_batch_size)),
+            max_wait_ms=float(os.getenv(f"{prefix}_BATCH_WAIT_MS", default_wait_ms)),
+        )
+
+    async def submit(
+        self,
+        item: Any
+    ) -> Any:
+        """
+        Add an item to the next batch and wait for its result.
+
+        Args:
+            item (Any): Item to process.
+
+        Returns:
+            Any: The result of 'batch_fn' for this item.
+
+        Raises:
+            InferenceQueueFullError: If the executor cannot accept the batch.
+        """
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.inc()
+        await self._queue.put((item, future))
+        return await future
+
+    async def close(self):
+        """
+        Stop the background worker.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.max_concurrent_batches)
+
+        while True:
+            await slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.pending.dec(len(batch))
+            batch = [(item, future) for item, future in batch if not future.cancelled()]
+            if not batch:
+                slots.release()
+                continue
+
+            self.batch_sizes.observe(len(batch))
+            task = asyncio.create_task(self._process(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _process(
+        self,
+        batch: List[tuple]
+    ):
+        start = time.perf_counter()
+        try:
+            results = await self.executor.run(self.batch_fn, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batch_seconds.observe(time.perf_counter() - start)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,288 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from scripts.backend.document_processing.document_embedder import Embedder
+from scripts.backend.document_processing.local_vector_index import LOCAL_VECTOR_DIR, LocalQdrantClient
+from scripts.backend.query_processing.reranker import DEFAULT_RERANK_MODEL, Reranker
+from scripts.backend.query_processing.response_generator import ResponseGenerator
+
+"""
+This script defines a process-wide registry that loads models and Qdrant clients once and shares them
+between the FastAPI app and the Streamlit app, so requests only pay for inference.
+"""
+
+load_dotenv()
+
+DEFAULT_EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "bert-large-uncased")
+DEFAULT_GENERATION_MODEL = os.getenv("GENERATION_MODEL", "google/flan-t5-small")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+
+
+class ModelRegistry:
+    """
+    A thread-safe registry of loaded models and pooled Qdrant clients.
+
+    Instances are keyed by (kind, model name or URL, device) and are loaded lazily the first time
+    they are requested. Loading happens behind a per-key lock, so concurrent callers wait for a
+    single load instead of loading the same weights twice, while different keys load in parallel.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._instances: Dict[Hashable, Any] = {}
+
+    def _get_or_load(
+        self,
+        key: Tuple,
+        loader: Callable[[], Any]
+    ) -> Any:
+        """
+        Return the instance stored under 'key', loading it with 'loader' if needed.
+
+        Args:
+            key (Tuple): Registry key.
+            loader (Callable[[], Any]): Function that builds the instance.
+
+        Returns:
+            Any: The shared instance.
+        """
+        instance = self._instances.get(key)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            instance = self._instances.get(key)
+            if instance is None:
+                instance = loader()
+                self._instances[key] = instance
+        return instance
+
+    def get_embedder(
+        self,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        device: Optional[str] = None
+    ) -> Embedder:
+        """
+        Get the shared Embedder for a model and device. Chunk embeddings are cached under
+        EMBEDDING_CACHE_DIR (".cache/embeddings" by default, an empty value disables the cache).
+
+        Args:
+            model_name (str): Name of the embedding model.
+            device (str, optional): Device to load the model on. Defaults to CUDA when available.
+
+        Returns:
+            Embedder: The shared embedder.
+        """
+        device = device or Embedder.default_device()
+        return self._get_or_load(
+            ("embedder", model_name, device),
+            lambda: Embedder(model_name=model_name, device=device, cache_dir=EMBEDDING_CACHE_DIR)
+        )
+
+    def get_response_generator(
+        self,
+        model_name: str = DEFAULT_GENERATION_MODEL,
+        device: Optional[str] = None
+    ) -> ResponseGenerator:
+        """
+        Get the shared ResponseGenerator for a model and device.
+
+        Args:
+            model_name (str): Name of the generation model.
+            device (str, optional): Device to load the model on. Defaults to CUDA when available.
+
+        Returns:
+            ResponseGenerator: The shared response generator.
+        """
+        device = device or Embedder.default_device()
+        return self._get_or_load(
+            ("generator", model_name, device),
+            lambda: ResponseGenerator(model_name=model_name, device=device)
+        )
+
+    def get_reranker(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        device: Optional[str] = None
+    ) -> Reranker:
+        """
+        Get the shared Reranker for a cross-encoder and device.
+
+        Args:
+            model_name (str): Name of the cross-encoder.
+            device (str, optional): Device to load the model on. Defaults to CUDA when available.
+
+        Returns:
+            Reranker: The shared reranker.
+        """
+        device = device or Embedder.default_device()
+        return self._get_or_load(
+            ("reranker", model_name, device),
+            lambda: Reranker(model_name=model_name, device=device)
+        )
+
+    def get_qdrant_client(
+        self,
+        url: Optional[str] = None,
+        api_key: Optional[str] = None
+    ) -> QdrantClient:
+        """
+        Get the pooled QdrantClient for a URL. The client keeps its HTTP connection pool open
+        across requests. Use ":memory:" as URL for an in-process instance. When the VECTOR_BACKEND
+        environment variable is "local", a LocalQdrantClient persisted under LOCAL_VECTOR_DIR is
+        returned instead and 'url' and 'api_key' are ignored.
+
+        Args:
+            url (str, optional): Qdrant URL. Defaults to the QDRANT_URL environment variable.
+            api_key (str, optional): Qdrant API key. Defaults to the QDRANT_API_KEY environment variable.
+
+        Returns:
+            QdrantClient: The shared client.
+        """
+        if VECTOR_BACKEND == "local":
+            return self._get_or_load(("qdrant", f"local:{LOCAL_VECTOR_DIR}"), LocalQdrantClient)
+
+        url = url or os.getenv("QDRANT_URL")
+        api_key = api_key or os.getenv("QDRANT_API_KEY")
+
+        def load() -> QdrantClient:
+            if url == ":memory:":
+                return QdrantClient(":memory:")
+            return QdrantClient(url=url, api_key=api_key)
+
+        return self._get_or_load(("qdrant", url), load)
+
+    def get_async_qdrant_client(
+        self,
+        url: Optional[str] = None,
+        api_key: Optional[str] = None
+    ) -> Optional[AsyncQdrantClient]:
+        """
+        Get the pooled AsyncQdrantClient for a URL.
+
+        An in-memory Qdrant only exists inside the client that created it, so for ":memory:" and for the
+        local backend no async client is returned and callers should run the sync client from 'get_qdrant_client' off the event loop.
+
+        Args:
+            url (str, optional): Qdrant URL. Defaults to the QDRANT_URL environment variable.
+            api_key (str, optional): Qdrant API key. Defaults to the QDRANT_API_KEY environment variable.
+
+        Returns:
+            Optional[AsyncQdrantClient]: The shared client, or None for an in-memory Qdrant.
+        """
+        url = url or os.getenv("QDRANT_URL")
+        api_key = api_key or os.getenv("QDRANT_API_KEY")
+        if url == ":memory:" or VECTOR_BACKEND == "local":
+            return None
+
+        return self._get_or_load(
+            ("async_qdrant", url),
+            lambda: AsyncQdrantClient(url=url, api_key=api_key)
+        )
+
+    def register(
+        self,
+        key: Tuple,
+        instance: Any
+    ):
+        """
+        Store an already built instance, e.g. an offline stand-in for a model.
+
+        Args:
+            key (Tuple): Registry key, as returned by 'keys'.
+            instance (Any): Instance to share.
+        """
+        with self._lock:
+            self._instances[key] = instance
+
+    def keys(self) -> List[Tuple]:
+        """
+        Returns:
+            List[Tuple]: Keys of the currently loaded instances.
+        """
+        return list(self._instances)
+
+    def warm_up(
+        self,
+        embedding_models: Optional[List[str]] = None,
+        generation_models: Optional[List[str]] = None,
+        qdrant_urls: Optional[List[str]] = None
+    ):
+        """
+        Load models and open clients ahead of the first request.
+
+        Args:
+            embedding_models (List[str], optional): Embedding models to load. Defaults to the default model.
+            generation_models (List[str], optional): Generation models to load. Defaults to the default model.
+            qdrant_urls (List[str], optional): Qdrant URLs to connect to. Defaults to QDRANT_URL.
+        """
+        for model_name in embedding_models or [DEFAULT_EMBEDDING_MODEL]:
+            self.get_embedder(model_name=model_name)
+        for model_name in generation_models or [DEFAULT_GENERATION_MODEL]:
+            self.get_response_generator(model_name=model_name)
+        for url in qdrant_urls or [None]:
+            self.get_qdrant_client(url=url)
+
+    def evict(
+        self,
+        kind: Optional[str] = None
+    ) -> int:
+        """
+        Drop loaded instances so their memory can be reclaimed. Sync Qdrant clients are closed;
+        use 'aevict' from async code to also close async clients.
+
+        Args:
+            kind (str, optional): Only evict instances of this kind ("embedder", "generator",
+                "reranker", "qdrant" or "async_qdrant"). Defaults to evicting everything.
+
+        Returns:
+            int: Number of evicted instances.
+        """
+        evicted = self._pop(kind)
+        for instance in evicted:
+            if isinstance(instance, (QdrantClient, LocalQdrantClient)):
+                instance.close()
+        return len(evicted)
+
+    async def aevict(
+        self,
+        kind: Optional[str] = None
+    ) -> int:
+        """
+        Same as 'evict', but also closes async Qdrant clients.
+        """
+        evicted = self._pop(kind)
+        for instance in evicted:
+            if isinstance(instance, (QdrantClient, LocalQdrantClient)):
+                instance.close()
+            elif isinstance(instance, AsyncQdrantClient):
+                await instance.close()
+        return len(evicted)
+
+    def _pop(
+        self,
+        kind: Optional[str]
+    ) -> List[Any]:
+        with self._lock:
+            keys = [key for key in self._instances if kind is None or key[0] == kind]
+            return [self._instances.pop(key) for key in keys]
+
+
+_registry = ModelRegistry()
+
+
+def get_registry() -> ModelRegistry:
+    """
+    Returns:
+        ModelRegistry: The process-wide registry.
+    """
+    return _registry
@@ -0,0 +1,154 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from scripts.backend.runtime.metrics import metrics
+
+"""
+This script defines per-request stage timing. A Trace is bound to the current request through a context
+variable; 'span' measures a stage, records it in the 'stage_<name>_seconds' histogram and, when a trace
+is active, adds it to the trace so the request can report its own breakdown.
+
+Executor threads do not inherit the request's context, so stages running there only feed the histograms;
+the async code awaiting them records the request-level span instead.
+"""
+
+STAGE_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+class Trace:
+    """
+    Stage timings and counts of a single request.
+
+    Attributes:
+        spans (Dict[str, float]): Milliseconds spent in each stage, summed when a stage runs more than once.
+        counts (Dict[str, float]): Counted quantities, e.g. retrieved chunks or generated tokens.
+        errors (int): Number of errors recorded while handling the request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+        self.errors = 0
+
+    def add_span(
+        self,
+        name: str,
+        seconds: float
+    ):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds * 1000
+
+    def add_count(
+        self,
+        name: str,
+        value: float
+    ):
+        self.counts[name] = self.counts.get(name, 0.0) + value
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def header(self) -> str:
+        """
+        Returns:
+            str: The stage breakdown in the Server-Timing syntax, e.g. "retrieve;dur=4.1, generate;dur=120.0".
+        """
+        entries = [f"{name};dur={ms:.1f}" for name, ms in self.spans.items()]
+        entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict:
+        return {
+            "total_ms": round(self.elapsed_ms(), 3),
+            "spans_ms": {name: round(ms, 3) for name, ms in self.spans.items()},
+            "counts": dict(self.counts),
+            "errors": self.errors,
+        }
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """
+    Bind a new Trace to the current context for the duration of the block.
+
+    Yields:
+        Trace: The active trace.
+    """
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    """
+    Returns:
+        Trace, optional: The trace of the current request, if any.
+    """
+    return _current_trace.get()
+
+
+@contextmanager
+def span(
+    name: str,
+    observe: bool = True
+) -> Iterator[None]:
+    """
+    Time a stage.
+
+    Args:
+        name (str): Stage name.
+        observe (bool): Record the duration in the 'stage_<name>_seconds' histogram. Set to False when the
+            stage itself runs elsewhere and already records its histogram, e.g. when awaiting an executor.
+            Defaults to True.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if observe:
+            metrics.histogram(
+                f"stage_{name}_seconds", STAGE_BUCKETS, f"Time spent in the {name} stage"
+            ).observe(elapsed)
+        active = _current_trace.get()
+        if active is not None:
+            active.add_span(name, elapsed)
+
+
+def count(
+    name: str,
+    value: float = 1.0
+):
+    """
+    Add to the '<name>_total' counter and to the current trace.
+
+    Args:
+        name (str): Quantity name, e.g. "retrieved_chunks".
+        value (float): Amount to add. Defaults to 1.
+    """
+    metrics.counter(f"{name}_total", f"Total {name.replace('_', ' ')}").inc(value)
+    active = _current_trace.get()
+    if active is not None:
+        active.add_count(name, value)
+
+
+def record_error(
+    name: str
+):
+    """
+    Count an error that is handled instead of raised, in the '<name>_errors_total' counter and the current trace.
+
+    Args:
+        name (str): Component where the error happened, e.g. "query".
+    """
+    metrics.counter(f"{name}_errors_total", f"Errors handled by the {name} path").inc()
+    active = _current_trace.get()
+    if active is not None:
+        active.errors += 1
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from scripts.backend.runtime.metrics import metrics
+from scripts.backend.runtime.model_registry import ModelRegistry
+
+"""
+This script defines the warm-up of the shared model registry at startup. In "eager" mode the
+Qdrant client and the models are loaded before the server takes traffic; in "background" mode
+they are loaded in a daemon thread while the server already answers health checks, and the
+progress of every component is reported until all of them are ready.
+"""
+
+load_dotenv()
+
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager")
+
+
+class WarmUp:
+    """
+    Loads the registry's default components once and tracks their progress.
+
+    Components are loaded in order, cheapest first, so a readiness probe sees the Qdrant client
+    ready before the embedder and the embedder before the generator. A component requested by a
+    route before the warm-up reaches it is simply loaded by that request; the registry's per-key
+    locks make both wait for the same load.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self.mode: Optional[str] = None
+        self.components: Dict[str, Dict] = {}
+
+    def start(
+        self,
+        registry: ModelRegistry,
+        background: bool = STARTUP_MODE == "background"
+    ):
+        """
+        Start loading the components. Calling it again while a warm-up is running or done has no effect.
+
+        Args:
+            registry (ModelRegistry): Registry to load the components into.
+            background (bool): Load in a daemon thread and return immediately. Defaults to True when
+                the STARTUP_MODE environment variable is "background".
+
+        Raises:
+            RuntimeError: In eager mode, if a component fails to load.
+        """
+        steps = self._steps(registry)
+        with self._lock:
+            if self._started is not None:
+                return
+            self._started = time.perf_counter()
+            self.mode = "background" if background else "eager"
+            self.components = {
+                name: {"status": "pending", "seconds": None, "error": None} for name, _ in steps
+            }
+
+        if not background:
+            self._load(steps, raise_errors=True)
+            return
+        self._thread = threading.Thread(target=self._load, args=(steps,), name="warm-up", daemon=True)
+        self._thread.start()
+
+    def is_ready(
+        self,
+        name: Optional[str] = None
+    ) -> bool:
+        """
+        Args:
+            name (str, optional): Component to check. Defaults to all components.
+
+        Returns:
+            bool: Whether the component, or every component, is loaded. False before 'start'.
+        """
+        with self._lock:
+            if not self.components:
+                return False
+            if name is not None:
+                return self.components.get(name, {}).get("status") == "ready"
+            return all(component["status"] == "ready" for component in self.components.values())
+
+    def report(self) -> Dict:
+        """
+        Returns:
+            Dict: Startup mode, overall readiness, seconds since the warm-up started and the
+                status, load time and error of every component.
+        """
+        with self._lock:
+            components = {name: dict(component) for name, component in self.components.items()}
+            elapsed = time.perf_counter() - self._started if self._started is not None else 0.0
+        return {
+            "mode": self.mode,
+            "ready": bool(components) and all(c["status"] == "ready" for c in components.values()),
+            "elapsed_seconds": round(elapsed, 3),
+            "components": components,
+        }
+
+    def join(
+        self,
+        timeout: Optional[float] = None
+    ):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @staticmethod
+    def _steps(registry: ModelRegistry) -> List[Tuple[str, Callable[[], object]]]:
+        return [
+            ("qdrant", registry.get_qdrant_client),
+            ("embedder", registry.get_embedder),
+            ("generator", registry.get_response_generator),
+        ]
+
+    def _load(
+        self,
+        steps: List[Tuple[str, Callable[[], object]]],
+        raise_errors: bool = False
+    ):
+        for name, load in steps:
+            self._update(name, status="loading")
+            start = time.perf_counter()
+            try:
+                load()
+            except Exception as e:
+                self._update(name, status="failed", seconds=round(time.perf_counter() - start, 3), error=str(e))
+                if raise_errors:
+                    raise RuntimeError(f"Error warming up {name}: {e}")
+                continue
+            seconds = time.perf_counter() - start
+            self._update(name, status="ready", seconds=round(seconds, 3))
+            metrics.gauge(
+                f"warm_up_{name}_seconds", f"Time to load the {name} at startup"
+            ).set(seconds)
+
+        metrics.gauge("warm_up_ready", "1 once every component loaded at startup").set(float(self.is_ready()))
+
+    def _update(
+        self,
+        name: str,
+        **fields
+    ):
+        with self._lock:
+            self.components[name].update(fields)
+
+
+_warm_up = WarmUp()
+
+
+def get_warm_up() -> WarmUp:
+    """
+    Returns:
+        WarmUp: The process-wide warm-up.
+    """
+    return _warm_up
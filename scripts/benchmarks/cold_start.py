@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict
+
+import httpx
+
+"""
+This script measures the cold start of the API: how long importing the app takes and which packages
+dominate it, and, for each startup mode, the time from launching the server to answering '/health',
+to '/ready' and to the first query that is not rejected because the models are still loading.
+
+Every measurement starts a fresh Python process, so nothing is already imported or loaded. The server
+is started with uvicorn; '--stand-ins' replaces the models with the offline stand-ins of the load test
+and an in-memory Qdrant, which isolates the import and framework overhead from the model load time.
+A query against a missing collection still counts as answered, since it has passed the model checks.
+
+Usage:
+    python -m scripts.benchmarks.cold_start --modes eager,background --output cold_start.json
+    EMBEDDING_SNAPSHOT=true python -m scripts.benchmarks.cold_start --modes background --collection-name docs
+"""
+
+API_PREFIX = "/api/v1"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def measure_imports(
+    module: str,
+    top: int
+) -> Dict:
+    """
+    Import a module in a fresh interpreter with '-X importtime'. Packages imported by other packages
+    are reported too, so the totals overlap.
+
+    Args:
+        module (str): Module to import.
+        top (int): Number of slowest packages to report.
+
+    Returns:
+        Dict: Wall time of the import and the slowest packages by cumulative import time.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Error importing {module}: {result.stderr.strip().splitlines()[-1]}")
+
+    # A package is imported once, and its line carries the time of everything it imported in turn
+    packages: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match and "." not in match.group(3) and match.group(3) != module.split(".")[0]:
+            packages.setdefault(match.group(3), int(match.group(2)))
+
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return {
+        "module": module,
+        "wall_seconds": round(wall, 3),
+        "slowest_packages_ms": {name: round(us / 1000, 1) for name, us in slowest},
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_startup(
+    mode: str,
+    stand_ins: bool,
+    collection_name: str,
+    query: str,
+    timeout: float,
+    poll_interval: float
+) -> Dict:
+    """
+    Start the server in a subprocess and poll it until a query is answered.
+
+    Args:
+        mode (str): STARTUP_MODE of the server, "eager" or "background".
+        stand_ins (bool): Serve the offline stand-ins instead of the real models.
+        collection_name (str): Collection queried.
+        query (str): Query sent until it is answered.
+        timeout (float): Seconds to wait for the first answered query.
+        poll_interval (float): Seconds between polls.
+
+    Returns:
+        Dict: Seconds from launch to the first answer of '/health', '/ready' and '/rag/query', the
+            status and latency of that first query, and the final readiness report.
+    """
+    port = free_port()
+    command = [sys.executable, "-m", "scripts.benchmarks.cold_start", "--serve", "--port", str(port)]
+    if stand_ins:
+        command.append("--stand-ins")
+    environment = dict(os.environ, STARTUP_MODE=mode)
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=environment,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    result: Dict = {"mode": mode, "stand_ins": stand_ins}
+    base_url = f"http://127.0.0.1:{port}{API_PREFIX}"
+    try:
+        with httpx.Client(base_url=base_url, timeout=timeout) as client:
+            while time.perf_counter() - start < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited: {process.stderr.read().strip()[-500:]}")
+                try:
+                    if "health_seconds" not in result:
+                        client.get("/health").raise_for_status()
+                        result["health_seconds"] = round(time.perf_counter() - start, 3)
+                    if "ready_seconds" not in result:
+                        ready = client.get("/ready")
+                        if ready.status_code == 200:
+                            result["ready_seconds"] = round(time.perf_counter() - start, 3)
+                        result["warm_up"] = ready.json()
+                    sent = time.perf_counter()
+                    response = client.post("/rag/query", json={"query": query, "collection_name": collection_name})
+                    if response.status_code != 503:
+                        result["first_query_seconds"] = round(time.perf_counter() - start, 3)
+                        result["first_query_ms"] = round((time.perf_counter() - sent) * 1000, 1)
+                        result["first_query_status"] = response.status_code
+                        if "ready_seconds" not in result:
+                            result["warm_up"] = client.get("/ready").json()
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(poll_interval)
+            else:
+                result["error"] = f"No query answered within {timeout} seconds"
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return result
+
+
+def serve(
+    port: int,
+    stand_ins: bool
+):
+    import uvicorn
+
+    if stand_ins:
+        os.environ.setdefault("QDRANT_URL", ":memory:")
+        from scripts.benchmarks.load_test import register_stand_ins
+
+        register_stand_ins(0, 0)
+    uvicorn.run("scripts.main:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import time and time-to-first-query of the API")
+    parser.add_argument("--modes", default="eager,background", help="Comma-separated STARTUP_MODE values")
+    parser.add_argument("--stand-ins", action="store_true", help="Serve offline model stand-ins")
+    parser.add_argument("--collection-name", default="cold_start")
+    parser.add_argument("--query", default="What is execution guided decoding?")
+    parser.add_argument("--imports", default="scripts.main", help="Comma-separated modules to time the import of")
+    parser.add_argument("--top", type=int, default=15, help="Slowest package imports to report")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds to wait for each server")
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.port, args.stand_ins)
+        return 0
+
+    report: Dict = {"imports": [measure_imports(module, args.top) for module in args.imports.split(",")]}
+    report["startup"] = [
+        measure_startup(mode, args.stand_ins, args.collection_name, args.query, args.timeout, args.poll_interval)
+        for mode in args.modes.split(",")
+    ]
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0 if all("error" not in run for run in report["startup"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
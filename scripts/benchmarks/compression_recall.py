@@ -0,0 +1,204 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from scripts.backend.document_processing.document_embedder import Embedder
+from scripts.backend.document_processing.document_loader import DocumentLoader
+from scripts.backend.document_processing.document_splitter import DocumentSplitter
+from scripts.backend.document_processing.local_vector_index import LocalQdrantClient
+from scripts.backend.document_processing.vector_compression import (
+    PROJECTIONS,
+    QUANTIZATIONS,
+    SEARCH_PARAMS,
+    set_projection,
+)
+from scripts.backend.document_processing.vector_store import VectorStore
+from scripts.benchmarks.fakes import FakeEmbedder
+
+"""
+This script quantifies the memory-versus-quality trade-off of compressed collections. The chunks of the
+bundled PDFs are ingested into a full-precision collection, which is then copied with every combination
+of '--dimensions' and '--quantizations'. For each copy, sampled questions are searched with the same
+query path as the API (projection and rescoring included) and compared with an exact search of the
+full-precision collection: recall@k is the share of the exact top k found in the copy's top k.
+
+Quantization only takes effect on a Qdrant server ('--qdrant-url http://...'). The in-memory client ignores
+it, and the 'local' backend stores scalar-quantized collections as int8 and ignores binary quantization.
+Embeddings come from an offline stand-in unless '--embedding-model' is set; its vectors are not
+representative of a real model, so use a real one to decide on a configuration.
+
+Usage:
+    python -m scripts.benchmarks.compression_recall --dimensions 0,512,256 --quantizations none,scalar,binary
+    python -m scripts.benchmarks.compression_recall --embedding-model bert-large-uncased --qdrant-url http://localhost:6333
+"""
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BUNDLED_PDFS = ["SQLova.pdf", "SEQ2SQL-RL.pdf", "Tema 1_removed.pdf"]
+EXACT_SEARCH = models.SearchParams(exact=True)
+
+
+def connect(
+    url: str
+):
+    if url == "local":
+        import tempfile
+
+        return LocalQdrantClient(directory=tempfile.mkdtemp(prefix="compression_recall_"))
+    return QdrantClient(url)
+
+
+def search_ids(
+    client,
+    collection_name: str,
+    query_vectors: List[List[float]],
+    k: int,
+    search_params: models.SearchParams
+) -> List[List[str]]:
+    return [
+        [str(point.id) for point in client.query_points(
+            collection_name=collection_name, query=query_vector, limit=k,
+            search_params=search_params, with_payload=False
+        ).points]
+        for query_vector in query_vectors
+    ]
+
+
+def evaluate(
+    vector_store: VectorStore,
+    embedder: Embedder,
+    collection_name: str,
+    questions: List[str],
+    exact_ids: List[List[str]],
+    dimensions: int,
+    projection: str,
+    quantization: str,
+    k: int
+) -> Dict:
+    """
+    Compress the full-precision collection one way and measure the recall of its searches.
+
+    Args:
+        vector_store (VectorStore): Store holding the full-precision collection.
+        embedder (Embedder): Embedding model of the collection.
+        collection_name (str): The full-precision collection.
+        questions (List[str]): Questions searched.
+        exact_ids (List[List[str]]): Exact top k of every question in the full-precision collection.
+        dimensions (int): Size of the projected vectors, 0 to keep the model's size.
+        projection (str): Projection method.
+        quantization (str): Quantization of the copy.
+        k (int): Number of results compared.
+
+    Returns:
+        Dict: Recall@k, search latency and vector memory of the copy.
+    """
+    target_collection_name = f"{collection_name}_{projection}{dimensions}_{quantization}"
+    stats = vector_store.compress_collection(
+        collection_name, target_collection_name, embedder,
+        dimensions=dimensions or None, projection=projection, quantization=quantization
+    )
+    try:
+        query_vectors = [embedder.embed_query(question, target_collection_name) for question in questions]
+        start = time.perf_counter()
+        found_ids = search_ids(vector_store.client, target_collection_name, query_vectors, k, SEARCH_PARAMS)
+        seconds = time.perf_counter() - start
+    finally:
+        vector_store.client.delete_collection(collection_name=target_collection_name)
+        set_projection(target_collection_name, None)
+
+    recalls = [
+        len(set(found) & set(exact)) / len(exact)
+        for found, exact in zip(found_ids, exact_ids) if exact
+    ]
+    return {
+        "dimensions": stats.dimensions,
+        "projection": stats.projection,
+        "retained": stats.retained,
+        "quantization": quantization,
+        f"recall@{k}": float(np.mean(recalls)) if recalls else 0.0,
+        "search_ms": seconds * 1000 / max(len(questions), 1),
+        "vector_bytes": stats.vector_bytes,
+        "vector_memory_mb": stats.points * stats.vector_bytes / 2 ** 20,
+        "memory_ratio": stats.vector_bytes / stats.source_vector_bytes,
+        "compress_seconds": stats.seconds,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recall@k and memory of projected and quantized collections")
+    parser.add_argument("--files", help="Comma-separated PDFs. Defaults to the bundled PDFs")
+    parser.add_argument("--embedding-model", help="Hugging Face embedding model. Defaults to an offline stand-in")
+    parser.add_argument("--dimensions", default="0,512,256,128", help="Comma-separated sizes, 0 for no projection")
+    parser.add_argument("--projection", default="pca", choices=PROJECTIONS)
+    parser.add_argument("--quantizations", default=",".join(QUANTIZATIONS), help="Comma-separated quantizations")
+    parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, ':memory:' or 'local'")
+    parser.add_argument("--queries", type=int, default=200, help="Number of questions sampled from the chunks")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    paths = args.files.split(",") if args.files else [os.path.join(REPO_ROOT, name) for name in BUNDLED_PDFS]
+    pages = [page for path in paths if os.path.exists(path) for page in DocumentLoader().iter_pages(path)]
+    chunks = list(DocumentSplitter().split_stream(pages))
+    if not chunks:
+        raise ValueError("No chunks to index")
+    if args.embedding_model:
+        embedder = Embedder(model_name=args.embedding_model, cache_dir=None)
+    else:
+        embedder = FakeEmbedder()
+
+    collection_name = "compression_recall"
+    vector_store = VectorStore(client=connect(args.qdrant_url))
+    if vector_store.client.collection_exists(collection_name=collection_name):
+        vector_store.client.delete_collection(collection_name=collection_name)
+    vector_store.create_collection(collection_name, embedder=embedder, quantization="none")
+    try:
+        ingestion = vector_store.add_documents(chunks, collection_name, embedder)
+        step = max(1, len(chunks) // args.queries)
+        questions = [" ".join(chunk.page_content.split()[:8]) or "query" for chunk in chunks[::step]][:args.queries]
+        exact_ids = search_ids(
+            vector_store.client, collection_name,
+            [embedder.embed_query(question) for question in questions], args.k, EXACT_SEARCH
+        )
+
+        report: Dict = {
+            "files": [os.path.basename(path) for path in paths],
+            "embedding_model": args.embedding_model or embedder.model_name,
+            "qdrant_url": args.qdrant_url,
+            "points": ingestion.chunks,
+            "questions": len(questions),
+            "k": args.k,
+            "runs": [],
+        }
+        for dimensions, quantization in itertools.product(
+            [int(value) for value in args.dimensions.split(",")], args.quantizations.split(",")
+        ):
+            if dimensions >= embedder.dimension:
+                continue
+            try:
+                report["runs"].append(evaluate(
+                    vector_store, embedder, collection_name, questions, exact_ids,
+                    dimensions, args.projection, quantization, args.k
+                ))
+            except ValueError as e:
+                report["runs"].append({"dimensions": dimensions, "quantization": quantization, "error": str(e)})
+    finally:
+        vector_store.client.delete_collection(collection_name=collection_name)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from scripts.backend.document_processing.document_embedder import BACKENDS, Embedder
+from scripts.backend.document_processing.document_loader import DocumentLoader
+from scripts.backend.document_processing.document_splitter import DocumentSplitter
+
+"""
+This script compares the Embedder backends on the same texts: load time, texts per second, and the
+cosine drift of their vectors against the fp32 PyTorch model. It recommends the fastest backend whose
+mean drift stays within the tolerance.
+
+Usage:
+    python -m scripts.benchmarks.embedding_backends --backends torch,torch-int8,onnx,onnx-int8 --threads 4
+    python -m scripts.benchmarks.embedding_backends --max-seq-length 256 --tolerance 0.005 --output report.json
+"""
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BUNDLED_PDFS = ["SQLova.pdf", "SEQ2SQL-RL.pdf", "Tema 1_removed.pdf"]
+
+
+def load_texts(
+    texts_file: Optional[str],
+    limit: int
+) -> List[str]:
+    """
+    Args:
+        texts_file (str, optional): File with one text per line. Defaults to the chunks of the bundled PDFs.
+        limit (int): Maximum number of texts.
+
+    Returns:
+        List[str]: Texts to embed.
+    """
+    if texts_file:
+        with open(texts_file) as f:
+            return [line.strip() for line in f if line.strip()][:limit]
+
+    texts = []
+    splitter = DocumentSplitter()
+    for name in BUNDLED_PDFS:
+        path = os.path.join(REPO_ROOT, name)
+        if os.path.exists(path):
+            pages = DocumentLoader().iter_pages(path)
+            texts.extend(chunk.page_content for chunk in splitter.split_stream(pages))
+    return texts[:limit]
+
+
+def cosine_drift(
+    reference: np.ndarray,
+    candidate: np.ndarray
+) -> Dict[str, float]:
+    """
+    Measure how far a backend's vectors are from the reference vectors of the same texts.
+
+    Args:
+        reference (np.ndarray): Reference vectors, one row per text.
+        candidate (np.ndarray): Vectors of the backend under test, in the same order.
+
+    Returns:
+        Dict[str, float]: Mean, p99 and max of 1 - cosine similarity.
+    """
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    drift = 1.0 - (reference * candidate).sum(axis=1)
+    return {
+        "mean": float(drift.mean()),
+        "p99": float(np.percentile(drift, 99)),
+        "max": float(drift.max()),
+    }
+
+
+def benchmark_backend(
+    embedder: Embedder,
+    texts: List[str],
+    repeats: int
+) -> Dict:
+    """
+    Args:
+        embedder (Embedder): Loaded embedder.
+        texts (List[str]): Texts to embed.
+        repeats (int): Number of timed passes over the texts.
+
+    Returns:
+        Dict: Throughput of the best pass and the vectors of the last one.
+    """
+    embedder.embedding.embed_documents(texts[:embedder.encode_batch_size])
+    best = float("inf")
+    vectors = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        vectors = embedder.embedding.embed_documents(texts)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "seconds": best,
+        "texts_per_second": len(texts) / best if best > 0 else 0.0,
+        "vectors": np.asarray(vectors, dtype=np.float32),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Embedding backend throughput and parity benchmark")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "bert-large-uncased"))
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backends to compare")
+    parser.add_argument("--threads", type=int, help="Intra-op threads for every backend")
+    parser.add_argument("--max-seq-length", type=int, help="Truncation length for the backends under test")
+    parser.add_argument("--encode-batch-size", type=int, default=32)
+    parser.add_argument("--texts", type=int, default=256, help="Number of texts to embed")
+    parser.add_argument("--texts-file", help="File with one text per line. Defaults to the bundled PDF chunks")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Maximum mean cosine drift")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    texts = load_texts(args.texts_file, args.texts)
+    if not texts:
+        raise ValueError("No texts to embed")
+
+    start = time.perf_counter()
+    reference_embedder = Embedder(
+        model_name=args.model, device="cpu", backend="torch", num_threads=args.threads,
+        encode_batch_size=args.encode_batch_size
+    )
+    reference_load = time.perf_counter() - start
+    reference = benchmark_backend(reference_embedder, texts, args.repeats)
+    del reference_embedder
+
+    results = []
+    for backend in args.backends.split(","):
+        if backend == "torch" and not args.max_seq_length:
+            run, load_seconds = reference, reference_load
+        else:
+            start = time.perf_counter()
+            try:
+                embedder = Embedder(
+                    model_name=args.model, device="cpu", backend=backend, num_threads=args.threads,
+                    max_seq_length=args.max_seq_length, encode_batch_size=args.encode_batch_size
+                )
+            except Exception as e:
+                results.append({"backend": backend, "error": str(e)})
+                continue
+            load_seconds = time.perf_counter() - start
+            run = benchmark_backend(embedder, texts, args.repeats)
+            del embedder
+
+        drift = cosine_drift(reference["vectors"], run["vectors"])
+        results.append({
+            "backend": backend,
+            "load_seconds": load_seconds,
+            "seconds": run["seconds"],
+            "texts_per_second": run["texts_per_second"],
+            "speedup": reference["seconds"] / run["seconds"] if run["seconds"] > 0 else 0.0,
+            "drift": drift,
+            "within_tolerance": drift["mean"] <= args.tolerance,
+        })
+        print(
+            f"{backend}: {run['texts_per_second']:.1f} texts/s, mean drift {drift['mean']:.2e}",
+            file=sys.stderr
+        )
+
+    passing = [result for result in results if result.get("within_tolerance")]
+    report = {
+        "model": args.model,
+        "texts": len(texts),
+        "threads": args.threads,
+        "max_seq_length": args.max_seq_length,
+        "tolerance": args.tolerance,
+        "results": results,
+        "recommended_backend": max(passing, key=lambda r: r["texts_per_second"])["backend"] if passing else None,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import hashlib
+import random
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseLLM
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from scripts.backend.document_processing.document_embedder import Embedder
+from scripts.backend.query_processing.response_generator import ResponseGenerator
+
+"""
+This script defines deterministic, offline stand-ins for the embedding and generation models and a
+generator of synthetic PDFs, so benchmarks and load tests run without network access or model weights.
+"""
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings: every word is hashed into one of 'dim' buckets with a sign,
+    and the vector is L2-normalized. Texts sharing words get similar vectors, so search results are meaningful.
+
+    Args:
+        dim (int): Size of the vectors. Defaults to 1024, like bert-large-uncased.
+        latency_ms (float): Simulated model time per text. Defaults to 0.
+    """
+
+    def __init__(
+        self,
+        dim: int = 1024,
+        latency_ms: float = 0.0
+    ):
+        self.dim = dim
+        self.latency_ms = latency_ms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(texts) / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value & (1 << 63) else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+
+class FakeEmbedder(Embedder):
+    """
+    An Embedder backed by HashingEmbeddings instead of a Hugging Face model.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "fake-hashing-embedder",
+        dim: int = 1024,
+        latency_ms: float = 0.0,
+        cache_dir: Optional[str] = None
+    ):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        super().__init__(model_name=model_name, device="cpu", cache_dir=cache_dir)
+
+    def _load_embedding_model(self) -> HashingEmbeddings:
+        return HashingEmbeddings(dim=self.dim, latency_ms=self.latency_ms)
+
+
+class ExtractiveLLM(LLM):
+    """
+    A deterministic LLM that answers with the first words of the context found in the prompt.
+
+    Attributes:
+        max_words (int): Number of words in an answer.
+        latency_ms_per_token (float): Simulated generation time per word.
+    """
+
+    max_words: int = 24
+    latency_ms_per_token: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "extractive-fake"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> str:
+        return " ".join(self._answer_words(prompt))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs) -> Iterator[GenerationChunk]:
+        for i, word in enumerate(self._answer_words(prompt, sleep=False)):
+            if self.latency_ms_per_token:
+                time.sleep(self.latency_ms_per_token / 1000)
+            yield GenerationChunk(text=word if i == 0 else f" {word}")
+
+    def _answer_words(self, prompt: str, sleep: bool = True) -> List[str]:
+        context = prompt.split("Context:", 1)[-1].split("Based on the context", 1)[0]
+        words = context.split()[:self.max_words] or ["No", "context."]
+        if sleep and self.latency_ms_per_token:
+            time.sleep(self.latency_ms_per_token * len(words) / 1000)
+        return words
+
+
+class FakeResponseGenerator(ResponseGenerator):
+    """
+    A ResponseGenerator backed by ExtractiveLLM instead of a Hugging Face pipeline. The prompt and chain
+    are the real ones, so prompt formatting and output parsing are still measured.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "fake-extractive-generator",
+        latency_ms_per_token: float = 0.0
+    ):
+        self.latency_ms_per_token = latency_ms_per_token
+        super().__init__(model_name=model_name, device="cpu")
+
+    def _load_llm(self) -> BaseLLM:
+        return ExtractiveLLM(latency_ms_per_token=self.latency_ms_per_token)
+
+
+def make_synthetic_pdf(
+    path: str,
+    pages: int = 10,
+    words_per_page: int = 400,
+    seed: int = 0
+) -> str:
+    """
+    Write a text-only PDF with pseudo-random sentences, without any PDF library.
+
+    Args:
+        path (str): Where to write the PDF.
+        pages (int): Number of pages. Defaults to 10.
+        words_per_page (int): Number of words per page. Defaults to 400.
+        seed (int): Seed of the word generator. Defaults to 0.
+
+    Returns:
+        str: The path of the written file.
+    """
+    vocabulary = (
+        "query table column select where count sum average model encoder decoder "
+        "attention sequence token embedding vector database index retrieval answer "
+        "question context layer training reward policy execution accuracy schema"
+    ).split()
+    rng = random.Random(seed)
+
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 2 * pages + 1
+    page_ids = []
+    for _ in range(pages):
+        words = [rng.choice(vocabulary) for _ in range(words_per_page)]
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        text = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({line}.) '" for line in lines) + " ET"
+        stream = text.encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, xref
+    )
+
+    with open(path, "wb") as f:
+        f.write(output)
+    return path
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from qdrant_client import QdrantClient
+
+from scripts.backend.document_processing.document_loader import DocumentLoader
+from scripts.backend.document_processing.document_splitter import DocumentSplitter
+from scripts.backend.document_processing.upload_file import UploadFile
+from scripts.backend.document_processing.vector_store import VectorStore
+from scripts.backend.models.rag import QueryRequest, UploadFileRequest
+from scripts.backend.query_processing.query_processor import QueryProcessor
+from scripts.backend.runtime.model_registry import get_registry
+from scripts.benchmarks.fakes import FakeEmbedder, FakeResponseGenerator, make_synthetic_pdf
+from langchain_qdrant import QdrantVectorStore
+
+"""
+This script benchmarks the ingestion and query hot paths fully offline, with deterministic stand-in models
+and an in-memory Qdrant, and reports per-stage timings, throughput and peak RSS as JSON.
+
+Usage:
+    python -m scripts.benchmarks.ingestion_benchmark --output report.json
+    python -m scripts.benchmarks.ingestion_benchmark --baseline baseline.json --tolerance 0.2
+"""
+
+BUNDLED_PDFS = ["SQLova.pdf", "SEQ2SQL-RL.pdf", "Tema 1_removed.pdf"]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """
+    Returns:
+        Dict[str, float]: Peak resident set size of this process and of its finished children, in MB.
+    """
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def timed(stages: Dict[str, Dict], name: str, items: int, fn):
+    """
+    Run 'fn', record its duration and throughput under 'name' and return its result.
+    """
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    stages[name] = {
+        "seconds": seconds,
+        "items": items if items >= 0 else len(result),
+        "per_second": (items if items >= 0 else len(result)) / seconds if seconds > 0 else 0.0,
+    }
+    return result
+
+
+def benchmark_document(
+    file_path: str,
+    embedder: FakeEmbedder,
+    generator: FakeResponseGenerator,
+    batch_size: int,
+    queries: int
+) -> Dict:
+    """
+    Benchmark every stage of one document in isolation, then the full upload and query paths.
+
+    Args:
+        file_path (str): PDF to ingest.
+        embedder (FakeEmbedder): Stand-in embedding model.
+        generator (FakeResponseGenerator): Stand-in generation model.
+        batch_size (int): Ingestion batch size.
+        queries (int): Number of queries to run against the document.
+
+    Returns:
+        Dict: Stage timings of the document.
+    """
+    stages: Dict[str, Dict] = {}
+    collection_name = "bench_stages"
+    client = QdrantClient(":memory:")
+    vector_store = VectorStore(client=client)
+    vector_store.create_collection(collection_name, size=embedder.dim)
+
+    pages = timed(stages, "load", -1, lambda: list(DocumentLoader().iter_pages(file_path)))
+    chunks = timed(stages, "split", -1, lambda: list(DocumentSplitter().split_stream(pages)))
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = timed(stages, "embed", len(texts), lambda: [
+        vector
+        for offset in range(0, len(texts), batch_size)
+        for vector in embedder.embed_documents(texts[offset:offset + batch_size])
+    ])
+    points = vector_store._build_points(chunks, vectors)
+    timed(stages, "upsert", len(points), lambda: [
+        client.upsert(collection_name=collection_name, points=points[offset:offset + batch_size], wait=True)
+        for offset in range(0, len(points), batch_size)
+    ])
+
+    question_texts = [" ".join(text.split()[:8]) or "query" for text in texts[::max(1, len(texts) // queries)]][:queries]
+    query_vectors = [embedder.embedding.embed_query(question) for question in question_texts]
+    results = timed(stages, "search", len(query_vectors), lambda: [
+        client.query_points(collection_name=collection_name, query=vector, limit=5, with_payload=True).points
+        for vector in query_vectors
+    ])
+    contexts = [
+        "\n\n".join(point.payload[QdrantVectorStore.CONTENT_KEY] for point in points_found)
+        for points_found in results
+    ]
+    timed(stages, "generate", len(contexts), lambda: [
+        generator.generate_response(question, context)
+        for question, context in zip(question_texts, contexts)
+    ])
+
+    upload_collection = "bench_upload"
+    upload = UploadFile(batch_size=batch_size)
+    timed(stages, "upload_file", len(chunks), lambda: upload.upload_file(
+        UploadFileRequest(file_path=file_path, collection_name=upload_collection), embedder
+    ))
+
+    query_processor = QueryProcessor(
+        embedder,
+        QdrantVectorStore(
+            client=get_registry().get_qdrant_client(),
+            collection_name=upload_collection,
+            embedding=embedder.embedding
+        ),
+        generator
+    )
+    timed(stages, "process_query", len(question_texts), lambda: [
+        query_processor.process_query(QueryRequest(query=question, collection_name=upload_collection, k=5))
+        for question in question_texts
+    ])
+    get_registry().get_qdrant_client().delete_collection(upload_collection)
+
+    return {
+        "name": os.path.basename(file_path),
+        "pages": len(pages),
+        "chunks": len(chunks),
+        "stages": stages,
+    }
+
+
+def compare(
+    report: Dict,
+    baseline: Dict,
+    tolerance: float
+) -> List[Dict]:
+    """
+    Find the stages that got slower than the baseline by more than 'tolerance'.
+
+    Args:
+        report (Dict): Current report.
+        baseline (Dict): Stored report.
+        tolerance (float): Allowed relative slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        List[Dict]: One entry per regressed stage.
+    """
+    baseline_documents = {document["name"]: document for document in baseline.get("documents", [])}
+    regressions = []
+    for document in report["documents"]:
+        previous = baseline_documents.get(document["name"])
+        if previous is None:
+            continue
+        for stage, timing in document["stages"].items():
+            before = previous["stages"].get(stage)
+            if before is None or before["seconds"] <= 0:
+                continue
+            ratio = timing["seconds"] / before["seconds"]
+            if ratio > 1 + tolerance:
+                regressions.append({
+                    "document": document["name"],
+                    "stage": stage,
+                    "baseline_seconds": before["seconds"],
+                    "seconds": timing["seconds"],
+                    "ratio": ratio,
+                })
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline ingestion and query benchmark")
+    parser.add_argument("--pdf", action="append", help="PDF to benchmark (defaults to the bundled PDFs)")
+    parser.add_argument("--synthetic-pages", type=int, action="append", default=[],
+                        help="Add a synthetic PDF with this many pages (repeatable)")
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=1024, help="Size of the fake embeddings")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated model time per text")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="Simulated time per generated token")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Compare against this stored report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown per stage")
+    args = parser.parse_args(argv)
+
+    os.environ["QDRANT_URL"] = ":memory:"
+    embedder = FakeEmbedder(dim=args.dim, latency_ms=args.embed_latency_ms)
+    generator = FakeResponseGenerator(latency_ms_per_token=args.token_latency_ms)
+
+    pdfs = args.pdf or [
+        os.path.join(REPO_ROOT, name) for name in BUNDLED_PDFS
+        if os.path.exists(os.path.join(REPO_ROOT, name))
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in args.synthetic_pages:
+            pdfs.append(make_synthetic_pdf(
+                os.path.join(directory, f"synthetic_{pages}p.pdf"), pages=pages, words_per_page=args.words_per_page
+            ))
+        documents = [
+            benchmark_document(pdf, embedder, generator, args.batch_size, args.queries)
+            for pdf in pdfs
+        ]
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "batch_size": args.batch_size,
+            "dim": args.dim,
+        },
+        "documents": documents,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
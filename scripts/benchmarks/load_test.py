@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+"""
+This script load-tests the '/api/v1/rag' endpoints with open-loop arrivals and reports latency
+percentiles, error rates and the highest request rate that still meets the latency SLO.
+
+The app from 'scripts/main.py' is driven in-process through an ASGI transport, with offline model
+stand-ins and an in-memory Qdrant, unless '--base-url' points to a running server or '--real-models' is set.
+Requests are sent on a Poisson schedule, independently of how fast the server answers, so queueing
+delays show up in the latencies instead of slowing down the load generator.
+
+Usage:
+    python -m scripts.benchmarks.load_test --rates 2,5,10,20 --duration 20 --slo-p99-ms 1000
+    python -m scripts.benchmarks.load_test --base-url http://localhost:8000 --queries-file queries.jsonl
+"""
+
+API_PREFIX = "/api/v1/rag"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DOCUMENT = os.path.join(REPO_ROOT, "SQLova.pdf")
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+SYNTHETIC_TOPICS = [
+    "execution guided decoding", "table aware encoder", "WikiSQL accuracy", "policy gradient reward",
+    "column attention", "where clause prediction", "aggregation operator", "logical form accuracy",
+    "BERT table encoding", "seq2seq baseline", "augmented pointer network", "SQL query generation",
+]
+SYNTHETIC_TEMPLATES = [
+    "What is {topic}?",
+    "How does the model use {topic}?",
+    "Summarize the results on {topic}.",
+    "Why does {topic} improve the results?",
+]
+
+
+def load_queries(
+    path: Optional[str],
+    count: int,
+    seed: int
+) -> List[str]:
+    """
+    Load queries from a JSONL file (one object per line, with a "query" or "title" field) or build a
+    synthetic mix of short and long questions.
+
+    Args:
+        path (str, optional): JSONL file to replay. Defaults to a synthetic mix.
+        count (int): Number of synthetic queries.
+        seed (int): Random seed of the synthetic mix.
+
+    Returns:
+        List[str]: The queries, replayed in order and cycled when exhausted.
+    """
+    if path:
+        queries = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    text = record.get("query") or record.get("title")
+                    if text:
+                        queries.append(text)
+        if not queries:
+            raise ValueError(f"No 'query' or 'title' field found in {path}")
+        return queries
+
+    rng = random.Random(seed)
+    return [
+        rng.choice(SYNTHETIC_TEMPLATES).format(topic=rng.choice(SYNTHETIC_TOPICS))
+        for _ in range(count)
+    ]
+
+
+def summarize(
+    samples: List[Dict],
+    elapsed: float
+) -> Dict:
+    """
+    Args:
+        samples (List[Dict]): One {"status", "latency_ms"} entry per request; status 0 is a transport error.
+        elapsed (float): Wall time of the run, in seconds.
+
+    Returns:
+        Dict: Request counts, error rates, achieved throughput, latency percentiles and histogram.
+    """
+    latencies = np.array([sample["latency_ms"] for sample in samples]) if samples else np.zeros(1)
+    statuses = [sample["status"] for sample in samples]
+    errors = sum(1 for status in statuses if not 200 <= status < 300)
+    rejected = sum(1 for status in statuses if status == 503)
+    histogram = {}
+    for bucket in LATENCY_BUCKETS_MS:
+        histogram[f"le_{bucket}"] = int((latencies <= bucket).sum())
+    histogram["inf"] = len(samples)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "rejected_503": rejected,
+        "statuses": {str(status): statuses.count(status) for status in sorted(set(statuses))},
+        "throughput": len(samples) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(latencies.max()),
+            "mean": float(latencies.mean()),
+        },
+        "histogram_ms": histogram,
+    }
+
+
+async def timed_request(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    samples: List[Dict],
+    **kwargs
+) -> Optional[httpx.Response]:
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = response.status_code
+    except httpx.HTTPError:
+        response = None
+        status = 0
+    samples.append({"status": status, "latency_ms": (time.perf_counter() - start) * 1000})
+    return response
+
+
+async def open_loop(
+    client: httpx.AsyncClient,
+    rate: float,
+    duration: float,
+    queries: List[str],
+    collection_name: str,
+    endpoint: str,
+    seed: int
+) -> Dict:
+    """
+    Send queries with exponentially distributed inter-arrival times for 'duration' seconds.
+
+    Args:
+        client (httpx.AsyncClient): Client bound to the app or server.
+        rate (float): Mean arrival rate, in requests per second.
+        duration (float): Length of the run, in seconds.
+        queries (List[str]): Queries to replay.
+        collection_name (str): Collection to query.
+        endpoint (str): "query" or "query/stream".
+        seed (int): Random seed of the arrival schedule.
+
+    Returns:
+        Dict: Summary of the run, see 'summarize'.
+    """
+    rng = random.Random(seed)
+    samples: List[Dict] = []
+    tasks = []
+    start = time.perf_counter()
+    next_arrival = start
+    index = 0
+    while next_arrival - start < duration:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        body = {"query": queries[index % len(queries)], "collection_name": collection_name}
+        tasks.append(asyncio.create_task(
+            timed_request(client, "POST", f"{API_PREFIX}/{endpoint}", samples, json=body)
+        ))
+        index += 1
+        next_arrival += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    summary = summarize(samples, time.perf_counter() - start)
+    summary["offered_rate"] = rate
+    return summary
+
+
+async def run_upload(
+    client: httpx.AsyncClient,
+    file_path: str,
+    collection_name: str,
+    poll_interval: float = 0.05
+) -> Dict:
+    """
+    Submit an upload job and poll it until it finishes.
+
+    Returns:
+        Dict: Submission latency, time to job completion and the final job status. A failed job
+            counts as HTTP status 500.
+    """
+    samples: List[Dict] = []
+    start = time.perf_counter()
+    response = await timed_request(
+        client, "POST", f"{API_PREFIX}/upload", samples,
+        json={"file_path": file_path, "collection_name": collection_name}
+    )
+    if response is None or response.status_code != 202:
+        return {
+            "submit_latency_ms": samples[0]["latency_ms"],
+            "http_status": samples[0]["status"],
+            "status": "rejected",
+        }
+
+    job = response.json()
+    while job["status"] in ("queued", "running"):
+        await asyncio.sleep(poll_interval)
+        job = (await client.get(f"{API_PREFIX}/upload/{job['job_id']}")).json()
+    return {
+        "submit_latency_ms": samples[0]["latency_ms"],
+        "completion_ms": (time.perf_counter() - start) * 1000,
+        "http_status": 202 if job["status"] == "completed" else 500,
+        "status": job["status"],
+        "detail": job.get("detail"),
+        "stats": job.get("stats"),
+    }
+
+
+def register_stand_ins(
+    embed_latency_ms: float,
+    token_latency_ms: float
+):
+    """
+    Point the app at an in-memory Qdrant and register offline stand-ins under the default model keys,
+    so the app's lifespan finds them instead of loading the real weights.
+    """
+    from scripts.backend.document_processing.document_embedder import Embedder
+    from scripts.backend.runtime.model_registry import (
+        DEFAULT_EMBEDDING_MODEL,
+        DEFAULT_GENERATION_MODEL,
+        get_registry,
+    )
+    from scripts.benchmarks.fakes import FakeEmbedder, FakeResponseGenerator
+
+    device = Embedder.default_device()
+    registry = get_registry()
+    registry.register(
+        ("embedder", DEFAULT_EMBEDDING_MODEL, device),
+        FakeEmbedder(latency_ms=embed_latency_ms, cache_dir=None)
+    )
+    registry.register(
+        ("generator", DEFAULT_GENERATION_MODEL, device),
+        FakeResponseGenerator(latency_ms_per_token=token_latency_ms)
+    )
+
+
+async def run(args) -> Dict:
+    queries = load_queries(args.queries_file, args.synthetic_queries, args.seed)
+    rates = [float(rate) for rate in args.rates.split(",")]
+    report: Dict = {
+        "target": args.base_url or "in-process",
+        "stand_ins": not args.base_url and not args.real_models,
+        "endpoint": args.endpoint,
+        "duration": args.duration,
+        "queries": len(queries),
+        "query_cache": not args.no_cache,
+        "slo": {"p99_ms": args.slo_p99_ms, "max_error_rate": args.max_error_rate},
+    }
+
+    async def scenario(client: httpx.AsyncClient):
+        if not args.skip_upload:
+            start = time.perf_counter()
+            uploads = await asyncio.gather(*[
+                run_upload(client, args.document, args.collection_name) for _ in range(args.uploads)
+            ])
+            summary = summarize(
+                [
+                    {"status": upload["http_status"] if upload["status"] != "completed" else 200,
+                     "latency_ms": upload.get("completion_ms", upload["submit_latency_ms"])}
+                    for upload in uploads
+                ],
+                time.perf_counter() - start
+            )
+            summary["jobs"] = uploads
+            report["upload"] = summary
+        report["runs"] = []
+        for i, rate in enumerate(rates):
+            summary = await open_loop(
+                client, rate, args.duration, queries, args.collection_name, args.endpoint, args.seed + i
+            )
+            summary["meets_slo"] = (
+                summary["latency_ms"]["p99"] <= args.slo_p99_ms
+                and summary["error_rate"] <= args.max_error_rate
+            )
+            report["runs"].append(summary)
+            print(
+                f"rate={rate:g}/s requests={summary['requests']} "
+                f"p50={summary['latency_ms']['p50']:.1f}ms p95={summary['latency_ms']['p95']:.1f}ms "
+                f"p99={summary['latency_ms']['p99']:.1f}ms errors={summary['error_rate']:.1%}",
+                file=sys.stderr
+            )
+
+    timeout = httpx.Timeout(args.timeout)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+            await scenario(client)
+    else:
+        os.environ.setdefault("QDRANT_URL", ":memory:")
+        if not args.real_models:
+            register_stand_ins(args.embed_latency_ms, args.token_latency_ms)
+        from scripts.main import app
+        from scripts.backend.query_processing.query_cache import get_query_cache
+
+        if args.no_cache:
+            get_query_cache().max_entries = 0
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+                await scenario(client)
+
+    passing = [run["offered_rate"] for run in report["runs"] if run["meets_slo"]]
+    failing = [run["offered_rate"] for run in report["runs"] if not run["meets_slo"]]
+    report["max_sustainable_rate"] = max(passing) if passing else 0.0
+    report["saturation_rate"] = min(failing) if failing else None
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Open-loop load test of the RAG API")
+    parser.add_argument("--base-url", help="Server to test, e.g. http://localhost:8000. Defaults to in-process")
+    parser.add_argument("--real-models", action="store_true", help="In-process: load the real models")
+    parser.add_argument("--endpoint", choices=["query", "query/stream"], default="query")
+    parser.add_argument("--rates", default="1,2,5,10", help="Comma-separated arrival rates, in requests/s")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per rate")
+    parser.add_argument("--queries-file", help="JSONL file with a 'query' (or 'title') field per line")
+    parser.add_argument("--synthetic-queries", type=int, default=200)
+    parser.add_argument("--document", default=DEFAULT_DOCUMENT, help="File uploaded before the query runs")
+    parser.add_argument("--collection-name", default="loadtest")
+    parser.add_argument("--uploads", type=int, default=1, help="Concurrent upload jobs before the query runs")
+    parser.add_argument("--skip-upload", action="store_true", help="Query an already populated collection")
+    parser.add_argument("--no-cache", action="store_true", help="In-process: disable the query cache")
+    parser.add_argument("--slo-p99-ms", type=float, default=1000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Stand-in model time per text")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="Stand-in time per generated token")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout, in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0 if report["runs"] and report["runs"][0]["meets_slo"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from scripts.backend.document_processing.document_loader import DocumentLoader
+from scripts.backend.document_processing.document_splitter import SPLITTER_MODES, DocumentSplitter
+from scripts.benchmarks.fakes import FakeEmbedder
+
+"""
+This script compares the DocumentSplitter modes on the bundled PDFs: splitting throughput, number
+of chunks and their length in tokens of the embedding model, including how many chunks exceed the
+model's input length and would be truncated, and how many are short fragments.
+
+Tokens are counted with the tokenizer given by '--tokenizer' (e.g. the embedding model's name), or
+with the tokenizer of the model given by '--embedding-model', otherwise as words and punctuation marks.
+The semantic mode embeds sentences with an offline stand-in unless '--embedding-model' is set.
+
+Usage:
+    python -m scripts.benchmarks.splitter_benchmark --tokenizer bert-large-uncased
+    python -m scripts.benchmarks.splitter_benchmark --embedding-model bert-large-uncased --modes token,semantic
+"""
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BUNDLED_PDFS = ["SQLova.pdf", "SEQ2SQL-RL.pdf", "Tema 1_removed.pdf"]
+
+
+def load_pages(
+    paths: List[str]
+) -> List:
+    """
+    Args:
+        paths (List[str]): PDFs to load. Missing files are skipped.
+
+    Returns:
+        List[Document]: One document per page.
+    """
+    pages = []
+    for path in paths:
+        if os.path.exists(path):
+            pages.extend(DocumentLoader().iter_pages(path))
+    return pages
+
+
+def load_tokenizer(
+    model_name: Optional[str]
+) -> Optional[Any]:
+    if not model_name:
+        return None
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+
+def benchmark_mode(
+    splitter: DocumentSplitter,
+    pages: List,
+    repeats: int,
+    max_tokens: int
+) -> Dict:
+    """
+    Args:
+        splitter (DocumentSplitter): Splitter under test.
+        pages (List[Document]): Pages to split.
+        repeats (int): Number of timed passes; the fastest one is reported.
+        max_tokens (int): Input length of the embedding model, without special tokens.
+
+    Returns:
+        Dict: Throughput of the best pass and token statistics of the chunks.
+    """
+    best = float("inf")
+    chunks = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        chunks = list(splitter.split_stream(pages))
+        best = min(best, time.perf_counter() - start)
+
+    lengths = np.asarray(
+        [len(starts) for starts, _ in splitter.token_offsets([chunk.page_content for chunk in chunks])]
+        if chunks else [0]
+    )
+    characters = sum(len(page.page_content) for page in pages)
+    return {
+        "mode": splitter.mode,
+        "seconds": best,
+        "pages_per_second": len(pages) / best if best > 0 else 0.0,
+        "characters_per_second": characters / best if best > 0 else 0.0,
+        "chunks": len(chunks),
+        "chunk_tokens": {
+            "mean": float(lengths.mean()),
+            "p50": float(np.percentile(lengths, 50)),
+            "p99": float(np.percentile(lengths, 99)),
+            "max": int(lengths.max()),
+        },
+        "truncated_chunks": int((lengths > max_tokens).sum()),
+        "short_chunks": int((lengths < splitter.chunk_tokens // 4).sum()),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="DocumentSplitter throughput and chunk length benchmark")
+    parser.add_argument("--modes", default=",".join(SPLITTER_MODES), help="Comma-separated splitter modes")
+    parser.add_argument("--files", help="Comma-separated PDFs. Defaults to the bundled PDFs")
+    parser.add_argument("--tokenizer", help="Hugging Face tokenizer to count tokens with")
+    parser.add_argument("--embedding-model", help="Load this embedding model for its tokenizer and the semantic mode")
+    parser.add_argument("--chunk-tokens", type=int, default=128)
+    parser.add_argument("--overlap-tokens", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=510, help="Model input length without special tokens")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    paths = args.files.split(",") if args.files else [os.path.join(REPO_ROOT, name) for name in BUNDLED_PDFS]
+    pages = load_pages(paths)
+    if not pages:
+        raise ValueError("No pages to split")
+
+    if args.embedding_model:
+        from scripts.backend.document_processing.document_embedder import Embedder
+
+        embedder = Embedder(model_name=args.embedding_model, cache_dir=None)
+    else:
+        embedder = FakeEmbedder()
+    tokenizer = load_tokenizer(args.tokenizer) or embedder.tokenizer
+
+    report: Dict = {
+        "files": [os.path.basename(path) for path in paths],
+        "pages": len(pages),
+        "tokenizer": args.tokenizer or args.embedding_model or "words",
+        "runs": [],
+    }
+    for mode in args.modes.split(","):
+        splitter = DocumentSplitter(
+            mode=mode, embedder=embedder, tokenizer=tokenizer,
+            chunk_tokens=args.chunk_tokens, chunk_overlap_tokens=args.overlap_tokens
+        )
+        report["runs"].append(benchmark_mode(splitter, pages, args.repeats, args.max_tokens))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
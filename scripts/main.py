@@ -1,25 +1,86 @@
+import json
+import logging
+import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from scripts.api.main import api_router
-from scripts.backend.document_processing.document_embedder import Embedder
+from scripts.backend.query_processing.answer_store import get_answer_store
+from scripts.backend.query_processing.query_cache import get_query_cache
+from scripts.backend.runtime.inference_executor import InferenceExecutor
+from scripts.backend.runtime.job_store import JobStore
+from scripts.backend.runtime.metrics import metrics
+from scripts.backend.runtime.tracing import STAGE_BUCKETS, trace
+from scripts.backend.runtime.micro_batcher import MicroBatcher
+from scripts.backend.runtime.model_registry import get_registry
+from scripts.backend.runtime.warm_up import get_warm_up
 
 """  
 This script sets up a FastAPI application with lifecycle management, custom route IDs, CORS support, and an API router.
 
-1. Defines the lifecycle, initializing an Embedder when the app starts.  
-2. Creates a function for unique route IDs based on tags and names.  
-3. Initializes the FastAPI app with custom settings and lifecycle management.  
-4. Adds CORS middleware to allow unrestricted access.  
-5. Includes the API router under '/api/v1'.  
+1. Defines the lifecycle, warming up the shared model registry (embedder, generator and Qdrant client)
+   and creating the inference/ingestion executors, the query embedding and generation batchers,
+   the query cache, the precomputed answer store and the upload job store when the app starts,
+   and releasing them on shutdown.  
+2. Warms the registry up before the server takes traffic or, with STARTUP_MODE=background, in a
+   background thread while '/api/v1/health' and '/api/v1/ready' report its progress.  
+3. Creates a function for unique route IDs based on tags and names.  
+4. Initializes the FastAPI app with custom settings and lifecycle management.  
+5. Adds CORS middleware to allow unrestricted access, and a timing middleware that returns the
+   stage breakdown of every request in the 'X-Timing' header and, when REQUEST_LOG is set, logs it
+   as one JSON line per request.
+6. Includes the API router under '/api/v1'.  
 """
 
+REQUEST_LOG = os.getenv("REQUEST_LOG", "").lower() in ("1", "true", "yes")
+
+request_logger = logging.getLogger("scripts.requests")
+if REQUEST_LOG and not request_logger.handlers:
+    request_logger.addHandler(logging.StreamHandler())
+    request_logger.setLevel(logging.INFO)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.embedder = Embedder(model_name="bert-large-uncased")
+    registry = get_registry()
+    get_warm_up().start(registry)
+    app.state.registry = registry
+    app.state.inference_executor = InferenceExecutor.from_env(
+        "inference", default_concurrency=2, default_queue=16
+    )
+    app.state.ingestion_executor = InferenceExecutor.from_env(
+        "ingestion", default_concurrency=1, default_queue=8
+    )
+    # The models are looked up on every batch, so the batchers can be built before they are loaded
+    app.state.embedding_batcher = MicroBatcher.from_env(
+        lambda texts: registry.get_embedder().embedding.embed_documents(texts),
+        app.state.inference_executor,
+        "embedding",
+    )
+
+    def generate_pairs(pairs):
+        return registry.get_response_generator().generate_batch(
+            queries=[query for query, _ in pairs],
+            contexts=[context for _, context in pairs]
+        )
+
+    app.state.generation_batcher = MicroBatcher.from_env(
+        generate_pairs,
+        app.state.inference_executor,
+        "generation",
+        default_batch_size=8,
+        default_wait_ms=10.0,
+    )
+    app.state.query_cache = get_query_cache()
+    app.state.answer_store = get_answer_store()
+    app.state.job_store = JobStore()
     yield
+    await app.state.embedding_batcher.close()
+    await app.state.generation_batcher.close()
+    app.state.inference_executor.shutdown()
+    app.state.ingestion_executor.shutdown(wait=False)
+    await registry.aevict()
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
@@ -41,4 +102,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    with trace() as current:
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Timing"] = current.header()
+            return response
+        finally:
+            metrics.histogram(
+                "http_request_seconds", STAGE_BUCKETS, "Time to handle a request, until the response starts"
+            ).observe(current.elapsed_ms() / 1000)
+            if REQUEST_LOG:
+                request_logger.info(json.dumps({
+                    "method": request.method,
+                    "path": request.url.path,
+                    "status": status,
+                    **current.to_dict(),
+                }))
+
 app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
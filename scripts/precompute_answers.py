@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_qdrant import QdrantVectorStore
+
+from scripts.backend.models.rag import BatchQueryRequest, QueryRequest, QueryResponse
+from scripts.backend.query_processing.answer_store import AnswerStore, get_answer_store
+from scripts.backend.query_processing.query_processor import QueryProcessor
+from scripts.backend.query_processing.response_generator import ERROR_PREFIX
+from scripts.backend.runtime.model_registry import get_registry
+
+"""
+This script is the offline job that fills the AnswerStore. It counts the questions of request logs in the
+JSONL format read by '/query/batch' (one object per line with "query" or "title", and optionally
+"collection_name", "search_type", "k", "rerank" and "filters"), and precomputes the retrieval and the
+answer of the most frequent ones with the models of the API.
+
+Answers of a collection are marked stale when documents are uploaded to or deleted from it. Every run
+refreshes the stale answers of the collections it touches, and '--refresh' only does that. A refresh
+retrieves the context again and only generates a new answer when the context changed.
+
+Usage:
+    python -m scripts.precompute_answers --logs requests.jsonl --collection-name docs --top 200
+    python -m scripts.precompute_answers --refresh
+"""
+
+load_dotenv()
+
+
+def mine_queries(
+    paths: List[str],
+    defaults: BatchQueryRequest,
+    top: int,
+    min_count: int = 1
+) -> List[Tuple[QueryRequest, int]]:
+    """
+    Count the requests of logs, ignoring case and whitespace differences of the query text.
+
+    Args:
+        paths (List[str]): JSONL request logs. Lines that are not queries are skipped.
+        defaults (BatchQueryRequest): Collection, search type, k and rerank of lines that do not set them.
+        top (int): Number of requests returned.
+        min_count (int): Minimum number of occurrences of a returned request. Defaults to 1.
+
+    Returns:
+        List[Tuple[QueryRequest, int]]: The most frequent requests with their count, most frequent first.
+    """
+    counts: Counter = Counter()
+    first: Dict[str, QueryRequest] = {}
+    for path in paths:
+        for _, query_request in QueryProcessor.load_requests(path, defaults, skip_invalid=True):
+            key = json.dumps([
+                query_request.collection_name, " ".join(query_request.query.lower().split()),
+                query_request.search_type, query_request.k, query_request.rerank, query_request.filters
+            ], sort_keys=True)
+            counts[key] += 1
+            first.setdefault(key, query_request)
+    return [(first[key], hits) for key, hits in counts.most_common(top) if hits >= min_count]
+
+
+def precompute(
+    answer_store: AnswerStore,
+    processor: QueryProcessor,
+    candidates: List[Tuple[QueryRequest, int]]
+) -> Dict[str, int]:
+    """
+    Store fresh answers for the requests of one collection.
+
+    A fresh stored answer is kept. A stale one is kept when the request retrieves the same context as
+    before, and regenerated otherwise. Missing answers are generated in batches of prompts of similar length.
+
+    Args:
+        answer_store (AnswerStore): Store to fill.
+        processor (QueryProcessor): Processor searching the collection of the requests, without answer store.
+        candidates (List[Tuple[QueryRequest, int]]): Requests and how often they were asked.
+
+    Returns:
+        Dict[str, int]: Number of answers kept, refreshed without generation, generated and failed.
+    """
+    stats = {"kept": 0, "unchanged": 0, "generated": 0, "failed": 0}
+    if not candidates:
+        return stats
+    stored = {entry.key: entry for entry in answer_store.entries(candidates[0][0].collection_name)}
+    generating = []
+    for query_request, hits in candidates:
+        key = processor.query_key(query_request)
+        entry = stored.get(key)
+        if entry is not None and not entry.stale:
+            answer_store.mark_fresh(key, hits)
+            stats["kept"] += 1
+            continue
+        try:
+            packed = processor.retrieve(query_request)
+        except Exception as e:
+            print(f"Skipping {query_request.query!r}: {e}", file=sys.stderr)
+            stats["failed"] += 1
+            continue
+        context = [doc.page_content for doc in packed.documents]
+        if entry is not None and entry.response.context == context:
+            answer_store.mark_fresh(key, hits)
+            stats["unchanged"] += 1
+            continue
+        prompt_tokens = packed.tokens_used + processor.response_generator.count_tokens(query_request.query)
+        generating.append((prompt_tokens, query_request, key, hits, packed.text, context))
+
+    generating.sort(key=lambda item: item[0])
+    batch_size = max(1, processor.response_generator.batch_size)
+    for start in range(0, len(generating), batch_size):
+        group = generating[start:start + batch_size]
+        responses = processor.response_generator.generate_batch(
+            queries=[query_request.query for _, query_request, _, _, _, _ in group],
+            contexts=[text for _, _, _, _, text, _ in group]
+        )
+        for (_, query_request, key, hits, _, context), response in zip(group, responses):
+            if response.startswith(ERROR_PREFIX):
+                stats["failed"] += 1
+                continue
+            answer_store.put(key, query_request, QueryResponse(response=response, context=context), hits)
+            stats["generated"] += 1
+    return stats
+
+
+def run(
+    answer_store: AnswerStore,
+    make_processor: Callable[[str, bool], QueryProcessor],
+    mined: List[Tuple[QueryRequest, int]],
+    collection_name: Optional[str] = None,
+    prune: bool = False
+) -> Dict:
+    """
+    Precompute the mined requests and refresh the stale answers of their collections, or of
+    'collection_name' or every collection when nothing was mined.
+
+    Args:
+        answer_store (AnswerStore): Store to fill.
+        make_processor (Callable[[str, bool], QueryProcessor]): Builds the processor of a collection;
+            the flag tells whether it needs a reranker.
+        mined (List[Tuple[QueryRequest, int]]): Frequent requests.
+        collection_name (str, optional): Restrict the refresh to this collection.
+        prune (bool): Delete the stored answers of the touched collections that were not mined.
+
+    Returns:
+        Dict: Counts of every collection.
+    """
+    by_collection: Dict[str, List[Tuple[QueryRequest, int]]] = {}
+    for query_request, hits in mined:
+        by_collection.setdefault(query_request.collection_name, []).append((query_request, hits))
+    if not mined:
+        for entry in answer_store.entries(collection_name, stale=True):
+            by_collection.setdefault(entry.key[0], [])
+
+    report: Dict = {}
+    for collection, candidates in by_collection.items():
+        start = time.perf_counter()
+        stale_entries = answer_store.entries(collection, stale=True)
+        query_requests = [query_request for query_request, _ in candidates]
+        query_requests += [entry.query_request for entry in stale_entries]
+        processor = make_processor(collection, any(query_request.rerank for query_request in query_requests))
+        mined_keys = {processor.query_key(query_request) for query_request, _ in candidates}
+        stale = [(entry.query_request, entry.hits) for entry in stale_entries if entry.key not in mined_keys]
+        pruned = 0
+        if prune and mined_keys:
+            pruned = answer_store.remove(
+                [entry.key for entry in answer_store.entries(collection) if entry.key not in mined_keys]
+            )
+            stale = []
+        stats = precompute(answer_store, processor, candidates + stale)
+        report[collection] = {**stats, "pruned": pruned, "seconds": round(time.perf_counter() - start, 3)}
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Precompute the answers of frequent questions")
+    parser.add_argument("--logs", help="Comma-separated JSONL request logs to mine")
+    parser.add_argument("--refresh", action="store_true", help="Only refresh the stale answers")
+    parser.add_argument("--collection-name", help="Collection of log lines without one, and of the refresh")
+    parser.add_argument("--search-type", default="similarity", help="Search type of log lines without one")
+    parser.add_argument("--k", type=int, default=5, help="k of log lines without one")
+    parser.add_argument("--top", type=int, default=100, help="Number of most frequent requests to precompute")
+    parser.add_argument("--min-count", type=int, default=2, help="Minimum number of occurrences")
+    parser.add_argument("--prune", action="store_true", help="Delete stored answers that are no longer frequent")
+    args = parser.parse_args(argv)
+    if not args.logs and not args.refresh:
+        parser.error("Give --logs to mine, or --refresh")
+
+    answer_store = get_answer_store()
+    if answer_store is None:
+        raise ValueError("ANSWER_STORE_PATH is empty, there is no answer store to fill")
+
+    mined = []
+    if args.logs:
+        defaults = BatchQueryRequest(collection_name=args.collection_name, search_type=args.search_type, k=args.k)
+        mined = mine_queries(args.logs.split(","), defaults, args.top, args.min_count)
+
+    registry = get_registry()
+    embedder = registry.get_embedder()
+    response_generator = registry.get_response_generator()
+    client = registry.get_qdrant_client(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
+
+    def make_processor(collection: str, rerank: bool) -> QueryProcessor:
+        vector_store = QdrantVectorStore(
+            client=client, collection_name=collection, embedding=embedder.embedding,
+            validate_collection_config=False
+        )
+        return QueryProcessor(
+            embedder, vector_store, response_generator, reranker=registry.get_reranker() if rerank else None
+        )
+
+    report = {
+        "mined": len(mined),
+        "collections": run(answer_store, make_processor, mined, args.collection_name, args.prune),
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pytest
+
+from scripts.backend.document_processing.embedding_cache import EmbeddingCache
+
+MODEL = "org/model"
+
+
+def test_round_trip_after_reopen(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, dtype="float32")
+    cache.put_many(["a", "b", "a"], [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+    assert len(cache) == 2
+
+    reopened = EmbeddingCache(str(tmp_path), MODEL)
+    assert reopened.get_many(["b", "a", "c"]) == [[3.0, 4.0], [1.0, 2.0], None]
+    assert EmbeddingCache(str(tmp_path), "other/model").get_many(["a"]) == [None]
+
+
+def test_float16_vectors_are_approximate(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL)
+    vector = np.random.default_rng(0).normal(size=16)
+    cache.put_many(["a"], [vector])
+    np.testing.assert_allclose(cache.get_many(["a"])[0], vector, rtol=1e-3, atol=1e-3)
+
+
+def test_wrong_dimension_leaves_the_cache_unchanged(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, dtype="float32")
+    cache.put_many(["a"], [[1.0, 2.0]])
+    with pytest.raises(ValueError):
+        cache.put_many(["b"], [[1.0, 2.0, 3.0]])
+    assert len(cache) == 1
+    cache.put_many(["b"], [[3.0, 4.0]])
+    assert EmbeddingCache(str(tmp_path), MODEL).get_many(["a", "b"]) == [[1.0, 2.0], [3.0, 4.0]]
+
+
+def test_torn_append_is_cut_on_reload(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, dtype="float32")
+    cache.put_many(["a", "b"], [[1.0, 2.0], [3.0, 4.0]])
+    with open(os.path.join(cache.directory, "vectors.bin"), "ab") as f:
+        f.write(np.float32([5.0, 6.0]).tobytes())
+    with open(os.path.join(cache.directory, "keys.bin"), "ab") as f:
+        f.write(b"\0" * 10)
+
+    reopened = EmbeddingCache(str(tmp_path), MODEL)
+    assert len(reopened) == 2
+    reopened.put_many(["c"], [[7.0, 8.0]])
+    assert EmbeddingCache(str(tmp_path), MODEL).get_many(["a", "c"]) == [[1.0, 2.0], [7.0, 8.0]]
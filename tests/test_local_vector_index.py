@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from scripts.backend.document_processing.local_vector_index import DTYPES, LocalVectorIndex
+
+SIZE = 32
+
+
+def random_vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, SIZE)).astype(np.float32)
+
+
+def open_index(directory, **kwargs):
+    kwargs.setdefault("ivf_threshold", 10 ** 9)
+    return LocalVectorIndex(str(directory), SIZE, **kwargs)
+
+
+def nearest_id(index, query):
+    row, _ = index.search(query, 1)[0]
+    return index.ids[row]
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_points_survive_delete_and_reopen(tmp_path, dtype):
+    vectors = random_vectors(300)
+    index = open_index(tmp_path, dtype=dtype)
+    index.upsert(list(range(300)), vectors, [{"i": i} for i in range(300)])
+    index.delete([index.row_of(i) for i in range(0, 300, 3)])
+    index.flush()
+
+    reopened = open_index(tmp_path)
+    assert reopened.dtype == dtype
+    assert reopened.count == 200
+    assert reopened.row_of(0) is None
+    assert nearest_id(reopened, vectors[1]) == 1
+    assert reopened.payloads[reopened.row_of(1)] == {"i": 1}
+    assert all(reopened.ids[row] % 3 for row, _ in reopened.search(vectors[0], 300))
+
+
+def test_overwrite_keeps_one_point(tmp_path):
+    vectors = random_vectors(2)
+    index = open_index(tmp_path)
+    index.upsert([7], vectors[:1], [{"version": 1}])
+    index.upsert([7], vectors[1:], [{"version": 2}])
+    assert index.count == 1
+    row, score = index.search(vectors[1], 1)[0]
+    assert index.payloads[row] == {"version": 2}
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_deleted_rows_are_reused(tmp_path):
+    vectors = random_vectors(600)
+    index = open_index(tmp_path)
+    index.upsert(list(range(300)), vectors[:300], [{} for _ in range(300)])
+    index.delete([index.row_of(i) for i in range(300)])
+    index.upsert(list(range(300, 600)), vectors[300:], [{} for _ in range(300)])
+    index.flush()
+
+    reopened = open_index(tmp_path)
+    assert reopened._count == 300
+    assert reopened.count == 300
+    assert nearest_id(reopened, vectors[450]) == 450
+
+
+def test_compacted_log_reloads(tmp_path):
+    vectors = random_vectors(100)
+    index = open_index(tmp_path)
+    index.upsert(list(range(100)), vectors, [{"i": i} for i in range(100)])
+    index.set_payload([index.row_of(5)], {"page": 2}, key="metadata")
+    index.delete([index.row_of(i) for i in range(50)])
+    index.upsert([1000], vectors[:1], [{"i": 1000}])
+    index._compact_log()
+    index.flush()
+
+    reopened = open_index(tmp_path)
+    assert reopened.count == 51
+    assert {reopened.ids[row] for row in reopened.rows_matching()} == {*range(50, 100), 1000}
+    assert nearest_id(reopened, vectors[0]) == 1000
+    assert reopened.payloads[reopened.row_of(1000)] == {"i": 1000}
+    with open(tmp_path / "payloads.jsonl") as f:
+        assert sum(1 for _ in f) == 51
+
+
+def test_ivf_recall_matches_exact_search(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, SIZE))
+    vectors = (centers[rng.integers(0, 40, 4000)] + 0.3 * rng.normal(size=(4000, SIZE))).astype(np.float32)
+    index = open_index(tmp_path, ivf_threshold=2000, nprobe=8)
+    for start in range(0, 4000, 500):
+        index.upsert(list(range(start, start + 500)), vectors[start:start + 500], [{} for _ in range(500)])
+    assert index.wait_for_ivf(timeout=60)
+
+    queries = vectors[rng.choice(4000, 50, replace=False)] + 0.1 * rng.normal(size=(50, SIZE)).astype(np.float32)
+    everything = index.rows_matching()
+    found = 0
+    for query in queries:
+        exact = {row for row, _ in index.search(query, 10, everything)}
+        found += len(exact & {row for row, _ in index.search(query, 10)})
+    assert found / (10 * len(queries)) >= 0.9
+
+    index.flush()
+    reopened = open_index(tmp_path, ivf_threshold=2000)
+    assert reopened.wait_for_ivf(timeout=0)
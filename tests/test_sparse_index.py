@@ -0,0 +1,65 @@
+import json
+import os
+
+from scripts.backend.document_processing.sparse_index import BM25Index
+
+TEXTS = {
+    "a": "the quick brown fox jumps over the lazy dog",
+    "b": "a lazy afternoon with a sleeping dog",
+    "c": "quantum computing with superconducting qubits",
+    "d": "the fox and the hound",
+}
+
+
+def build(directory, max_segments=8):
+    index = BM25Index(str(directory), max_segments=max_segments)
+    for point_id, text in TEXTS.items():
+        index.add([point_id], [text])
+    return index
+
+
+def test_search_ranks_matching_chunks(tmp_path):
+    index = build(tmp_path)
+    assert [point_id for point_id, _ in index.search("fox", 10)] in (["a", "d"], ["d", "a"])
+    assert index.search("qubits", 10)[0][0] == "c"
+    assert index.search("unknown words", 10) == []
+    assert index.add(["a"], [TEXTS["a"]]) == 0
+
+
+def test_round_trip_after_remove_and_reopen(tmp_path):
+    index = build(tmp_path)
+    index.remove(["d"])
+    index.save()
+
+    reopened = BM25Index(str(tmp_path))
+    assert len(reopened) == 3
+    assert reopened.search("fox lazy dog", 10) == index.search("fox lazy dog", 10)
+    assert "d" not in {point_id for point_id, _ in reopened.search("fox hound", 10)}
+
+
+def test_merged_segments_replace_the_old_files(tmp_path):
+    index = build(tmp_path, max_segments=2)
+    index.save()
+    index.add(["e"], ["a fox in the snow"])
+    index.remove(["a"])
+    index.save()
+
+    with open(tmp_path / "meta.json") as f:
+        meta = json.load(f)
+    written = {name for name in os.listdir(tmp_path) if name.endswith((".npz", ".npy"))}
+    assert written == {*meta["segments"], meta["doc_lengths"], meta["document_frequencies"]}
+    assert BM25Index(str(tmp_path)).search("fox", 10) == index.search("fox", 10)
+
+
+def test_missing_segment_starts_empty(tmp_path):
+    index = build(tmp_path)
+    index.save()
+    with open(tmp_path / "meta.json") as f:
+        os.remove(tmp_path / json.load(f)["segments"][0])
+
+    reopened = BM25Index(str(tmp_path))
+    assert reopened.stale
+    assert len(reopened) == 0
+    reopened.add(["a"], [TEXTS["a"]])
+    reopened.save()
+    assert BM25Index(str(tmp_path)).search("fox", 10)[0][0] == "a"